@@ -1,9 +1,17 @@
 from django.contrib import admin
-from .models import Counter, Company, Flight, Ticket, Service
+from .models import Counter, Company, Flight, Ticket, Service, ScheduledJob, TicketEvent, Site, QueueSequence, KioskLease, IdempotencyKey, AgentSession, ServiceRoute
 # Register your models here.
 
+admin.site.register(Site)
 admin.site.register(Service)
+admin.site.register(ServiceRoute)
 admin.site.register(Counter)
 admin.site.register(Company)
 admin.site.register(Flight)
-admin.site.register(Ticket)
\ No newline at end of file
+admin.site.register(Ticket)
+admin.site.register(ScheduledJob)
+admin.site.register(TicketEvent)
+admin.site.register(QueueSequence)
+admin.site.register(KioskLease)
+admin.site.register(IdempotencyKey)
+admin.site.register(AgentSession)
@@ -0,0 +1,113 @@
+"""
+Sessions des agents aux comptoirs et débit par vacation.
+
+Un agent ouvre une session en se connectant à un comptoir et la ferme en se
+déconnectant (une seule session ouverte par comptoir). Chaque transition d'un
+ticket du comptoir (voir api/transitions.py) incrémente les compteurs de la
+session ouverte par un seul UPDATE, sans lecture préalable :
+
+- ``call`` : tickets appelés, inactivité depuis la dernière action ;
+- ``serve`` : tickets servis, temps de traitement (``served_at - called_at``) ;
+- ``skip`` : tickets sautés.
+
+Le tableau de bord superviseur (``sessions/``) lit ces compteurs tels quels :
+le coût ne dépend pas du nombre de tickets traités.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+from django.utils import timezone
+
+from .fastpath import drf_datetime
+from .models import AgentSession
+
+# Compteur incrémenté par action
+COUNTERS = {'call': 'tickets_called', 'serve': 'tickets_served', 'skip': 'tickets_skipped'}
+
+
+def open_session(counter, agent, now=None):
+    """
+    Connecte ``agent`` au comptoir. Une session restée ouverte (agent parti
+    sans se déconnecter) est fermée d'abord.
+
+    Raises:
+        IntegrityError: connexion concurrente au même comptoir
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        close_session(counter, now)
+        return AgentSession.objects.create(counter=counter, agent=agent, started_at=now, last_activity_at=now)
+
+
+def close_session(counter, now=None):
+    """Ferme la session ouverte du comptoir. Returns: True si une session était ouverte."""
+    return bool(
+        AgentSession.objects.filter(counter=counter, ended_at__isnull=True).update(ended_at=now or timezone.now())
+    )
+
+
+def record_transition(counter_id, action, now, count=1, handle_time=None):
+    """
+    Met à jour la session ouverte du comptoir après ``count`` transitions
+    ``action`` (un seul UPDATE ; aucun effet sans session ouverte).
+
+    Args:
+        handle_time: temps de traitement cumulé des tickets servis
+    """
+    if counter_id is None:
+        return 0
+    field = COUNTERS[action]
+    updates = {field: F(field) + count, 'last_activity_at': Value(now)}
+    if action == 'call':
+        updates['idle_time'] = F('idle_time') + ExpressionWrapper(
+            Value(now) - F('last_activity_at'), output_field=DurationField(),
+        )
+    if handle_time:
+        updates['handle_time'] = F('handle_time') + handle_time
+    return AgentSession.objects.filter(counter_id=counter_id, ended_at__isnull=True).update(**updates)
+
+
+def handle_time(called_at, served_at):
+    if called_at is None or served_at < called_at:
+        return datetime.timedelta()
+    return served_at - called_at
+
+
+# --- sessions/ ---
+
+SESSION_FIELDS = (
+    'id', 'counter', 'counter__name', 'agent', 'started_at', 'ended_at', 'last_activity_at',
+    'tickets_called', 'tickets_served', 'tickets_skipped', 'handle_time', 'idle_time',
+)
+
+
+def sessions_queryset(site_id, active=True):
+    queryset = AgentSession.objects.filter(counter__site_id=site_id)
+    if active:
+        queryset = queryset.filter(ended_at__isnull=True)
+    return queryset.order_by('counter__name', '-started_at').values(*SESSION_FIELDS)
+
+
+def session_row(row, now=None):
+    """Ligne du tableau superviseur ; durées en secondes, moyenne calculée sur la ligne."""
+    served = row['tickets_served']
+    handle = row['handle_time'].total_seconds()
+    end = row['ended_at'] or now or timezone.now()
+    return {
+        'id': row['id'],
+        'counter': row['counter'],
+        'counter_name': row['counter__name'],
+        'agent': row['agent'],
+        'started_at': drf_datetime(row['started_at']),
+        'ended_at': drf_datetime(row['ended_at']),
+        'last_activity_at': drf_datetime(row['last_activity_at']),
+        'active': row['ended_at'] is None,
+        'duration_seconds': round((end - row['started_at']).total_seconds(), 1),
+        'tickets_called': row['tickets_called'],
+        'tickets_served': served,
+        'tickets_skipped': row['tickets_skipped'],
+        'handle_seconds': round(handle, 1),
+        'average_handle_seconds': round(handle / served, 1) if served else None,
+        'idle_seconds': round(row['idle_time'].total_seconds(), 1),
+    }
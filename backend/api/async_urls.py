@@ -0,0 +1,18 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('services/', async_views.service_list, name='async-service-list'),
+    path('counters/', async_views.counter_list, name='async-counter-list'),
+    path('counters/<int:counter_id>/tickets/', async_views.counter_tickets_list, name='async-counter-tickets-list'),
+
+    # Tickets
+    path('tickets/generate-queue-ticket/', async_views.generer_ticket, name='async-generate-queue-ticket'),
+    path('tickets/statistics/', async_views.ticket_statistics, name='async-ticket-statistics'),
+
+    # Écrans publics
+    path('display/<str:profile>/', async_views.display_feed_detail, name='async-display-feed'),
+
+    # Flights
+    path('flights/<str:flight_number>/', async_views.flight_detail, name='async-flight-detail'),
+]
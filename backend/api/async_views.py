@@ -0,0 +1,189 @@
+"""
+Vues asynchrones (ASGI) des endpoints les plus sollicités par le polling.
+
+Ces vues reprennent les réponses des vues DRF de ``views.py`` mais utilisent
+l'ORM asynchrone de Django (``aget``, ``acount``, ``async for``) et les
+projections de ``fastpath.py`` : sous
+``myproject/asgi.py`` (uvicorn), un tableau de bord qui attend la base ne
+bloque plus un thread worker.
+
+Lancement :
+    uvicorn myproject.asgi:application --workers 1
+
+Les routes sont montées sous ``/api/async/`` (voir ``async_urls.py``).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import display_feed, fastpath, idempotency, routing
+from .flight_lookup import resolve_flight
+from .models import Company, Service, Flight, Site
+from .renderers import fast_json_response
+from .serializers import EnregistrementSerializer, FlightSerializer
+from .sites import arequest_site, site_code
+from .throttling import throttled
+from .views import emettre_ticket
+
+
+def _shaped_response(request, rows, available):
+    """?fields= et ?compact= (voir api/fastpath.py), erreur au format DRF."""
+    try:
+        return fast_json_response(fastpath.shape_rows(rows, request.GET, available))
+    except fastpath.InvalidFields as exc:
+        return JsonResponse({"fields": [str(exc)]}, status=400)
+
+
+@require_GET
+@throttled('dashboard')
+async def service_list(request):
+    site = await arequest_site(request)
+    services = [row async for row in fastpath.services_queryset(site.id)]
+    return _shaped_response(request, services, fastpath.SERVICE_FIELDS)
+
+
+@require_GET
+@throttled('dashboard')
+async def counter_list(request):
+    site = await arequest_site(request)
+    counters = [fastpath.counter_row(row) async for row in fastpath.counters_queryset(site.id)]
+    return _shaped_response(request, counters, fastpath.COUNTER_FIELDS)
+
+
+@require_GET
+@throttled('dashboard')
+async def counter_tickets_list(request, counter_id):
+    rows = fastpath.counter_tickets_queryset(counter_id, fastpath.counter_tickets_limit(request.GET))
+    tickets = [fastpath.ticket_row(row) async for row in rows]
+    return _shaped_response(request, tickets, fastpath.TICKET_FIELDS)
+
+
+@require_GET
+@throttled('dashboard')
+async def display_feed_detail(request, profile):
+    # Lecture du jeton de version en cache ; la base n'est interrogée que si le flux a changé
+    try:
+        payload = await sync_to_async(display_feed.get_display_feed)(site_code(request), profile)
+    except (KeyError, Site.DoesNotExist):
+        return JsonResponse({"error": "Profil d'affichage inconnu."}, status=404)
+    return HttpResponse(payload, content_type='application/json')
+
+
+@require_GET
+@throttled('dashboard')
+async def flight_detail(request, flight_number):
+    # L'index des vols du jour est en mémoire : la requête n'est faite qu'en cas d'absence
+    flight = await sync_to_async(resolve_flight)(flight_number)
+    if flight is None:
+        return JsonResponse({"error": "Vol non trouvé."}, status=404)
+    return JsonResponse(FlightSerializer(flight).data)
+
+
+@require_GET
+@throttled('dashboard')
+async def ticket_statistics(request):
+    """Même contenu que ``TicketStatisticsView`` (voir ``fastpath.ticket_statistics``)."""
+    try:
+        sections = fastpath.statistics_sections(request.GET)
+    except fastpath.InvalidFields as exc:
+        return JsonResponse({"fields": [str(exc)]}, status=400)
+    site = await arequest_site(request)
+    data = {}
+    if 'total_waiting_tickets' in sections:
+        data['total_waiting_tickets'] = await fastpath.active_tickets(site.id).acount()
+    if 'average_wait_time_minutes' in sections:
+        totals = await fastpath.done_tickets(site.id).aaggregate(**fastpath.DONE_TOTALS)
+        data['average_wait_time_minutes'] = fastpath.average_wait(totals)
+    if 'waiting_tickets_by_company' in sections:
+        companies = [company async for company in fastpath.companies_queryset()]
+        ticket_numbers = [
+            number async for number in fastpath.active_tickets(site.id).values_list('ticket_number', flat=True)
+        ]
+        data['waiting_tickets_by_company'] = fastpath.waiting_by_company(ticket_numbers, companies)
+    if 'waiting_tickets_by_service' in sections:
+        data['waiting_tickets_by_service'] = [row async for row in fastpath.waiting_by_service_queryset(site.id)]
+    if 'debug_tickets_info' in sections:
+        data['debug_tickets_info'] = [
+            fastpath.debug_ticket_row(row) async for row in fastpath.debug_tickets_queryset(site.id)
+        ]
+    return fast_json_response(fastpath.shape_statistics(data, request.GET))
+
+
+@csrf_exempt
+@require_POST
+@throttled('issuance')
+async def generer_ticket(request):
+    """
+    Version asynchrone de ``GenererTicketEtCalculerTAEView``.
+
+    Les validations se font avec l'ORM asynchrone ; la création du ticket
+    (écritures + attribution du comptoir) reste dans ``emettre_ticket`` et
+    s'exécute dans le thread ORM via ``sync_to_async``, ce qui sérialise les
+    écritures comme sous WSGI. L'en-tête ``Idempotency-Key`` est traité comme
+    dans la vue synchrone.
+    """
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "Corps JSON invalide."}, status=400)
+    else:
+        payload = request.POST
+
+    try:
+        key = idempotency.request_key(request)
+        if key is None:
+            return await _generer_ticket(request, payload)
+        scope = f"{site_code(request)}:generate-queue-ticket"
+        replay = await sync_to_async(idempotency.begin)(scope, key, idempotency.fingerprint(payload))
+    except idempotency.IdempotencyError as e:
+        response = JsonResponse({"error": str(e)}, status=e.status_code)
+        if isinstance(e, idempotency.IdempotencyInProgress):
+            response['Retry-After'] = str(e.retry_after)
+        return response
+    if replay is not None:
+        response = JsonResponse(replay[1], status=replay[0], safe=False)
+        response[idempotency.REPLAYED_HEADER] = 'true'
+        return response
+    try:
+        response = await _generer_ticket(request, payload)
+    except Exception:
+        await sync_to_async(idempotency.abort)(scope, key)
+        raise
+    await sync_to_async(idempotency.complete)(scope, key, response.status_code, json.loads(response.content))
+    return response
+
+
+async def _generer_ticket(request, payload):
+    serializer = EnregistrementSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    ticket_number_input = serializer.validated_data['ticket_number'].upper()
+    service_id = serializer.validated_data['service_id']
+    company_code = ticket_number_input[:2]
+
+    try:
+        service = await Service.objects.aget(pk=service_id, site=await arequest_site(request))
+        if not await sync_to_async(routing.requires_flight)(service):
+            company = None
+            flight = None
+        else:
+            flight = await sync_to_async(resolve_flight)(ticket_number_input)
+            if flight is None:
+                await Company.objects.aget(code__iexact=company_code)
+                raise Flight.DoesNotExist
+            company = flight.company
+            ticket_number_input = flight.flight_number
+    except Service.DoesNotExist:
+        return JsonResponse({"error": f"Service '{service_id}' introuvable."}, status=400)
+    except Company.DoesNotExist:
+        return JsonResponse({"error": f"Code compagnie '{company_code}' introuvable."}, status=400)
+    except Flight.DoesNotExist:
+        return JsonResponse({"error": f"Vol '{ticket_number_input}' non planifié."}, status=400)
+
+    response_data = await sync_to_async(emettre_ticket)(service, company, ticket_number_input, flight=flight)
+    return JsonResponse(response_data, status=201)
@@ -0,0 +1,111 @@
+"""
+Compression des réponses JSON (gzip, brotli si installé).
+
+Les tableaux de bord interrogent ``counters/``, ``tickets/statistics/``... en
+boucle : compresser ces réponses divise par 5 à 10 les octets transférés. Les
+petites réponses (``SIOA_COMPRESSION_MIN_BYTES``) ne sont pas compressées : le
+gain ne couvre pas le coût CPU ni l'en-tête gzip.
+
+Seul le JSON est compressé : les pages HTML (admin, API navigable) portent un
+jeton CSRF à côté de données reflétées, et les compresser sans masquer le
+jeton les exposerait à BREACH.
+
+Brotli (paquet ``brotli``, optionnel) est préféré quand le client l'accepte ;
+sans lui, seul gzip est proposé. Le middleware est compatible ASGI (vues
+asynchrones de ``async_views.py``).
+"""
+import gzip
+import re
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli est optionnel
+    brotli = None
+
+DEFAULT_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ('application/json',)
+# Niveaux rapides : la réponse est recalculée à chaque polling
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+_ACCEPT_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def min_bytes():
+    return getattr(settings, 'SIOA_COMPRESSION_MIN_BYTES', DEFAULT_MIN_BYTES)
+
+
+def accepted_encodings(header):
+    """``{encodage: q}`` d'un en-tête Accept-Encoding (``q=0`` : refusé)."""
+    encodings = {}
+    for part in header.split(','):
+        match = _ACCEPT_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        encodings[match.group(1).lower()] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    """Encodage à utiliser pour ce client (``br``, ``gzip``) ou None."""
+    encodings = accepted_encodings(header or '')
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    candidates = [
+        (encodings.get(name, encodings.get('*', 0)), -rank, name) for rank, name in enumerate(available)
+    ]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    # mtime fixe : même réponse, mêmes octets
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(request, response):
+    """Compresse ``response`` en place si c'est utile ; renvoie la réponse."""
+    if response.streaming or response.has_header('Content-Encoding'):
+        return response
+    if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+        return response
+    # La représentation dépend désormais de l'en-tête, même non compressée
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if len(response.content) < min_bytes():
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    compressed = compress(response.content, encoding)
+    if len(compressed) >= len(response.content):
+        return response
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        # Octets différents de la représentation d'origine : ETag faible
+        response['ETag'] = 'W/' + etag
+    return response
+
+
+@sync_and_async_middleware
+def CompressionMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+    return middleware
@@ -0,0 +1,236 @@
+"""
+Flux d'affichage précalculés pour les écrans publics (FIDS, files d'attente).
+
+Chaque profil d'écran (zone A, zone B, Information B8/B9...) reçoit en une
+seule réponse le ticket en cours de chaque comptoir, les N suivants et le
+statut des vols concernés, au lieu de combiner ``counters/`` et
+``counters/<id>/tickets/`` toutes les 2 secondes.
+
+Les profils s'appliquent à chaque site (terminal) : le flux et ses clés de
+cache sont propres au couple (site, profil).
+
+Les écritures (signal ``queue_changed``, comptoir ou vol modifié) ne
+reconstruisent rien : après commit, elles marquent périmés les flux des
+comptoirs touchés en changeant leur jeton de version dans le cache partagé
+(``CACHES``), sans requête SQL ni rendu. Un flux est reconstruit à la lecture
+suivante, par le premier écran qui le demande, puis rangé dans le cache partagé
+avec les jetons lus avant sa construction. Chaque processus garde en mémoire la
+dernière version lue : tant que rien ne change, une requête d'écran coûte une
+lecture des jetons dans le cache et aucune requête SQL.
+
+Deux niveaux de jetons : un jeton par couple (site, profil), changé quand un
+comptoir affiché change, et un jeton global, changé quand tous les flux sont
+touchés (vol modifié, comptoir créé, renommé ou supprimé, import du programme).
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from .fastpath import ACTIVE_STATUSES, drf_datetime
+from .models import Counter, Ticket
+from .renderers import dumps
+from .sites import get_site
+from .tae import QUEUE_ORDERING
+
+DEFAULT_NEXT_COUNT = 3
+DEFAULT_PROFILES = {
+    'zone-a': {'label': "Zone A", 'counters': [f"A{i}" for i in range(1, 13)]},
+    'zone-b': {'label': "Zone B", 'counters': [f"B{i}" for i in range(1, 13)]},
+    'information': {'label': "Information B8/B9", 'counters': ["B8", "B9"]},
+    # counters=None : tous les comptoirs
+    'all': {'label': "Tous les comptoirs", 'counters': None},
+}
+PROFILES = getattr(settings, 'SIOA_DISPLAY_PROFILES', DEFAULT_PROFILES)
+
+_local_lock = threading.Lock()
+_local_feeds = {}
+
+
+def _payload_key(site_code, profile):
+    return f'sioa:display-feed:{site_code}:{profile}'
+
+
+def _version_key(site_code, profile):
+    return f'sioa:display-feed:{site_code}:{profile}:version'
+
+
+def build_feed(site, profile):
+    """Contenu du flux d'un profil, en deux requêtes (comptoirs, tickets actifs)."""
+    spec = PROFILES[profile]
+    next_count = spec.get('next', DEFAULT_NEXT_COUNT)
+
+    counters = Counter.objects.filter(site=site).order_by('name')
+    if spec['counters'] is not None:
+        counters = counters.filter(name__in=spec['counters'])
+    counters = list(counters.values(
+        'id', 'name', 'status', 'assigned_company__name', 'assigned_company__code',
+    ))
+    boards = {}
+    for counter in counters:
+        company = None
+        if counter['assigned_company__code'] is not None:
+            company = {'name': counter['assigned_company__name'], 'code': counter['assigned_company__code']}
+        boards[counter['id']] = {
+            'id': counter['id'],
+            'name': counter['name'],
+            'status': counter['status'],
+            'company': company,
+            'now_serving': [],
+            'next': [],
+            'waiting_count': 0,
+        }
+
+    flights = {}
+    tickets = (
+        Ticket.objects.filter(counter_id__in=boards, status__in=ACTIVE_STATUSES)
+        .order_by('counter_id', *QUEUE_ORDERING)
+        .values(
+            'counter_id', 'status', 'queue_number', 'ticket_number', 'service__name', 'called_at',
+            'estimated_waiting_time_minutes', 'queue_position', 'flight_id', 'flight__flight_number',
+            'flight__company__name', 'flight__departure_time', 'flight__status', 'flight__gate',
+        )
+    )
+    for ticket in tickets:
+        board = boards[ticket['counter_id']]
+        row = {
+            'queue_number': ticket['queue_number'],
+            'ticket_number': ticket['ticket_number'],
+            'service_name': ticket['service__name'],
+        }
+        if ticket['status'] == 'CALLED':
+            row['called_at'] = drf_datetime(ticket['called_at'])
+            board['now_serving'].append(row)
+        else:
+            board['waiting_count'] += 1
+            if len(board['next']) < next_count:
+                row['estimated_waiting_time_minutes'] = ticket['estimated_waiting_time_minutes']
+                row['queue_position'] = ticket['queue_position']
+                board['next'].append(row)
+        if ticket['flight_id'] is not None and ticket['flight_id'] not in flights:
+            flights[ticket['flight_id']] = {
+                'flight_number': ticket['flight__flight_number'],
+                'company_name': ticket['flight__company__name'],
+                'departure_time': ticket['flight__departure_time'],
+                'status': ticket['flight__status'],
+                'gate': ticket['flight__gate'],
+            }
+
+    flights = sorted(flights.values(), key=lambda flight: (flight['departure_time'], flight['flight_number']))
+    for flight in flights:
+        flight['departure_time'] = drf_datetime(flight['departure_time'])
+    return {
+        'site': site.code,
+        'profile': profile,
+        'label': spec['label'],
+        'generated_at': drf_datetime(timezone.now()),
+        'counters': list(boards.values()),
+        'flights': flights,
+    }
+
+
+FEEDS_VERSION_KEY = 'sioa:display-feeds:version'
+
+# {counter_id: (site_id, site_code, name)} pour un jeton global donné
+_counters_lock = threading.Lock()
+_counters = {'version': None, 'counters': None}
+
+
+def feed_tokens(site_code, profile):
+    """Jetons (global, profil) courants ; la paire identifie une version du flux."""
+    tokens = caches['versions'].get_many([FEEDS_VERSION_KEY, _version_key(site_code, profile)])
+    return tokens.get(FEEDS_VERSION_KEY), tokens.get(_version_key(site_code, profile))
+
+
+def refresh_display_feed(site, profile):
+    """Reconstruit le flux d'un profil et le publie dans le cache. Renvoie le JSON (bytes)."""
+    # Jetons lus avant la construction : une écriture pendant celle-ci périme le résultat
+    tokens = feed_tokens(site.code, profile)
+    payload = dumps(build_feed(site, profile))
+    cache.set(_payload_key(site.code, profile), (tokens, payload), None)
+    with _local_lock:
+        _local_feeds[(site.code, profile)] = (tokens, payload)
+    return payload
+
+
+def counter_feeds():
+    """
+    ``{counter_id: (site_id, site_code, name)}`` en mémoire, relu (une requête)
+    après chaque invalidation globale.
+    """
+    version = caches['versions'].get(FEEDS_VERSION_KEY)
+    with _counters_lock:
+        if _counters['counters'] is not None and _counters['version'] == version:
+            return _counters['counters']
+    counters = {
+        row[0]: row[1:] for row in Counter.objects.values_list('id', 'site_id', 'site__code', 'name')
+    }
+    with _counters_lock:
+        _counters.update(version=version, counters=counters)
+    return counters
+
+
+def invalidate_all_display_feeds():
+    """Périme tous les flux de tous les sites (vols, liste des comptoirs)."""
+    caches['versions'].set(FEEDS_VERSION_KEY, uuid.uuid4().hex, None)
+    with _counters_lock:
+        _counters['counters'] = None
+
+
+def invalidate_display_feeds(counter_ids=None):
+    """
+    Périme les flux qui affichent au moins un des comptoirs (tous si ``None``).
+    Aucun rendu ; une lecture de la liste des comptoirs au plus, après une
+    invalidation globale.
+    """
+    if counter_ids is None:
+        invalidate_all_display_feeds()
+        return
+    counters = counter_feeds()
+    if any(counter_id not in counters for counter_id in counter_ids):
+        # Comptoir inconnu de la liste en mémoire (créé depuis) : tout est périmé
+        invalidate_all_display_feeds()
+        return
+    keys = {
+        _version_key(site_code, profile)
+        for site_id, site_code, name in (counters[counter_id] for counter_id in counter_ids)
+        for profile, spec in PROFILES.items()
+        if spec['counters'] is None or name in spec['counters']
+    }
+    if keys:
+        token = uuid.uuid4().hex
+        caches['versions'].set_many({key: token for key in keys}, None)
+
+
+def counter_changed(counter):
+    """Comptoir enregistré : ses flux, ou tous si son nom ou son site a changé."""
+    known = counter_feeds().get(counter.pk)
+    if known is None or (known[0], known[2]) != (counter.site_id, counter.name):
+        invalidate_all_display_feeds()
+    else:
+        invalidate_display_feeds([counter.pk])
+
+
+def get_display_feed(site_code, profile):
+    """
+    JSON (bytes) du flux d'un profil : copie locale si ses jetons sont toujours
+    les jetons courants, sinon lecture du cache partagé, sinon reconstruction.
+
+    Raises:
+        KeyError: profil inconnu
+        Site.DoesNotExist: site inconnu (vérifié seulement à la reconstruction)
+    """
+    if profile not in PROFILES:
+        raise KeyError(profile)
+    tokens = feed_tokens(site_code, profile)
+    local = _local_feeds.get((site_code, profile))
+    if local is not None and local[0] == tokens:
+        return local[1]
+    shared = cache.get(_payload_key(site_code, profile))
+    if shared is not None and shared[0] == tokens:
+        with _local_lock:
+            _local_feeds[(site_code, profile)] = shared
+        return shared[1]
+    return refresh_display_feed(get_site(site_code), profile)
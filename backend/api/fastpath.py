@@ -0,0 +1,306 @@
+"""
+Chemin de lecture rapide des endpoints interrogés en boucle par les écrans.
+
+Au lieu d'instancier des modèles puis de passer par les serializers DRF
+(``source='service.name'``, ``CompanySerializer`` imbriqué...), chaque endpoint
+lit une projection ``.values()`` (jointures faites par la base, une requête)
+et construit directement des ``dict`` au même format que les serializers.
+
+Les querysets et les fonctions de construction sont séparés pour être
+partagés par les vues synchrones (``views.py``) et asynchrones (``async_views.py``).
+Les requêtes globales sont limitées au site de la requête (voir api/sites.py).
+
+Pour alléger les réponses envoyées aux écrans toutes les 2 s :
+
+- ``?fields=a,b`` ne renvoie que ces champs (ou ces sections des statistiques,
+  qui ne sont alors pas calculées) ;
+- ``?compact=1`` renvoie les listes en colonnes (``{"fields": [...], "rows":
+  [[...], ...]}``, objets imbriqués aplatis) et, pour les statistiques, omet
+  ``debug_tickets_info`` sauf demande explicite.
+"""
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Company, Counter, Service, Ticket
+from .tae import QUEUE_ORDERING
+
+ACTIVE_STATUSES = ['WAITING', 'CALLED']
+
+
+def drf_datetime(value):
+    """Même format que ``serializers.DateTimeField`` de DRF (UTC suffixé par Z)."""
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+# --- ?fields= et ?compact= ---
+
+class InvalidFields(ValueError):
+    """``?fields=`` contient un champ inconnu de l'endpoint."""
+
+
+def requested_fields(params, available):
+    """
+    Champs demandés par ``?fields=a,b`` dans l'ordre de ``available`` (None : tous).
+
+    Raises:
+        InvalidFields: champ inconnu
+    """
+    raw = params.get('fields')
+    if not raw:
+        return None
+    fields = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(fields.difference(available))
+    if unknown:
+        raise InvalidFields(f"Champs inconnus : {', '.join(unknown)}. Disponibles : {', '.join(available)}.")
+    return [name for name in available if name in fields]
+
+
+def is_compact(params):
+    return params.get('compact', '').lower() in ('1', 'true')
+
+
+def columns(rows, fields=None):
+    """
+    Format compact d'une liste de dicts : noms de colonnes une seule fois, puis
+    une liste de valeurs par ligne. Un objet imbriqué (``assigned_company``) est
+    aplati en ``assigned_company.id``, ``assigned_company.name``...
+    """
+    if fields is None:
+        fields = list(rows[0]) if rows else []
+    nested = {}
+    for field in fields:
+        sample = next((row[field] for row in rows if isinstance(row[field], dict)), None)
+        if sample is not None:
+            nested[field] = list(sample)
+    names = [
+        name for field in fields
+        for name in ([f"{field}.{key}" for key in nested[field]] if field in nested else [field])
+    ]
+    data = []
+    for row in rows:
+        values = []
+        for field in fields:
+            if field in nested:
+                value = row[field] or {}
+                values.extend(value.get(key) for key in nested[field])
+            else:
+                values.append(row[field])
+        data.append(values)
+    return {'fields': names, 'rows': data}
+
+
+def shape_rows(rows, params, available):
+    """
+    Applique ``?fields=`` puis ``?compact=`` à une liste de lignes.
+
+    Raises:
+        InvalidFields: champ inconnu
+    """
+    fields = requested_fields(params, available)
+    if fields is not None:
+        rows = [{name: row[name] for name in fields} for row in rows]
+    if is_compact(params):
+        return columns(rows, fields or list(available))
+    return rows
+
+
+# --- services/ ---
+
+SERVICE_FIELDS = ('id', 'site', 'name', 'prefix', 'description', 'is_active', 'priority_class')
+
+
+def services_queryset(site_id):
+    return Service.objects.filter(site_id=site_id).values(*SERVICE_FIELDS)
+
+
+# --- counters/ ---
+
+def counters_queryset(site_id):
+    return Counter.objects.filter(site_id=site_id).values(
+        'id', 'name', 'status', 'assigned_company_id', 'assigned_company__name', 'assigned_company__code',
+    )
+
+
+COUNTER_FIELDS = ('id', 'name', 'status', 'assigned_company')
+
+
+def counter_row(row):
+    company = None
+    if row['assigned_company_id'] is not None:
+        company = {
+            'id': row['assigned_company_id'],
+            'name': row['assigned_company__name'],
+            'code': row['assigned_company__code'],
+        }
+    return {'id': row['id'], 'name': row['name'], 'status': row['status'], 'assigned_company': company}
+
+
+# --- counters/<id>/tickets/ ---
+
+# Nombre maximal de tickets renvoyés par file (?limit= permet de réduire) ;
+# l'historique complet est servi, paginé, par tickets/
+MAX_COUNTER_TICKETS = 200
+
+
+def counter_tickets_limit(params):
+    try:
+        limit = int(params.get('limit', MAX_COUNTER_TICKETS))
+    except (TypeError, ValueError):
+        return MAX_COUNTER_TICKETS
+    return max(1, min(limit, MAX_COUNTER_TICKETS))
+
+
+def counter_tickets_queryset(counter_id, limit=MAX_COUNTER_TICKETS):
+    return (
+        Ticket.objects.filter(counter_id=counter_id, status__in=ACTIVE_STATUSES)
+        .order_by(*QUEUE_ORDERING)
+        .values(
+            'id', 'service_id', 'service__name', 'ticket_number', 'queue_number', 'created_at', 'status',
+            'estimated_waiting_time_minutes', 'queue_position', 'counter_id', 'counter__name',
+        )[:limit]
+    )
+
+
+TICKET_FIELDS = (
+    'id', 'service', 'service_name', 'ticket_number', 'queue_number', 'created_at', 'status',
+    'estimated_waiting_time_minutes', 'queue_position', 'counter', 'assigned_counter_name',
+)
+
+
+def ticket_row(row):
+    return {
+        'id': row['id'],
+        'service': row['service_id'],
+        'service_name': row['service__name'],
+        'ticket_number': row['ticket_number'],
+        'queue_number': row['queue_number'],
+        'created_at': drf_datetime(row['created_at']),
+        'status': row['status'],
+        'estimated_waiting_time_minutes': row['estimated_waiting_time_minutes'],
+        'queue_position': row['queue_position'],
+        'counter': row['counter_id'],
+        'assigned_counter_name': row['counter__name'],
+    }
+
+
+# --- tickets/statistics/ ---
+
+def active_tickets(site_id):
+    return Ticket.objects.filter(site_id=site_id, status__in=ACTIVE_STATUSES)
+
+
+def done_tickets(site_id):
+    return Ticket.objects.filter(site_id=site_id, status='DONE')
+
+
+# Agrégat unique pour le temps d'attente moyen (au lieu de charger chaque ticket DONE)
+DONE_TOTALS = {'done_count': Count('id'), 'total_estimated': Sum('estimated_waiting_time_minutes')}
+
+
+def average_wait(totals):
+    done_count = totals['done_count'] or 0
+    total_estimated = totals['total_estimated'] or 0
+    if done_count > 0 and total_estimated > 0:
+        return round(total_estimated / done_count)
+    return 0
+
+
+def companies_queryset():
+    return Company.objects.exclude(code__isnull=True).values_list('code', 'name')
+
+
+def waiting_by_company(ticket_numbers, companies):
+    """
+    Regroupe les tickets actifs par compagnie (code IATA = 2 premiers caractères).
+
+    Args:
+        ticket_numbers: numéros de vol des tickets actifs
+        companies: paires (code, nom) de toutes les compagnies
+    """
+    by_code = {}
+    for code, name in companies:
+        by_code.setdefault(code.upper(), (name, code))
+    counts = {}
+    for ticket_number in ticket_numbers:
+        if len(ticket_number) >= 2:
+            key = by_code.get(ticket_number[:2].upper())
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+    return [
+        {'counter__assigned_company__name': k[0], 'counter__assigned_company__code': k[1], 'count': v}
+        for k, v in sorted(counts.items())
+    ]
+
+
+def waiting_by_service_queryset(site_id):
+    return (
+        active_tickets(site_id).filter(service__isnull=False)
+        .values('service__name')
+        .annotate(count=Count('id'))
+        .order_by('service__name')
+    )
+
+
+def debug_tickets_queryset(site_id):
+    return Ticket.objects.filter(site_id=site_id).values(
+        'ticket_number', 'counter__name', 'counter__assigned_company__name', 'service__name', 'status',
+    )
+
+
+def debug_ticket_row(row):
+    return {
+        'ticket_number': row['ticket_number'],
+        'counter': row['counter__name'] or "N/A",
+        'company': row['counter__assigned_company__name'] or "N/A",
+        'service': row['service__name'] or "N/A",
+        'status': row['status'],
+    }
+
+
+STATISTICS_SECTIONS = (
+    'total_waiting_tickets', 'average_wait_time_minutes', 'waiting_tickets_by_company',
+    'waiting_tickets_by_service', 'debug_tickets_info',
+)
+# debug_tickets_info liste tous les tickets du site : hors du mode compact sauf ?fields=
+COMPACT_STATISTICS_SECTIONS = STATISTICS_SECTIONS[:-1]
+
+
+def statistics_sections(params):
+    """
+    Sections à calculer selon ``?fields=`` et ``?compact=``.
+
+    Raises:
+        InvalidFields: section inconnue
+    """
+    fields = requested_fields(params, STATISTICS_SECTIONS)
+    if fields is not None:
+        return fields
+    return COMPACT_STATISTICS_SECTIONS if is_compact(params) else STATISTICS_SECTIONS
+
+
+def shape_statistics(data, params):
+    if is_compact(params):
+        return {key: columns(value) if isinstance(value, list) else value for key, value in data.items()}
+    return data
+
+
+def ticket_statistics(site_id, sections=STATISTICS_SECTIONS):
+    """
+    Données de ``tickets/statistics/`` d'un site en 6 requêtes au plus, quel que
+    soit le volume ; seules les ``sections`` demandées sont calculées.
+    """
+    builders = {
+        'total_waiting_tickets': lambda: active_tickets(site_id).count(),
+        'average_wait_time_minutes': lambda: average_wait(done_tickets(site_id).aggregate(**DONE_TOTALS)),
+        'waiting_tickets_by_company': lambda: waiting_by_company(
+            active_tickets(site_id).values_list('ticket_number', flat=True), companies_queryset(),
+        ),
+        'waiting_tickets_by_service': lambda: list(waiting_by_service_queryset(site_id)),
+        'debug_tickets_info': lambda: [debug_ticket_row(row) for row in debug_tickets_queryset(site_id)],
+    }
+    return {name: builders[name]() for name in sections}
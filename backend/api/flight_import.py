@@ -0,0 +1,176 @@
+"""
+Import en masse du programme des vols (CSV ou JSON).
+
+Le fichier est lu en flux et traité par paquets : chaque paquet est validé,
+comparé aux vols existants en une requête, puis écrit en un seul
+``bulk_create(update_conflicts=True)`` sur la clé (flight_number, departure_time).
+
+Colonnes reconnues : ``flight_number``, ``departure_time`` (ISO 8601),
+``company_code`` (par défaut les 2 premiers caractères du numéro de vol),
+``status`` et ``gate``.
+"""
+import csv
+import datetime
+import json
+from itertools import chain, islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .display_feed import invalidate_all_display_feeds
+from .flight_lookup import invalidate_flight_index, normalize_flight_number
+from .models import Company, Flight
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+VALID_STATUSES = {code for code, _ in Flight.STATUS_CHOICES}
+
+
+def iter_schedule_rows(stream, fmt):
+    """
+    Itère sur les lignes d'un fichier de programme sans le charger en entier.
+
+    Le JSON est accepté en tableau (``[{...}, ...]``) ou en JSON Lines
+    (un objet par ligne) ; seul le JSON Lines est réellement lu en flux. Un
+    tableau mal formé est refusé en entier avant toute écriture ; une ligne
+    JSON Lines mal formée est produite sous forme de ``ValueError`` et rejetée
+    comme une ligne invalide, sans interrompre l'import des paquets suivants.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    if fmt != 'json':
+        raise ValueError(f"Format '{fmt}' non supporté (csv ou json).")
+
+    first_line = stream.readline()
+    if first_line.lstrip().startswith('['):
+        yield from json.loads(first_line + stream.read())
+        return
+    for line in chain([first_line], stream):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"JSON invalide: {e}")
+
+
+def parse_schedule_row(row, companies):
+    """
+    Valide une ligne et renvoie un ``Flight`` non sauvegardé.
+
+    Lève ``ValueError`` avec un message lisible si la ligne est invalide.
+    """
+    if isinstance(row, ValueError):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError("objet JSON attendu")
+    flight_number = (row.get('flight_number') or '').strip().upper()
+    if not flight_number:
+        raise ValueError("flight_number manquant")
+
+    raw_departure = (row.get('departure_time') or '').strip()
+    departure_time = parse_datetime(raw_departure) if raw_departure else None
+    if departure_time is None:
+        raise ValueError(f"departure_time invalide: '{raw_departure}'")
+    if timezone.is_naive(departure_time):
+        departure_time = timezone.make_aware(departure_time)
+
+    company_code = (row.get('company_code') or flight_number[:2]).strip().upper()
+    company = companies.get(company_code)
+    if company is None:
+        raise ValueError(f"code compagnie '{company_code}' introuvable")
+
+    flight_status = (row.get('status') or 'ON_TIME').strip().upper()
+    if flight_status not in VALID_STATUSES:
+        raise ValueError(f"statut '{flight_status}' invalide")
+
+    gate = (row.get('gate') or '').strip() or None
+
+    return Flight(
+        flight_number=flight_number,
+        normalized_number=normalize_flight_number(flight_number),
+        company=company,
+        departure_time=departure_time,
+        status=flight_status,
+        gate=gate,
+    )
+
+
+def _flight_key(flight_number, departure_time):
+    return flight_number, departure_time.astimezone(datetime.timezone.utc)
+
+
+def import_flights(stream, fmt='csv', chunk_size=CHUNK_SIZE):
+    """
+    Importe un programme de vols et renvoie le bilan de l'import.
+
+    Returns:
+        report: dict avec ``inserted``, ``updated``, ``unchanged``,
+        ``rejected`` et les premières ``errors`` (numéro de ligne + message)
+    """
+    # Résolution des codes compagnie en mémoire : une seule requête pour tout l'import
+    companies = {
+        company.code.upper(): company
+        for company in Company.objects.exclude(code__isnull=True).exclude(code='')
+    }
+    report = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'errors': []}
+
+    rows = enumerate(iter_schedule_rows(stream, fmt), start=1)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        # 1. Validation du paquet (la dernière occurrence d'une même clé l'emporte)
+        parsed = {}
+        for line_number, row in chunk:
+            try:
+                flight = parse_schedule_row(row, companies)
+            except (ValueError, TypeError, AttributeError) as e:
+                report['rejected'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'line': line_number, 'error': str(e)})
+                continue
+            parsed[_flight_key(flight.flight_number, flight.departure_time)] = flight
+        if not parsed:
+            continue
+
+        # 2. Vols déjà connus pour ce paquet, en une requête
+        departures = [key[1] for key in parsed]
+        existing = {
+            _flight_key(number, departure): (company_id, flight_status, gate)
+            for number, departure, company_id, flight_status, gate in Flight.objects.filter(
+                flight_number__in={key[0] for key in parsed},
+                departure_time__range=(min(departures), max(departures)),
+            ).values_list('flight_number', 'departure_time', 'company_id', 'status', 'gate')
+        }
+
+        # 3. Seules les lignes nouvelles ou modifiées sont écrites
+        to_write = []
+        for key, flight in parsed.items():
+            current = existing.get(key)
+            if current is None:
+                report['inserted'] += 1
+            elif current == (flight.company_id, flight.status, flight.gate):
+                report['unchanged'] += 1
+                continue
+            else:
+                report['updated'] += 1
+            to_write.append(flight)
+
+        if to_write:
+            with transaction.atomic():
+                Flight.objects.bulk_create(
+                    to_write,
+                    update_conflicts=True,
+                    unique_fields=['flight_number', 'departure_time'],
+                    update_fields=['company', 'status', 'gate'],
+                )
+
+    # bulk_create n'envoie pas de signaux : l'index des vols du jour et les écrans sont mis à jour ici
+    if report['inserted'] or report['updated']:
+        invalidate_flight_index()
+        transaction.on_commit(invalidate_all_display_feeds)
+    return report
@@ -0,0 +1,136 @@
+"""
+Résolution d'un numéro de vol saisi à la borne vers un ``Flight`` précis.
+
+Le même numéro existe sur plusieurs jours (``unique_together`` avec
+``departure_time``) : on choisit le départ pertinent, c'est-à-dire celui
+d'aujourd'hui encore à venir (ou parti depuis peu), sinon le prochain.
+
+Les vols du jour sont gardés en mémoire dans un index
+``numéro normalisé -> départs`` ; l'index est invalidé à chaque modification
+du programme (signaux de ``Flight`` et import en masse) via un jeton de
+version rangé dans le cache partagé des jetons (alias ``versions`` de ``CACHES``) : un import lancé en ligne de
+commande ou une modification faite par un autre worker invalide l'index de
+tous les processus.
+"""
+import datetime
+import re
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Flight
+
+# Un vol parti depuis moins longtemps reste "le vol du jour" (retards, embarquement)
+DEPARTED_GRACE = datetime.timedelta(hours=1)
+SCHEDULE_VERSION_KEY = 'sioa:flight-schedule-version'
+
+# Code compagnie IATA (2 caractères, dont au plus un chiffre) + numéro + suffixe optionnel
+FLIGHT_NUMBER_RE = re.compile(r'^([A-Z]{2}|[A-Z]\d|\d[A-Z])(\d{1,5})([A-Z]?)$')
+CODESHARE_SEPARATORS_RE = re.compile(r'[/,;|]')
+
+_index_lock = threading.Lock()
+_today_index = {'day': None, 'version': None, 'flights': {}}
+
+
+def normalize_flight_number(raw):
+    """
+    Forme canonique d'un numéro de vol : majuscules, sans espaces ni tirets,
+    sans zéros en tête du numéro. Ex : ``"af 0480"`` -> ``"AF480"``.
+    """
+    compact = re.sub(r'[^A-Z0-9]', '', (raw or '').upper())
+    match = FLIGHT_NUMBER_RE.match(compact)
+    if not match:
+        return compact
+    designator, number, suffix = match.groups()
+    return f"{designator}{int(number)}{suffix}"
+
+
+def flight_number_candidates(raw):
+    """
+    Numéros normalisés contenus dans une saisie, dans l'ordre : un vol en
+    partage de code (``"AF480/KL2030"``) donne un candidat par numéro.
+    """
+    candidates = []
+    for part in CODESHARE_SEPARATORS_RE.split(raw or ''):
+        normalized = normalize_flight_number(part)
+        if normalized and normalized not in candidates:
+            candidates.append(normalized)
+    return candidates
+
+
+def schedule_version():
+    return caches['versions'].get(SCHEDULE_VERSION_KEY, 0)
+
+
+def invalidate_flight_index():
+    """À appeler après toute modification du programme des vols."""
+    # Jeton aléatoire plutôt que incr() : incr() du cache fichier n'est pas atomique
+    # entre processus, deux invalidations simultanées pourraient n'en faire qu'une
+    caches['versions'].set(SCHEDULE_VERSION_KEY, uuid.uuid4().hex, None)
+    with _index_lock:
+        _today_index['version'] = None
+
+
+def todays_flights():
+    """
+    Index en mémoire des vols du jour : ``{numéro normalisé: [Flight, ...]}``,
+    chaque liste triée par heure de départ. Reconstruit en une requête quand
+    le jour ou la version du programme change.
+    """
+    day = timezone.localdate()
+    version = schedule_version()
+    with _index_lock:
+        if _today_index['day'] == day and _today_index['version'] == version:
+            return _today_index['flights']
+
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    flights = {}
+    for flight in Flight.objects.select_related('company').filter(
+        departure_time__gte=start, departure_time__lt=start + datetime.timedelta(days=1)
+    ).order_by('departure_time'):
+        flights.setdefault(flight.normalized_number, []).append(flight)
+
+    with _index_lock:
+        _today_index.update(day=day, version=version, flights=flights)
+    return flights
+
+
+def resolve_flight(raw, now=None):
+    """
+    Trouve le vol correspondant à une saisie (casse, espaces, zéros, partage de code).
+
+    Ordre de préférence pour chaque candidat :
+    1. le premier vol du jour qui n'est pas parti depuis plus de ``DEPARTED_GRACE`` ;
+    2. le prochain départ (requête indexée sur ``normalized_number``) ;
+    3. le dernier vol du jour, même déjà parti.
+
+    Returns:
+        Le ``Flight`` (avec sa compagnie) ou None
+    """
+    now = now or timezone.now()
+    candidates = flight_number_candidates(raw)
+    if not candidates:
+        return None
+
+    index = todays_flights()
+    for number in candidates:
+        for flight in index.get(number, []):
+            if flight.departure_time >= now - DEPARTED_GRACE:
+                return flight
+
+    for number in candidates:
+        upcoming = (
+            Flight.objects.select_related('company')
+            .filter(normalized_number=number, departure_time__gte=now)
+            .order_by('departure_time')
+            .first()
+        )
+        if upcoming is not None:
+            return upcoming
+
+    for number in candidates:
+        if index.get(number):
+            return index[number][-1]
+    return None
@@ -0,0 +1,210 @@
+"""
+Prévision des arrivées par compagnie, par tranche de 15 minutes.
+
+Deux ingrédients par compagnie :
+
+- le profil d'arrivée : part des voyageurs arrivant ``k`` tranches avant le
+  départ de leur vol, mesurée sur l'historique du site (tickets liés à un vol,
+  ``HISTORY_DAYS`` derniers jours). Sans historique suffisant, un profil par
+  défaut (``DEFAULT_PROFILE``) ;
+- le volume par vol : tickets par vol dans l'historique, sinon
+  ``Company.average_daily_passengers`` réparti sur les vols du jour.
+
+Seules les compagnies ayant un comptoir au site sont prévues : les vols des
+autres ne passent pas par ses files. Leurs départs de la journée (et ceux du
+lendemain matin, dont les voyageurs arrivent avant minuit) sont comptés par
+tranche, puis convolués avec le profil :
+``arrivées[t] = volume * Σ_k départs[t + k] * profil[k]``. Avec NumPy
+(optionnel), la convolution est faite d'un bloc pour toutes les compagnies ;
+sans NumPy, une boucle Python donne le même résultat.
+
+Les profils sont recalculés une fois par jour ; la prévision est gardée en
+cache jusqu'à la prochaine modification du programme des vols (même jeton de
+version, dans le cache partagé, que l'index des vols, voir api/flight_lookup.py)
+ou de l'affectation d'un comptoir (``invalidate_forecasts``).
+"""
+import datetime
+import uuid
+
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from .flight_lookup import schedule_version
+from .models import Company, Counter, Flight, Ticket
+
+try:
+    import numpy
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # pragma: no cover - numpy est optionnel
+    numpy = None
+
+BIN_MINUTES = 15
+BIN = datetime.timedelta(minutes=BIN_MINUTES)
+BINS_PER_DAY = 24 * 60 // BIN_MINUTES
+# Voyageurs arrivant au plus 4 h avant le départ ; au-delà, l'arrivée est ignorée
+LEAD_BINS = 16
+HISTORY_DAYS = 28
+# En dessous, le profil de la compagnie n'est pas significatif : profil par défaut
+MIN_SAMPLES = 30
+# Poids par tranche avant le départ (indice 0 : dernier quart d'heure), fermeture à H-45
+DEFAULT_PROFILE = (0, 0, 0, 2, 6, 10, 14, 16, 16, 14, 10, 6, 3, 2, 1, 0)
+CACHE_TTL = 24 * 3600
+# Jeton changé à chaque création, suppression ou réaffectation de comptoir (voir signals.py)
+COUNTERS_VERSION_KEY = 'sioa:forecast-counters-version'
+
+
+def counters_version():
+    return caches['versions'].get(COUNTERS_VERSION_KEY, 0)
+
+
+def invalidate_forecasts():
+    """À appeler quand la compagnie ou le site d'un comptoir change."""
+    caches['versions'].set(COUNTERS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def normalized(weights):
+    total = sum(weights)
+    return [weight / total for weight in weights] if total else [0.0] * len(weights)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def arrival_profiles(site_id, day):
+    """
+    ``{company_id: {'profile': [...], 'tickets_per_flight': float, 'samples': int}}``
+    mesurés sur les ``HISTORY_DAYS`` jours précédant ``day``. Une requête,
+    résultat gardé en cache pour la journée.
+    """
+    key = f'sioa:forecast-profiles:{site_id}:{day.isoformat()}'
+    profiles = cache.get(key)
+    if profiles is not None:
+        return profiles
+
+    end, _ = day_bounds(day)
+    rows = Ticket.objects.filter(
+        site_id=site_id, flight__isnull=False,
+        created_at__gte=end - datetime.timedelta(days=HISTORY_DAYS), created_at__lt=end,
+    ).values_list('flight__company_id', 'flight_id', 'created_at', 'flight__departure_time')
+
+    counts, flights, tickets = {}, {}, {}
+    for company_id, flight_id, created_at, departure_time in rows.iterator():
+        tickets[company_id] = tickets.get(company_id, 0) + 1
+        flights.setdefault(company_id, set()).add(flight_id)
+        lead = int((departure_time - created_at) // BIN)
+        if 0 <= lead < LEAD_BINS:
+            counts.setdefault(company_id, [0] * LEAD_BINS)[lead] += 1
+
+    profiles = {}
+    for company_id, total in tickets.items():
+        weights = counts.get(company_id, [0] * LEAD_BINS)
+        samples = sum(weights)
+        profiles[company_id] = {
+            'profile': normalized(weights if samples >= MIN_SAMPLES else DEFAULT_PROFILE),
+            'tickets_per_flight': total / len(flights[company_id]),
+            'samples': samples,
+        }
+    cache.set(key, profiles, CACHE_TTL)
+    return profiles
+
+
+def convolve(departures, profiles):
+    """
+    Arrivées par tranche de la journée pour chaque ligne de ``departures``
+    (``BINS_PER_DAY + LEAD_BINS`` tranches) et le profil correspondant.
+    """
+    if not departures:
+        return []
+    if numpy is not None:
+        windows = sliding_window_view(numpy.asarray(departures, dtype=float), LEAD_BINS, axis=1)
+        arrivals = numpy.einsum('ctk,ck->ct', windows[:, :BINS_PER_DAY], numpy.asarray(profiles, dtype=float))
+        return arrivals.tolist()
+    return [
+        [sum(row[t + k] * profile[k] for k in range(LEAD_BINS) if row[t + k]) for t in range(BINS_PER_DAY)]
+        for row, profile in zip(departures, profiles)
+    ]
+
+
+def forecast_day(site_id, day):
+    """
+    Prévision des arrivées au site pour ``day`` : une série de
+    ``BINS_PER_DAY`` valeurs par compagnie ayant des vols et un comptoir au
+    site, plus le total.
+    Gardée en cache jusqu'à la prochaine modification du programme des vols.
+    """
+    key = f'sioa:forecast:{site_id}:{day.isoformat()}:{schedule_version()}:{counters_version()}'
+    forecast = cache.get(key)
+    if forecast is not None:
+        return forecast
+
+    start, end = day_bounds(day)
+    flights = Flight.objects.filter(
+        departure_time__gte=start, departure_time__lt=end + LEAD_BINS * BIN,
+        company_id__in=Counter.objects.filter(site_id=site_id).values('assigned_company_id'),
+    ).exclude(status='CANCELLED').values_list('company_id', 'departure_time')
+
+    departures, flights_today = {}, {}
+    for company_id, departure_time in flights:
+        row = departures.setdefault(company_id, [0] * (BINS_PER_DAY + LEAD_BINS))
+        row[int((departure_time - start) // BIN)] += 1
+        if departure_time < end:
+            flights_today[company_id] = flights_today.get(company_id, 0) + 1
+
+    history = arrival_profiles(site_id, day)
+    companies = {
+        company['id']: company
+        for company in Company.objects.filter(pk__in=list(departures)).values('id', 'code', 'name', 'average_daily_passengers')
+    }
+    company_ids = sorted(departures)
+    volumes, profiles = [], []
+    for company_id in company_ids:
+        measured = history.get(company_id)
+        if measured is not None:
+            volumes.append(measured['tickets_per_flight'])
+            profiles.append(measured['profile'])
+        else:
+            volumes.append(companies[company_id]['average_daily_passengers'] / max(flights_today.get(company_id, 0), 1))
+            profiles.append(normalized(DEFAULT_PROFILE))
+
+    arrivals = convolve([departures[company_id] for company_id in company_ids], profiles)
+    total = [0.0] * BINS_PER_DAY
+    series = []
+    for company_id, volume, row in zip(company_ids, volumes, arrivals):
+        row = [round(value * volume, 2) for value in row]
+        total = [a + b for a, b in zip(total, row)]
+        company = companies[company_id]
+        series.append({
+            'company_id': company_id,
+            'code': company['code'],
+            'name': company['name'],
+            'source': 'history' if company_id in history else 'default',
+            'arrivals': row,
+            'total': round(sum(row), 2),
+        })
+
+    forecast = {
+        'date': day.isoformat(),
+        'bin_minutes': BIN_MINUTES,
+        'start': start,
+        'companies': series,
+        'total': [round(value, 2) for value in total],
+    }
+    cache.set(key, forecast, CACHE_TTL)
+    return forecast
+
+
+def window(forecast, since, hours):
+    """Restreint une prévision aux ``hours`` heures à partir de la tranche contenant ``since``."""
+    first = max(0, int((since - forecast['start']) // BIN))
+    last = min(BINS_PER_DAY, first + hours * 60 // BIN_MINUTES)
+    return {
+        **forecast,
+        'start': forecast['start'] + first * BIN,
+        'companies': [
+            {**company, 'arrivals': company['arrivals'][first:last], 'total': round(sum(company['arrivals'][first:last]), 2)}
+            for company in forecast['companies']
+        ],
+        'total': forecast['total'][first:last],
+    }
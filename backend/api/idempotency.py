@@ -0,0 +1,141 @@
+"""
+En-tête ``Idempotency-Key`` pour l'émission de tickets.
+
+Une borne qui n'a pas reçu de réponse (timeout) renvoie la même requête avec
+la même clé. Sans protection, chaque relance crée un ticket, consomme un numéro
+et allonge la file. Ici, la première requête réserve la clé (INSERT d'une ligne
+``IdempotencyKey`` sans réponse) puis y enregistre sa réponse ; une relance :
+
+- rejoue la réponse enregistrée, sans aucun travail sur les tickets, comptoirs
+  ou TAE (en-tête ``Idempotent-Replayed: true``) ;
+- est refusée sans attendre (409 avec ``Retry-After``) si la première requête
+  est encore en cours : attendre ici bloquerait un worker WSGI, ou le thread
+  ORM partagé par toutes les vues asynchrones ;
+- est refusée (422) si la clé est réutilisée avec un autre corps.
+
+Les clés expirent après ``SIOA_IDEMPOTENCY_TTL_SECONDS`` et sont purgées par
+la tâche ``purge_idempotency_keys`` (voir api/jobs.py).
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+TTL = datetime.timedelta(seconds=getattr(settings, 'SIOA_IDEMPOTENCY_TTL_SECONDS', 3600))
+# Délai suggéré (Retry-After, secondes) à une relance arrivée pendant la première requête
+RETRY_AFTER = 1
+# Réservations concurrentes de la même clé : nouvelles lectures avant d'abandonner
+MAX_ATTEMPTS = 3
+# Au-delà, une requête sans réponse est considérée abandonnée (worker tué) et peut être reprise
+ABANDON_AFTER = datetime.timedelta(seconds=30)
+
+
+class IdempotencyError(Exception):
+    status_code = 400
+
+
+class IdempotencyMismatch(IdempotencyError):
+    """Clé déjà utilisée avec un autre corps de requête."""
+    status_code = 422
+
+
+class IdempotencyInProgress(IdempotencyError):
+    """La première requête portant cette clé n'est pas terminée (réessayer après ``retry_after`` s)."""
+    status_code = 409
+    retry_after = RETRY_AFTER
+
+
+def request_key(request):
+    """
+    Clé envoyée par le client (None sans en-tête).
+
+    Raises:
+        IdempotencyError: clé trop longue
+    """
+    key = request.headers.get(HEADER, '').strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(f"{HEADER} dépasse {MAX_KEY_LENGTH} caractères.")
+    return key
+
+
+def fingerprint(data):
+    """Empreinte d'un corps de requête (dict ou QueryDict), indépendante de l'ordre des champs."""
+    canonical = {name: data.get(name) for name in sorted(data)}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def begin(scope, key, request_fingerprint):
+    """
+    Réserve la clé pour la requête courante, sans jamais attendre.
+
+    Returns:
+        None si l'appelant doit traiter la requête (puis appeler ``complete``
+        ou ``abort``), sinon ``(status_code, response)`` de la requête d'origine
+
+    Raises:
+        IdempotencyMismatch, IdempotencyInProgress
+    """
+    for _ in range(MAX_ATTEMPTS):
+        now = timezone.now()
+        # Lecture d'abord : une relance coûte une seule requête indexée
+        record = (
+            IdempotencyKey.objects.filter(scope=scope, key=key)
+            .values('pk', 'fingerprint', 'status_code', 'response', 'started_at', 'expires_at')
+            .first()
+        )
+        if record is None:
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(
+                        scope=scope, key=key, fingerprint=request_fingerprint, started_at=now, expires_at=now + TTL,
+                    )
+                return None
+            except IntegrityError:
+                # Réservée entre-temps par une requête identique concurrente
+                continue
+        if record['expires_at'] <= now:
+            IdempotencyKey.objects.filter(pk=record['pk'], expires_at__lte=now).delete()
+            continue
+        if record['fingerprint'] != request_fingerprint:
+            raise IdempotencyMismatch(f"{HEADER} déjà utilisée pour une autre requête.")
+        if record['status_code'] is not None:
+            return record['status_code'], record['response']
+        if record['started_at'] <= now - ABANDON_AFTER:
+            # Reprise d'une requête abandonnée : UPDATE conditionnel, un seul repreneur
+            taken = IdempotencyKey.objects.filter(
+                pk=record['pk'], status_code__isnull=True, started_at=record['started_at'],
+            ).update(started_at=now)
+            if taken:
+                return None
+            continue
+        break
+    raise IdempotencyInProgress("Requête identique en cours de traitement, réessayer.")
+
+
+def complete(scope, key, status_code, response):
+    """Enregistre la réponse ; les réponses 5xx ne sont pas conservées (la relance retraite)."""
+    if status_code >= 500:
+        abort(scope, key)
+        return
+    IdempotencyKey.objects.filter(scope=scope, key=key, status_code__isnull=True).update(
+        status_code=status_code, response=response,
+    )
+
+
+def abort(scope, key):
+    """Libère la clé après une erreur : la relance sera traitée normalement."""
+    IdempotencyKey.objects.filter(scope=scope, key=key, status_code__isnull=True).delete()
+
+
+def purge_expired(now=None):
+    return IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
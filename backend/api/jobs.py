@@ -0,0 +1,23 @@
+"""
+Tâches périodiques de maintenance des files, exécutées par ``run_scheduler``.
+"""
+from .idempotency import purge_expired
+from .scheduler import job
+from .sweeper import sweep_expired_tickets
+from .tae import recompute_all_queues
+
+
+@job('sweep_expired_tickets', interval_seconds=60)
+def sweep_tickets_job():
+    sweep_expired_tickets()
+
+
+@job('tae_refresh', interval_seconds=300)
+def tae_refresh_job():
+    # Rattrapage : les files sont déjà recalculées à chaque changement d'état
+    recompute_all_queues()
+
+
+@job('purge_idempotency_keys', interval_seconds=300)
+def purge_idempotency_keys_job():
+    purge_expired()
@@ -0,0 +1,172 @@
+"""
+Émission de tickets par les bornes hors ligne et synchronisation différée.
+
+Quand l'API est lente ou injoignable, la borne ne peut plus attendre le
+serveur pour imprimer un ticket. Elle réserve donc à l'avance un bloc de
+numéros de file (``KioskLease``, pris sur la même ``QueueSequence`` que les
+tickets émis en ligne : pas de doublon possible), émet localement dans ce bloc
+puis envoie les tickets par lots à ``kiosks/<kiosk_id>/sync/``.
+
+Chaque ticket porte un ``client_uuid`` généré par la borne : renvoyer un lot
+(réseau coupé pendant la réponse, relance) ne crée jamais de doublon. Un numéro
+du bail déjà attribué ce jour-là sur le site (borne qui réutilise un numéro
+après une réinitialisation) est refusé. À
+l'ingestion, le serveur résout le vol, assigne le comptoir et calcule le TAE
+comme pour une émission en ligne (voir ``views.emettre_ticket``), en gardant
+l'heure d'émission réelle pour l'ordre de passage.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import routing
+from .flight_lookup import resolve_flight
+from .models import Company, KioskLease, QueueSequence, Service, Ticket
+
+DEFAULT_LEASE_SIZE = 50
+MAX_LEASE_SIZE = 500
+MAX_SYNC_BATCH = 500
+# Décalage d'horloge toléré entre la borne et le serveur
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=5)
+
+
+def grant_lease(site, kiosk_id, service, size=DEFAULT_LEASE_SIZE):
+    """
+    Réserve ``size`` numéros consécutifs du jour pour le préfixe du service.
+    Un seul UPDATE sur la séquence, quel que soit ``size``.
+    """
+    day = timezone.localdate()
+    end = QueueSequence.next_value(site.id, service.prefix, day, count=size)
+    return KioskLease.objects.create(
+        site=site, kiosk_id=kiosk_id, service=service, day=day, start=end - size + 1, end=end,
+    )
+
+
+def parse_queue_number(queue_number, prefix):
+    """Numéro (int) d'un queue_number « A051 » pour le préfixe donné, sinon None."""
+    if not queue_number.startswith(prefix) or not queue_number[len(prefix):].isdigit():
+        return None
+    return int(queue_number[len(prefix):])
+
+
+def _covering_lease(leases, service, day, number):
+    for lease in leases:
+        if lease.service_id == service.id and lease.day == day and lease.start <= number <= lease.end:
+            return lease
+    return None
+
+
+def _day_bounds(days):
+    start = timezone.make_aware(datetime.datetime.combine(min(days), datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(max(days), datetime.time.min))
+    return start, end + datetime.timedelta(days=1)
+
+
+def _existing(ticket):
+    return {
+        'client_uuid': str(ticket.client_uuid),
+        'status': 'duplicate',
+        'queue_number': ticket.queue_number,
+        'estimated_waiting_time_minutes': ticket.estimated_waiting_time_minutes,
+        'assigned_counter': ticket.counter.name if ticket.counter_id else "Aucun",
+    }
+
+
+def _rejected(item, error):
+    return {'client_uuid': str(item['client_uuid']), 'status': 'rejected', 'error': error}
+
+
+def sync_tickets(site, kiosk_id, items):
+    """
+    Ingère un lot de tickets émis hors ligne par une borne.
+
+    Args:
+        site: Le Site de la borne
+        kiosk_id: Identifiant de la borne (celui de ses baux)
+        items: dicts validés par ``KioskTicketSerializer``
+
+    Returns:
+        Un résultat par ticket, dans l'ordre du lot : ``created``,
+        ``duplicate`` (déjà reçu) ou ``rejected`` (avec ``error``)
+    """
+    from .views import emettre_ticket
+
+    uuids = [item['client_uuid'] for item in items]
+    known = {
+        ticket.client_uuid: ticket
+        for ticket in Ticket.objects.filter(client_uuid__in=uuids).select_related('counter')
+    }
+    services = Service.objects.in_bulk({item['service_id'] for item in items})
+    days = {timezone.localdate(item['issued_at']) for item in items}
+    leases = list(KioskLease.objects.filter(site=site, kiosk_id=kiosk_id, day__in=days))
+    # Numéros du lot déjà attribués, par jour (une requête)
+    used = {
+        (queue_number, timezone.localdate(created_at))
+        for queue_number, created_at in Ticket.objects.filter(
+            site=site,
+            queue_number__in={item['queue_number'].upper() for item in items},
+            created_at__range=_day_bounds(days),
+        ).exclude(client_uuid__in=uuids).values_list('queue_number', 'created_at')
+    } if items else set()
+    now = timezone.now()
+
+    results = []
+    # Ordre d'émission : le TAE de chaque ticket tient compte des précédents du lot
+    for index in sorted(range(len(items)), key=lambda i: items[i]['issued_at']):
+        item = items[index]
+        if item['client_uuid'] in known:
+            results.append((index, _existing(known[item['client_uuid']])))
+            continue
+
+        service = services.get(item['service_id'])
+        if service is None or service.site_id != site.id:
+            results.append((index, _rejected(item, f"Service '{item['service_id']}' introuvable.")))
+            continue
+        if item['issued_at'] > now + MAX_CLOCK_SKEW:
+            results.append((index, _rejected(item, "Heure d'émission dans le futur.")))
+            continue
+        queue_number = item['queue_number'].upper()
+        number = parse_queue_number(queue_number, service.prefix)
+        day = timezone.localdate(item['issued_at'])
+        if number is None or _covering_lease(leases, service, day, number) is None:
+            results.append((index, _rejected(item, f"Numéro '{queue_number}' hors des baux de la borne.")))
+            continue
+        if (queue_number, day) in used:
+            results.append((index, _rejected(item, f"Numéro '{queue_number}' déjà attribué.")))
+            continue
+
+        ticket_number = item['ticket_number'].upper()
+        if not routing.requires_flight(service):
+            company, flight = None, None
+        else:
+            flight = resolve_flight(ticket_number, now=item['issued_at'])
+            if flight is None:
+                # Vol non planifié : le passager est servi par un comptoir de sa compagnie
+                company = Company.objects.filter(code__iexact=ticket_number[:2]).first()
+                if company is None:
+                    results.append((index, _rejected(item, f"Code compagnie '{ticket_number[:2]}' introuvable.")))
+                    continue
+            else:
+                company = flight.company
+                ticket_number = flight.flight_number
+
+        try:
+            with transaction.atomic():
+                data = emettre_ticket(
+                    service, company, ticket_number, flight=flight, issued_at=item['issued_at'],
+                    queue_number=queue_number, client_uuid=item['client_uuid'],
+                )
+        except IntegrityError:
+            # Même lot reçu en parallèle (relance pendant l'ingestion)
+            ticket = Ticket.objects.select_related('counter').filter(client_uuid=item['client_uuid']).first()
+            if ticket is None:
+                raise
+            known[item['client_uuid']] = ticket
+            results.append((index, _existing(ticket)))
+            continue
+        used.add((queue_number, day))
+        data.update({'client_uuid': str(item['client_uuid']), 'status': 'created'})
+        results.append((index, data))
+
+    return [result for _, result in sorted(results, key=lambda pair: pair[0])]
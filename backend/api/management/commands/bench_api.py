@@ -0,0 +1,96 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+# Les endpoints interrogés par chaque écran (agent, superviseur, display) toutes les 2 s
+DASHBOARD_PATHS = [
+    'services/',
+    'counters/',
+    'tickets/statistics/',
+    'display/zone-a/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule N tableaux de bord qui interrogent l'API en boucle et mesure le débit "
+        "et la latence. Lancer une fois contre le serveur WSGI (--base-url .../api/) "
+        "puis contre uvicorn (--base-url .../api/async/) pour comparer. --encoding et "
+        "--query mesurent l'effet de la compression et de ?fields= / ?compact= sur les "
+        "octets transférés."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/')
+        parser.add_argument('--clients', type=int, default=50, help="Nombre de tableaux de bord simultanés.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Durée du test (secondes).")
+        parser.add_argument('--path', action='append', dest='paths', help="Endpoint à interroger (répétable).")
+        parser.add_argument('--timeout', type=float, default=10.0)
+        parser.add_argument(
+            '--encoding', default='', help="En-tête Accept-Encoding envoyé (ex: gzip, br ; défaut : aucun).",
+        )
+        parser.add_argument('--query', default='', help="Paramètres ajoutés à chaque URL (ex: compact=1).")
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/') + '/'
+        paths = options['paths'] or DASHBOARD_PATHS
+        clients = options['clients']
+        deadline = time.monotonic() + options['duration']
+        timeout = options['timeout']
+        headers = {'Accept-Encoding': options['encoding']} if options['encoding'] else {}
+        query = '?' + options['query'] if options['query'] else ''
+
+        latencies = []
+        transferred = [0]
+        errors = [0]
+        lock = threading.Lock()
+
+        def dashboard(index):
+            # Chaque client parcourt les endpoints comme le ferait un écran
+            n = index
+            while time.monotonic() < deadline:
+                request = urllib.request.Request(base_url + paths[n % len(paths)] + query, headers=headers)
+                n += 1
+                started = time.perf_counter()
+                size = None
+                try:
+                    # Corps lu tel que reçu (compressé ou non), sans décompression
+                    with urllib.request.urlopen(request, timeout=timeout) as response:
+                        size = len(response.read())
+                except (urllib.error.URLError, OSError):
+                    pass
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if size is not None:
+                        latencies.append(elapsed)
+                        transferred[0] += size
+                    else:
+                        errors[0] += 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(dashboard, range(clients)))
+        wall = time.monotonic() - started
+
+        self.stdout.write(f"Cible      : {base_url} ({', '.join(paths)}){query}")
+        self.stdout.write(f"Clients    : {clients} pendant {wall:.1f} s")
+        self.stdout.write(f"Requêtes   : {len(latencies)} OK, {errors[0]} en erreur")
+        if not latencies:
+            self.stdout.write(self.style.ERROR("Aucune réponse reçue."))
+            return
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(f"Débit      : {len(latencies) / wall:.1f} req/s")
+        self.stdout.write(
+            f"Latence    : p50 {statistics.median(latencies):.1f} ms, "
+            f"p95 {p95:.1f} ms, max {latencies[-1]:.1f} ms"
+        )
+        self.stdout.write(
+            f"Volume     : {transferred[0] / len(latencies):.0f} octets/réponse "
+            f"({options['encoding'] or 'sans compression'}), {transferred[0] / wall / 1024:.1f} Kio/s"
+        )
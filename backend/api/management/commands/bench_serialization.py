@@ -0,0 +1,120 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api import compression, fastpath
+from api.models import Counter, Service, Ticket
+from api.renderers import FastJSONRenderer
+from api.serializers import CounterSerializer, ServiceSerializer, TicketSerializer
+from api.sites import default_site_code, get_site
+from api.tae import QUEUE_ORDERING
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, pour les endpoints de polling, le chemin serializer DRF + JSONRenderer "
+        "et le chemin rapide (projection .values() + FastJSONRenderer) : temps médian, "
+        "nombre de requêtes et taille de la réponse (brute et compressée), puis les modes "
+        "?fields= et ?compact=. À lancer après seed_data --tickets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Nombre de mesures par endpoint.")
+        parser.add_argument('--site', default=None, help="Code du site mesuré (défaut : SIOA_DEFAULT_SITE).")
+
+    def handle(self, *args, **options):
+        site = get_site(options['site'] or default_site_code())
+        busiest = (
+            Ticket.objects.filter(site=site, status__in=fastpath.ACTIVE_STATUSES, counter__isnull=False)
+            .values('counter_id').annotate(n=Count('id')).order_by('-n').first()
+        )
+        counter_id = busiest['counter_id'] if busiest else 0
+
+        def counter_tickets():
+            return TicketSerializer(
+                Ticket.objects.filter(counter__id=counter_id, status__in=fastpath.ACTIVE_STATUSES)
+                .order_by(*QUEUE_ORDERING),
+                many=True,
+            ).data
+
+        cases = [
+            (
+                'services/',
+                lambda: ServiceSerializer(Service.objects.filter(site=site), many=True).data,
+                lambda: list(fastpath.services_queryset(site.id)),
+            ),
+            (
+                'counters/',
+                lambda: CounterSerializer(Counter.objects.filter(site=site), many=True).data,
+                lambda: [fastpath.counter_row(row) for row in fastpath.counters_queryset(site.id)],
+            ),
+            (
+                f'counters/{counter_id}/tickets/',
+                counter_tickets,
+                lambda: [fastpath.ticket_row(row) for row in fastpath.counter_tickets_queryset(counter_id)],
+            ),
+        ]
+
+        for path, slow, fast in cases:
+            self.stdout.write(path)
+            for label, build, renderer in (
+                ('serializer', slow, JSONRenderer()),
+                ('fastpath', fast, FastJSONRenderer()),
+            ):
+                self.report(label, build, renderer, options['repeat'])
+
+        # Réduction du volume : champs choisis, format en colonnes (voir api/fastpath.py)
+        def shaped_counters(query):
+            params = QueryDict(query)
+            return lambda: fastpath.shape_rows(
+                [fastpath.counter_row(row) for row in fastpath.counters_queryset(site.id)],
+                params, fastpath.COUNTER_FIELDS,
+            )
+
+        def shaped_statistics(query):
+            params = QueryDict(query)
+            return lambda: fastpath.shape_statistics(
+                fastpath.ticket_statistics(site.id, fastpath.statistics_sections(params)), params,
+            )
+
+        modes = [
+            ('counters/', shaped_counters, 'fields=id,status'),
+            ('tickets/statistics/', shaped_statistics, 'fields=total_waiting_tickets,waiting_tickets_by_company'),
+        ]
+        for path, shaped, fields in modes:
+            self.stdout.write(f"{path} (fields : ?{fields} ; compact : ?compact=1)")
+            for label, query in (('complet', ''), ('fields', fields), ('compact', 'compact=1')):
+                self.report(label, shaped(query), FastJSONRenderer(), options['repeat'])
+
+    def report(self, label, build, renderer, repeat):
+        timings, queries, body = self.measure(build, renderer, repeat)
+        sizes = f"{len(body):8d} octets  gzip {len(compression.compress(body, 'gzip')):7d}"
+        if compression.brotli is not None:
+            sizes += f"  br {len(compression.compress(body, 'br')):7d}"
+        self.stdout.write(
+            f"  {label:<10} médiane {statistics.median(timings):8.2f} ms  "
+            f"p95 {self.p95(timings):8.2f} ms  {queries:4d} requêtes  {sizes}"
+        )
+
+    def measure(self, build, renderer, repeat):
+        timings = []
+        queries = 0
+        body = b''
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                body = renderer.render(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = len(ctx.captured_queries)
+        return timings, queries, body
+
+    @staticmethod
+    def p95(values):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
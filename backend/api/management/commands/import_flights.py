@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.flight_import import CHUNK_SIZE, import_flights
+
+
+class Command(BaseCommand):
+    help = "Importe (upsert) le programme des vols depuis un fichier CSV ou JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier .csv, .json ou .jsonl")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Par défaut : déduit de l'extension.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = import_flights(stream, fmt=fmt, chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Import impossible: {e}")
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"  Ligne {error['line']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Import terminé en {elapsed:.2f} s : {report['inserted']} créés, "
+            f"{report['updated']} mis à jour, {report['unchanged']} inchangés, "
+            f"{report['rejected']} rejetés."
+        ))
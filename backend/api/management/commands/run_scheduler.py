@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.scheduler import default_owner, registered_jobs, run_job, run_pending, sync_jobs
+
+
+class Command(BaseCommand):
+    help = "Exécute en boucle les tâches périodiques enregistrées (voir api/jobs.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Lance les tâches dues une seule fois puis quitte.")
+        parser.add_argument('--job', help="Force l'exécution immédiate d'une tâche puis quitte.")
+        parser.add_argument('--tick', type=float, default=5.0, help="Pause entre deux passages (secondes).")
+
+    def handle(self, *args, **options):
+        sync_jobs()
+        owner = default_owner()
+
+        if options['job']:
+            if options['job'] not in registered_jobs():
+                self.stderr.write(self.style.ERROR(f"Tâche inconnue : {options['job']}"))
+                return
+            result = run_job(options['job'], owner, force=True)
+            self.report({options['job']: result} if result is not None else {})
+            return
+
+        self.stdout.write(f"Planificateur {owner} : {', '.join(registered_jobs())}")
+        try:
+            while True:
+                self.report(run_pending(owner))
+                if options['once']:
+                    return
+                time.sleep(options['tick'])
+        except KeyboardInterrupt:
+            self.stdout.write("Arrêt du planificateur.")
+
+    def report(self, results):
+        for name, ok in results.items():
+            if ok:
+                self.stdout.write(self.style.SUCCESS(f"  {name} : OK"))
+            else:
+                self.stdout.write(self.style.ERROR(f"  {name} : échec (voir last_error)"))
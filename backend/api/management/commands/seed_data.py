@@ -1,202 +1,405 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
-from api.models import Company, Counter, Service, Flight, Ticket
+
+from api.flight_lookup import invalidate_flight_index, normalize_flight_number
+from api.models import Company, Counter, QueueSequence, Service, ServiceRoute, Site, Flight, Ticket
+from api.scheduling import compute_priority_key
+from api.sites import default_site_code, get_site
+
+# Compagnies avec leur code IATA (crucial pour le routage des tickets)
+# et un temps de service moyen estimé.
+COMPANIES_DATA = [
+    {"name": "ASKY Airlines", "code": "KP", "service_time": 4},
+    {"name": "Ethiopian Airlines", "code": "ET", "service_time": 5},
+    {"name": "Air Côte d'Ivoire", "code": "HN", "service_time": 3},
+    {"name": "Air Burkina", "code": "2J", "service_time": 3},
+    {"name": "Brussels Airlines", "code": "SN", "service_time": 4},
+    {"name": "Air France", "code": "AF", "service_time": 5},
+    {"name": "Royal Air Maroc", "code": "AT", "service_time": 4},
+    {"name": "Kenya Airways", "code": "KQ", "service_time": 4},
+    {"name": "Autre Compagnie", "code": "XX", "service_time": 3},  # Pour les tests génériques
+]
+
+# Services de file d'attente
+SERVICES_DATA = [
+    {"name": "Enregistrement & Bagages", "prefix": "C", "priority_class": "STANDARD"},
+    {"name": "Assistance spéciale", "prefix": "S", "priority_class": "ASSISTANCE"},
+    {"name": "Information", "prefix": "I", "priority_class": "STANDARD"},
+]
+
+# Services servis par un pool de comptoirs dédié (voir api/routing.py) : service -> comptoirs
+SERVICE_ROUTES = {
+    "Information": ["B8", "B9"],
+}
+
+# Exemple d'attribution pour les tests:
+# A1-A4: Air France (AF), A5-A7: Ethiopian Airlines (ET), A8-A9: Royal Air Maroc (AT, déjà en service)
+# Reste (A10-B12): Non attribué (LIBRE par défaut)
+COUNTER_ASSIGNMENTS = {
+    **{name: ('AF', 'LIBRE') for name in ['A1', 'A2', 'A3', 'A4']},
+    **{name: ('ET', 'LIBRE') for name in ['A5', 'A6', 'A7']},
+    **{name: ('AT', 'OCCUPE') for name in ['A8', 'A9']},
+}
+
+# Vols de test : (numéro, code compagnie, départ dans N heures)
+FLIGHTS_DATA = [
+    ('AF480', 'AF', 2),
+    ('ET901', 'ET', 3),
+    ('AT511', 'AT', 5),
+    ('KP305', 'KP', 6),
+]
+
+# Historique synthétique : heures de départ des vols de chaque compagnie
+SYNTHETIC_DEPARTURE_HOURS = [7, 11, 15, 19, 23]
+# Arrivée des passagers avant le départ (minutes) : loi normale tronquée
+ARRIVAL_MEAN_MINUTES = 120
+ARRIVAL_STDDEV_MINUTES = 40
+ARRIVAL_MIN_MINUTES = 20
+ARRIVAL_MAX_MINUTES = 240
+
+
+def generate_counters():
+    """Les 24 comptoirs A1-A12 et B1-B12."""
+    return [f"{zone}{num}" for zone in ['A', 'B'] for num in range(1, 13)]
+
+
+@contextmanager
+def explicit_created_at():
+    """
+    Désactive temporairement ``auto_now_add`` sur ``Ticket.created_at`` pour que
+    ``bulk_create`` conserve les dates d'arrivée générées.
+    """
+    field = Ticket._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class QueueNumberAllocator:
+    """
+    Reproduit la numérotation de ``Ticket.save()`` (séquence du jour par site et
+    préfixe) pour les tickets insérés avec ``bulk_create``, qui n'appelle pas save().
+    ``save()`` reporte ensuite les derniers numéros dans ``QueueSequence``.
+    """
+
+    def __init__(self):
+        self.last_values = {}
+
+    def allocate(self, service, day):
+        key = (service.site_id, service.prefix, day)
+        if key not in self.last_values:
+            self.last_values[key] = QueueSequence.objects.filter(
+                site_id=service.site_id, prefix=service.prefix, day=day
+            ).values_list('last_value', flat=True).first() or 0
+        self.last_values[key] += 1
+        return f"{service.prefix}{str(self.last_values[key]).zfill(3)}"
+
+    def save(self):
+        QueueSequence.objects.bulk_create(
+            [
+                QueueSequence(site_id=site_id, prefix=prefix, day=day, last_value=value)
+                for (site_id, prefix, day), value in self.last_values.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['site', 'prefix', 'day'],
+            update_fields=['last_value'],
+        )
+
 
 class Command(BaseCommand):
-    help = 'Seeds the database with initial data for companies, services, counters, flights, and tickets.'
+    help = (
+        'Seeds the database with initial data for companies, services, counters, flights, and tickets. '
+        'Use --tickets N --days D to generate a synthetic ticket history for benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=0, help="Nombre de tickets d'historique synthétique à générer.")
+        parser.add_argument('--days', type=int, default=1, help="Nombre de jours d'historique (jusqu'à aujourd'hui inclus).")
+        parser.add_argument('--seed', type=int, default=None, help="Graine aléatoire pour un historique reproductible.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--site', default=None, help="Code du site (terminal) à initialiser (défaut : SIOA_DEFAULT_SITE).")
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('==========================================='))
         self.stdout.write(self.style.SUCCESS(' DÉBUT DE L\'INITIALISATION DES DONNÉES '))
         self.stdout.write(self.style.SUCCESS('==========================================='))
 
-        companies, services = self.initialize_companies_and_services()
-        all_counters = self.initialize_counters(companies)
-        self.initialize_flights(companies)
-        self.initialize_tickets(all_counters)
-        
-        self.stdout.write(self.style.SUCCESS('\\n==========================================='))
-        self.stdout.write(self.style.SUCCESS(' INITIALISATION TERMINÉE AVEC SUCCÈS. '))
+        started = time.perf_counter()
+        self.batch_size = options['batch_size']
+        self.queue_numbers = QueueNumberAllocator()
+
+        # Tout le seed dans une seule transaction : idempotent et bien plus rapide sur SQLite
+        with transaction.atomic():
+            self.site = self.initialize_site(options['site'] or default_site_code())
+            companies, services = self.initialize_companies_and_services()
+            all_counters = self.initialize_counters(companies)
+            self.initialize_routes(services, all_counters)
+            self.initialize_flights(companies)
+            self.initialize_tickets(all_counters, services)
+            if options['tickets'] > 0:
+                self.generate_history(
+                    companies, services, all_counters,
+                    options['tickets'], max(1, options['days']), random.Random(options['seed']),
+                )
+            self.queue_numbers.save()
+        # bulk_create n'envoie pas de signaux
+        invalidate_flight_index()
+
+        self.stdout.write(self.style.SUCCESS('\n==========================================='))
+        self.stdout.write(self.style.SUCCESS(f' INITIALISATION TERMINÉE EN {time.perf_counter() - started:.1f} s. '))
         self.stdout.write(self.style.SUCCESS('==========================================='))
 
+    def initialize_site(self, code):
+        """Récupère ou crée le site (terminal) à initialiser."""
+        try:
+            site = get_site(code)
+        except Site.DoesNotExist:
+            site = Site.objects.create(code=code, name=f"Terminal {code}")
+        self.stdout.write(f"--- 0. Site : {site} ---")
+        return site
+
     def initialize_companies_and_services(self):
         """Crée les Compagnies et les Services."""
         self.stdout.write("--- 1. Initialisation des Compagnies et Services ---")
-        
-        COMPANIES_DATA = [
-            {"name": "ASKY Airlines", "code": "KP", "service_time": 4},
-            {"name": "Ethiopian Airlines", "code": "ET", "service_time": 5},
-            {"name": "Air Côte d'Ivoire", "code": "HN", "service_time": 3},
-            {"name": "Air Burkina", "code": "2J", "service_time": 3},
-            {"name": "Brussels Airlines", "code": "SN", "service_time": 4},
-            {"name": "Air France", "code": "AF", "service_time": 5},
-            {"name": "Royal Air Maroc", "code": "AT", "service_time": 4},
-            {"name": "Kenya Airways", "code": "KQ", "service_time": 4},
-            {"name": "Autre Compagnie", "code": "XX", "service_time": 3},
-        ]
 
-        SERVICES_DATA = [
-            {"name": "Enregistrement & Bagages", "prefix": "C"},
-            {"name": "Assistance spéciale", "prefix": "S"},
-        ]
+        Service.objects.bulk_create(
+            [
+                Service(site=self.site, name=data['name'], prefix=data['prefix'], priority_class=data['priority_class'])
+                for data in SERVICES_DATA
+            ],
+            ignore_conflicts=True,
+        )
+        services = {service.name: service for service in Service.objects.filter(
+            site=self.site, name__in=[data['name'] for data in SERVICES_DATA]
+        )}
+        self.stdout.write(f"  {len(services)} services créés/vérifiés.")
 
-        # Création des Services
-        for data in SERVICES_DATA:
-            Service.objects.get_or_create(name=data['name'], defaults={'prefix': data['prefix']})
-            self.stdout.write(f"  Service: {data['name']} créé/vérifié.")
-
-        # Création des Compagnies
-        companies = {}
-        for data in COMPANIES_DATA:
-            company, created = Company.objects.get_or_create(
-                code=data['code'],
-                defaults={
-                    'name': data['name'],
-                    'average_service_time_minutes': data['service_time']
-                }
-            )
-            companies[data['code']] = company
-            self.stdout.write(f"  Compagnie: {data['name']} ({data['code']}) créé/vérifié.")
-            
-        return companies, Service.objects.all()
-
-    def generate_counters(self):
-        counters = []
-        for zone in ['A', 'B']:
-            for num in range(1, 13):
-                counters.append(f"{zone}{num}")
-        return counters
+        known_codes = set(Company.objects.filter(
+            code__in=[data['code'] for data in COMPANIES_DATA]
+        ).values_list('code', flat=True))
+        Company.objects.bulk_create(
+            [
+                Company(name=data['name'], code=data['code'], average_service_time_minutes=data['service_time'])
+                for data in COMPANIES_DATA if data['code'] not in known_codes
+            ],
+            ignore_conflicts=True,
+        )
+        companies = {company.code: company for company in Company.objects.filter(
+            code__in=[data['code'] for data in COMPANIES_DATA]
+        )}
+        self.stdout.write(f"  {len(companies)} compagnies créées/vérifiées.")
+
+        return companies, services
 
     def initialize_counters(self, companies):
         """Crée les 24 Comptoirs et les assigne à des Compagnies pour les tests."""
         self.stdout.write("\n--- 2. Initialisation et Attribution des Comptoirs ---")
-        
-        COUNTER_NAMES = self.generate_counters()
-        
-        af = companies.get('AF')
-        et = companies.get('ET')
-        at = companies.get('AT')
-
-        all_counters = []
-
-        for name in COUNTER_NAMES:
-            assigned_to = None
-            status_c = 'LIBRE'
-            
-            if name in ['A1', 'A2', 'A3', 'A4'] and af:
-                assigned_to = af
-            elif name in ['A5', 'A6', 'A7'] and et:
-                assigned_to = et
-            elif name in ['A8', 'A9'] and at:
-                assigned_to = at
-                status_c = 'OCCUPE'
-            
-            counter, created = Counter.objects.get_or_create(
-                name=name,
-                defaults={
-                    'assigned_company': assigned_to,
-                    'status': status_c
-                }
-            )
-            all_counters.append(counter)
-            status_text = f"Assigné à {counter.assigned_company.name}, Statut: {counter.status}" if counter.assigned_company else "LIBRE"
-            self.stdout.write(f"  Comptoir {name} créé/vérifié. {status_text}")
+
+        new_counters = []
+        for name in generate_counters():
+            code, status_c = COUNTER_ASSIGNMENTS.get(name, (None, 'LIBRE'))
+            new_counters.append(Counter(
+                site=self.site, name=name, assigned_company=companies.get(code), status=status_c,
+            ))
+        Counter.objects.bulk_create(new_counters, ignore_conflicts=True)
+
+        all_counters = list(Counter.objects.select_related('assigned_company').filter(
+            site=self.site, name__in=[counter.name for counter in new_counters]
+        ))
+        assigned = sum(1 for counter in all_counters if counter.assigned_company_id)
+        self.stdout.write(f"  {len(all_counters)} comptoirs créés/vérifiés, dont {assigned} assignés.")
         return all_counters
 
+    def initialize_routes(self, services, all_counters):
+        """Crée les routes des services servis par un pool de comptoirs."""
+        counters = {counter.name: counter for counter in all_counters}
+        for name, counter_names in SERVICE_ROUTES.items():
+            route, _ = ServiceRoute.objects.get_or_create(service=services[name])
+            route.counters.set([counters[counter_name] for counter_name in counter_names])
+        self.stdout.write(f"  {len(SERVICE_ROUTES)} routes de service créées/vérifiées.")
+
     def initialize_flights(self, companies):
         """Crée quelques Vols pour tester la logique de routage."""
         self.stdout.write("\n--- 3. Initialisation des Vols de test ---")
-        
+
         now = timezone.now()
-        
-        Flight.objects.get_or_create(
-            flight_number='AF480',
-            defaults={
-                'company': companies.get('AF'),
-                'departure_time': now + timedelta(hours=2)
-            }
-        )
-        Flight.objects.get_or_create(
-            flight_number='ET901',
-            defaults={
-                'company': companies.get('ET'),
-                'departure_time': now + timedelta(hours=3)
-            }
-        )
-        Flight.objects.get_or_create(
-            flight_number='AT511',
-            defaults={
-                'company': companies.get('AT'),
-                'departure_time': now + timedelta(hours=5)
-            }
-        )
-        Flight.objects.get_or_create(
-            flight_number='KP305',
-            defaults={
-                'company': companies.get('KP'),
-                'departure_time': now + timedelta(hours=6)
-            }
-        )
-        self.stdout.write("  4 Vols de test créés/vérifiés.")
+        # La clé unique inclut l'heure de départ (relative à maintenant) : on vérifie par numéro
+        existing = set(Flight.objects.filter(
+            flight_number__in=[number for number, _, _ in FLIGHTS_DATA]
+        ).values_list('flight_number', flat=True))
+        Flight.objects.bulk_create([
+            Flight(
+                flight_number=number,
+                normalized_number=normalize_flight_number(number),
+                company=companies[code],
+                departure_time=now + timedelta(hours=hours),
+            )
+            for number, code, hours in FLIGHTS_DATA
+            if number not in existing and code in companies
+        ])
+        self.stdout.write(f"  {len(FLIGHTS_DATA)} vols de test créés/vérifiés.")
 
-    def initialize_tickets(self, all_counters):
+    def initialize_tickets(self, all_counters, services):
         """Crée des tickets de test avec différents statuts et associations."""
         self.stdout.write("\n--- 4. Initialisation des Tickets de test ---")
-        
+
+        now = timezone.now()
+        counters = {counter.name: counter for counter in all_counters}
+        enregistrement = services.get('Enregistrement & Bagages')
+        assistance = services.get('Assistance spéciale')
+
+        samples = [
+            # 2 tickets en attente pour A1 (Air France)
+            ('AF1001', enregistrement, counters.get('A1'), 'WAITING', now - timedelta(minutes=10), None),
+            ('AF1002', enregistrement, counters.get('A1'), 'WAITING', now - timedelta(minutes=5), None),
+            # 1 ticket appelé pour A5 (Ethiopian Airlines)
+            ('ET2001', assistance, counters.get('A5'), 'CALLED', now - timedelta(minutes=15), now - timedelta(minutes=2)),
+        ]
+        existing = set(Ticket.objects.filter(
+            site=self.site, ticket_number__in=[sample[0] for sample in samples]
+        ).values_list('ticket_number', flat=True))
+
+        tickets = [
+            Ticket(
+                site=self.site,
+                ticket_number=ticket_number,
+                service=service,
+                counter=counter,
+                status=ticket_status,
+                created_at=created_at,
+                called_at=called_at,
+                queue_number=self.queue_numbers.allocate(service, timezone.localdate(created_at)),
+                priority_key=compute_priority_key(created_at, service),
+            )
+            for ticket_number, service, counter, ticket_status, created_at, called_at in samples
+            if ticket_number not in existing and service and counter
+        ]
+        with explicit_created_at():
+            Ticket.objects.bulk_create(tickets)
+        self.stdout.write(f"  {len(tickets)} tickets de test créés ({len(existing)} déjà présents).")
+
+    def generate_history(self, companies, services, all_counters, total_tickets, days, rng):
+        """
+        Génère un historique synthétique de ``total_tickets`` tickets sur ``days`` jours.
+
+        Chaque compagnie a un vol à chacune des heures de ``SYNTHETIC_DEPARTURE_HOURS`` ;
+        les passagers arrivent selon une loi normale tronquée autour de
+        ``ARRIVAL_MEAN_MINUTES`` avant le départ. Les tickets passés sont
+        majoritairement servis (DONE), ceux des vols à venir sont en attente.
+        """
+        self.stdout.write(f"\n--- 5. Historique synthétique : {total_tickets} tickets sur {days} jours ---")
+
         now = timezone.now()
-        all_services = Service.objects.all()
-        
-        self.stdout.write(f"Debug: all_counters type: {type(all_counters)}, len: {len(all_counters) if all_counters else 0}, content: {[c.name for c in all_counters] if all_counters else 'N/A'}")
-        self.stdout.write(f"Debug: all_services type: {type(all_services)}, len: {len(all_services) if all_services else 0}, content: {[s.name for s in all_services] if all_services else 'N/A'}")
-
-        if all_counters and all_services:
-            counter_a1 = next((c for c in all_counters if c.name == 'A1'), None)
-            service_enregistrement = next((s for s in all_services if s.name == 'Enregistrement & Bagages'), None)
-            self.stdout.write(f"Debug: counter_a1: {counter_a1}, service_enregistrement: {service_enregistrement}")
-
-            if counter_a1 and service_enregistrement:
-                self.stdout.write(f"Debug: Creating ticket AF1001 with counter: {counter_a1.name} (Company: {counter_a1.assigned_company.name if counter_a1.assigned_company else 'N/A'}), Service: {service_enregistrement.name}")
-                Ticket.objects.get_or_create(
-                    ticket_number='AF1001',
-                    defaults={
-                        'counter': counter_a1,
-                        'service': service_enregistrement,
-                        'status': 'WAITING',
-                        'flight': Flight.objects.get(flight_number='AF100'),
-                        'company': counter_a1.assigned_company,
-                        'issue_time': now - timedelta(minutes=random.randint(1, 60))
-                    }
+        today = timezone.localdate()
+        counters_by_company = {}
+        for counter in all_counters:
+            if counter.assigned_company_id:
+                counters_by_company.setdefault(counter.assigned_company_id, []).append(counter)
+        service_mix = [
+            (services.get('Enregistrement & Bagages'), 0.9),
+            (services.get('Assistance spéciale'), 0.1),
+        ]
+        service_mix = [(service, weight) for service, weight in service_mix if service]
+        mix_services = [service for service, _ in service_mix]
+        mix_weights = [weight for _, weight in service_mix]
+
+        flights_per_day = []
+        for offset in range(days - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            day_flights = [
+                Flight(
+                    flight_number=f"{code}{100 + index}",
+                    normalized_number=f"{code}{100 + index}",
+                    company=company,
+                    departure_time=timezone.make_aware(datetime.combine(day, dt_time(hour))),
+                    gate=f"G{rng.randint(1, 12)}",
                 )
-                self.stdout.write(f"Debug: Creating ticket AF1002 with counter: {counter_a1.name} (Company: {counter_a1.assigned_company.name if counter_a1.assigned_company else 'N/A'}), Service: {service_enregistrement.name}")
-                Ticket.objects.get_or_create(
-                    ticket_number='AF1002',
-                    defaults={
-                        'counter': counter_a1,
-                        'service': service_enregistrement,
-                        'status': 'WAITING',
-                        'flight': Flight.objects.get(flight_number='AF100'),
-                        'company': counter_a1.assigned_company,
-                        'issue_time': now - timedelta(minutes=random.randint(1, 60))
-                    }
-                 )                self.stdout.write(\"  2 tickets en attente pour A1 (Air France) créés/vérifiés.\")
-
-            counter_a5 = next((c for c in all_counters if c.name == \'A5\'), None)
-            service_assistance = next((s for s in all_services if s.name == \'Assistance spéciale\'), None)
-            self.stdout.write(f\"Debug: counter_a5: {counter_a5}, service_assistance: {service_assistance}\")
-
-            if counter_a5 and service_assistance:
-                self.stdout.write(f\"Debug: Creating ticket ET2001 with counter: {counter_a5.name} (Company: {counter_a5.assigned_company.name if counter_a5.assigned_company else \'N/A\'}), Service: {service_assistance.name}\")
-                Ticket.objects.get_or_create(
-                    ticket_number=\'ET2001\',\
-                    defaults={\
-                        \'counter\': counter_a5,\
-                        \'service\': service_assistance,\
-                        \'status\': \'CALLED\',\
-                        \'created_at\': now - timedelta(minutes=15),\
-                        \'called_at\': now - timedelta(minutes=2)\
-                    }\
-                )\
-                self.stdout.write(\"  1 ticket appelé pour A5 (Ethiopian Airlines) créé/vérifié.\")
-        else:\
-            self.stdout.write(\"  Impossible de créer des tickets de test: comptoirs ou services non disponibles.\")
+                for code, company in companies.items()
+                for index, hour in enumerate(SYNTHETIC_DEPARTURE_HOURS)
+            ]
+            Flight.objects.bulk_create(day_flights, ignore_conflicts=True)
+            # Relecture : avec ignore_conflicts, les vols déjà présents n'ont pas de pk.
+            # Les vols dont aucun passager ne peut encore être arrivé sont ignorés.
+            flights_per_day.append(list(Flight.objects.filter(
+                flight_number__in={flight.flight_number for flight in day_flights},
+                departure_time__in={flight.departure_time for flight in day_flights},
+                departure_time__lte=now + timedelta(minutes=ARRIVAL_MAX_MINUTES),
+            )))
+
+        created = 0
+        with explicit_created_at():
+            for index, day_flights in enumerate(flights_per_day):
+                day_total = total_tickets // days + (1 if index < total_tickets % days else 0)
+                if not day_flights or day_total == 0:
+                    continue
+                created += self._generate_day(
+                    day_flights, day_total, now, rng, mix_services, mix_weights, counters_by_company,
+                )
+                self.stdout.write(f"  {created}/{total_tickets} tickets générés...")
+
+        self.stdout.write(f"  {created} tickets d'historique créés.")
+
+    def _generate_day(self, day_flights, day_total, now, rng, mix_services, mix_weights, counters_by_company):
+        flights = rng.choices(day_flights, k=day_total)
+        services = rng.choices(mix_services, weights=mix_weights, k=day_total)
+
+        rows = []
+        for flight, service in zip(flights, services):
+            # Les passagers des vols à venir ne sont pas encore tous arrivés : on retire l'arrivée
+            for _ in range(10):
+                offset = min(ARRIVAL_MAX_MINUTES, max(
+                    ARRIVAL_MIN_MINUTES, rng.gauss(ARRIVAL_MEAN_MINUTES, ARRIVAL_STDDEV_MINUTES)
+                ))
+                created_at = flight.departure_time - timedelta(minutes=offset)
+                if created_at <= now:
+                    break
+            created_at = min(now, created_at)
+            wait = rng.expovariate(1 / 8)
+
+            # Répartition réaliste des statuts selon l'ancienneté
+            roll = rng.random()
+            if flight.departure_time <= now or created_at < now - timedelta(hours=1):
+                ticket_status = 'DONE' if roll < 0.88 else 'CANCELLED'
+            elif roll < 0.7:
+                ticket_status = 'WAITING'
+            elif roll < 0.8:
+                ticket_status = 'CALLED'
+            else:
+                ticket_status = 'DONE'
+            called_at = created_at + timedelta(minutes=wait) if ticket_status in ('CALLED', 'DONE') else None
+
+            company_counters = counters_by_company.get(flight.company_id)
+            rows.append((created_at, flight, service, ticket_status, called_at, wait,
+                         rng.choice(company_counters) if company_counters else None))
+
+        # Numérotation dans l'ordre d'arrivée, comme Ticket.save()
+        rows.sort(key=lambda row: row[0])
+        batch = []
+        for created_at, flight, service, ticket_status, called_at, wait, counter in rows:
+            batch.append(Ticket(
+                site=self.site,
+                ticket_number=flight.flight_number,
+                flight=flight,
+                service=service,
+                queue_number=self.queue_numbers.allocate(service, timezone.localdate(created_at)),
+                created_at=created_at,
+                priority_key=compute_priority_key(created_at, service, flight.departure_time),
+                status=ticket_status,
+                called_at=called_at,
+                counter=counter,
+                estimated_waiting_time_minutes=round(wait),
+            ))
+            if len(batch) >= self.batch_size:
+                Ticket.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Ticket.objects.bulk_create(batch)
+        return len(rows)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.sweeper import sweep_expired_tickets
+
+
+class Command(BaseCommand):
+    help = "Annule les tickets des vols clos ou annulés et priorise ceux dont l'enregistrement ferme bientôt."
+
+    def handle(self, *args, **options):
+        counts = sweep_expired_tickets()
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['cancelled']} tickets annulés, {counts['boosted']} tickets priorisés."
+        ))
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:49
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_normalized_numbers(apps, schema_editor):
+    # Copie figée de api.flight_lookup.normalize_flight_number au moment de la migration
+    flight_number_re = re.compile(r'^([A-Z]{2}|[A-Z]\d|\d[A-Z])(\d{1,5})([A-Z]?)$')
+    Flight = apps.get_model('api', 'Flight')
+    flights = list(Flight.objects.only('id', 'flight_number'))
+    for flight in flights:
+        compact = re.sub(r'[^A-Z0-9]', '', (flight.flight_number or '').upper())
+        match = flight_number_re.match(compact)
+        if match:
+            designator, number, suffix = match.groups()
+            compact = f"{designator}{int(number)}{suffix}"
+        flight.normalized_number = compact
+    Flight.objects.bulk_update(flights, ['normalized_number'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_flight_gate_flight_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='normalized_number',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='flight',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tickets', to='api.flight'),
+        ),
+        migrations.RunPython(fill_normalized_numbers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['normalized_number', 'departure_time'], name='flight_normalized_dep_idx'),
+        ),
+    ]
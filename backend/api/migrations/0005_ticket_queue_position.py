@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_flight_normalized_number_ticket_flight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='queue_position',
+            field=models.PositiveIntegerField(default=0, help_text='Position dans la file du comptoir, tenue à jour par api.tae.'),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='estimated_waiting_time_minutes',
+            field=models.IntegerField(default=0, help_text="Temps d'attente estimé en minutes (-1 si aucun comptoir ouvert)."),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:52
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_priorities(apps, schema_editor):
+    Service = apps.get_model('api', 'Service')
+    Ticket = apps.get_model('api', 'Ticket')
+    Service.objects.filter(name__in=['Assistance spéciale', 'Accessibilité']).update(priority_class='ASSISTANCE')
+    Service.objects.filter(name='Service VIP').update(priority_class='VIP')
+    # Tickets existants : ordre FIFO inchangé
+    Ticket.objects.filter(priority_key__isnull=True).update(priority_key=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_ticket_queue_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='priority_class',
+            field=models.CharField(choices=[('STANDARD', 'Standard'), ('VIP', 'VIP'), ('ASSISTANCE', 'Assistance spéciale')], default='STANDARD', help_text='Classe de priorité des tickets de ce service.', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='priority_key',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(set_priorities, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['counter', 'status', 'priority_key', 'id'], name='ticket_counter_priority_idx'),
+        ),
+    ]
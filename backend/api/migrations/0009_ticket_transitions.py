@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ticket_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='served_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('WAITING', 'En attente'), ('CALLED', 'Appelé'), ('DONE', 'Terminé'), ('CANCELLED', 'Annulé')], max_length=20)),
+                ('to_status', models.CharField(choices=[('WAITING', 'En attente'), ('CALLED', 'Appelé'), ('DONE', 'Terminé'), ('CANCELLED', 'Annulé')], max_length=20)),
+                ('actor', models.CharField(blank=True, default='', help_text="Agent à l'origine de la transition.", max_length=150)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('counter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ticket_events', to='api.counter')),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.ticket')),
+            ],
+            options={
+                'verbose_name': 'Événement de ticket',
+                'verbose_name_plural': 'Événements de ticket',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['ticket', 'created_at'], name='ticketevent_ticket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:06
+
+import api.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def create_default_site(apps, schema_editor):
+    Site = apps.get_model('api', 'Site')
+    Site.objects.get_or_create(
+        code=getattr(settings, 'SIOA_DEFAULT_SITE', 'MAIN'),
+        defaults={'name': "Terminal principal"},
+    )
+
+
+def backfill_ticket_sites(apps, schema_editor):
+    Service = apps.get_model('api', 'Service')
+    Ticket = apps.get_model('api', 'Ticket')
+    Ticket.objects.filter(site__isnull=True).update(
+        site=Subquery(Service.objects.filter(pk=OuterRef('service_id')).values('site_id')[:1])
+    )
+
+
+def backfill_queue_sequences(apps, schema_editor):
+    """Reprend la numérotation existante : dernier numéro par site, préfixe et jour."""
+    Ticket = apps.get_model('api', 'Ticket')
+    QueueSequence = apps.get_model('api', 'QueueSequence')
+    last_values = {}
+    for site_id, queue_number, created_at in Ticket.objects.values_list('site_id', 'queue_number', 'created_at').iterator():
+        if not queue_number or not queue_number[1:].isdigit():
+            continue
+        key = (site_id, queue_number[0], timezone.localdate(created_at))
+        last_values[key] = max(last_values.get(key, 0), int(queue_number[1:]))
+    QueueSequence.objects.bulk_create(
+        [
+            QueueSequence(site_id=site_id, prefix=prefix, day=day, last_value=value)
+            for (site_id, prefix, day), value in last_values.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_ticket_transitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Site',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(help_text='Identifiant court (Ex: LFW-T1), envoyé par les bornes et écrans.', max_length=20, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('airport_code', models.CharField(blank=True, default='', help_text="Code IATA de l'aéroport (Ex: LFW)", max_length=3)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Site',
+                'verbose_name_plural': 'Sites',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.RunPython(create_default_site, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='QueueSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=1)),
+                ('day', models.DateField()),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Séquence de file',
+                'verbose_name_plural': 'Séquences de file',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_status_created_idx',
+        ),
+        migrations.AlterField(
+            model_name='counter',
+            name='name',
+            field=models.CharField(help_text='Identifiant physique, unique dans le site (Ex: A1, B12)', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddField(
+            model_name='queuesequence',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queue_sequences', to='api.site'),
+        ),
+        migrations.AddField(
+            model_name='counter',
+            name='site',
+            field=models.ForeignKey(default=api.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='counters', to='api.site'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='site',
+            field=models.ForeignKey(default=api.models.default_site_id, on_delete=django.db.models.deletion.PROTECT, related_name='services', to='api.site'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='site',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tickets', to='api.site'),
+        ),
+        migrations.RunPython(backfill_ticket_sites, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ticket',
+            name='site',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='tickets', to='api.site'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['site', 'created_at', 'id'], name='ticket_site_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['site', 'status', 'created_at'], name='ticket_site_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='counter',
+            constraint=models.UniqueConstraint(fields=('site', 'name'), name='counter_site_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='service',
+            constraint=models.UniqueConstraint(fields=('site', 'name'), name='service_site_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='queuesequence',
+            constraint=models.UniqueConstraint(fields=('site', 'prefix', 'day'), name='queuesequence_site_prefix_day_uniq'),
+        ),
+        migrations.RunPython(backfill_queue_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_sites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='KioskLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kiosk_id', models.CharField(help_text='Identifiant de la borne.', max_length=64)),
+                ('day', models.DateField()),
+                ('start', models.PositiveIntegerField()),
+                ('end', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kiosk_leases', to='api.service')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kiosk_leases', to='api.site')),
+            ],
+            options={
+                'verbose_name': 'Bail de borne',
+                'verbose_name_plural': 'Baux de borne',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['site', 'kiosk_id', 'day'], name='kiosklease_kiosk_day_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:24
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('agent', models.CharField(help_text='Agent connecté au comptoir.', max_length=150)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('last_activity_at', models.DateTimeField(help_text='Dernière action (connexion, appel, service, saut).')),
+                ('tickets_called', models.PositiveIntegerField(default=0)),
+                ('tickets_served', models.PositiveIntegerField(default=0)),
+                ('tickets_skipped', models.PositiveIntegerField(default=0)),
+                ('handle_time', models.DurationField(default=datetime.timedelta, help_text='Cumul appel → service.')),
+                ('idle_time', models.DurationField(default=datetime.timedelta, help_text='Cumul dernière action → appel suivant.')),
+                ('counter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_sessions', to='api.counter')),
+            ],
+            options={
+                'verbose_name': "Session d'agent",
+                'verbose_name_plural': "Sessions d'agent",
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['started_at'], name='agentsession_started_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('ended_at__isnull', True)), fields=('counter',), name='agentsession_one_open_per_counter')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_information_routes(apps, schema_editor):
+    """Reprend le routage codé en dur : services « Information » -> comptoirs B8 et B9 du site."""
+    Service = apps.get_model('api', 'Service')
+    Counter = apps.get_model('api', 'Counter')
+    ServiceRoute = apps.get_model('api', 'ServiceRoute')
+    for service in Service.objects.filter(name__icontains='information'):
+        route, _ = ServiceRoute.objects.get_or_create(service=service, defaults={'default_wait_minutes': 5})
+        route.counters.set(Counter.objects.filter(site_id=service.site_id, name__in=['B8', 'B9']))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_agent_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy', models.CharField(choices=[('SHORTEST_QUEUE', 'File la plus courte'), ('FIRST_OPEN', 'Premier comptoir ouvert (ordre des noms)')], default='SHORTEST_QUEUE', max_length=20)),
+                ('default_wait_minutes', models.PositiveIntegerField(default=5, help_text="TAE annoncé tant que le ticket n'est pas placé dans une file.")),
+                ('requires_flight', models.BooleanField(default=False, help_text="Si faux, le numéro saisi n'est pas validé comme vol (ex: Information).")),
+                ('is_active', models.BooleanField(default=True)),
+                ('counters', models.ManyToManyField(help_text='Comptoirs du pool (même site que le service).', related_name='service_routes', to='api.counter')),
+                ('service', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='route', to='api.service')),
+            ],
+            options={
+                'verbose_name': 'Routage de service',
+                'verbose_name_plural': 'Routages de service',
+                'ordering': ['service__name'],
+            },
+        ),
+        migrations.RunPython(create_information_routes, migrations.RunPython.noop),
+    ]
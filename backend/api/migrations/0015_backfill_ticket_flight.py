@@ -0,0 +1,71 @@
+import datetime
+import re
+
+from django.db import migrations
+
+
+def backfill_ticket_flight(apps, schema_editor):
+    """
+    Relie les tickets émis avant l'ajout de ``Ticket.flight`` au vol saisi :
+    premier départ du numéro (normalisé) qui n'était pas parti depuis plus
+    d'une heure à l'émission, dans les 24 h. Les tickets sans vol correspondant
+    restent sans vol.
+    """
+    # Copies figées de api.flight_lookup au moment de la migration
+    flight_number_re = re.compile(r'^([A-Z]{2}|[A-Z]\d|\d[A-Z])(\d{1,5})([A-Z]?)$')
+    separators_re = re.compile(r'[/,;|]')
+    grace = datetime.timedelta(hours=1)
+    horizon = datetime.timedelta(hours=24)
+
+    def candidates(raw):
+        numbers = []
+        for part in separators_re.split(raw or ''):
+            compact = re.sub(r'[^A-Z0-9]', '', part.upper())
+            match = flight_number_re.match(compact)
+            if match:
+                designator, number, suffix = match.groups()
+                compact = f"{designator}{int(number)}{suffix}"
+            if compact and compact not in numbers:
+                numbers.append(compact)
+        return numbers
+
+    Flight = apps.get_model('api', 'Flight')
+    Ticket = apps.get_model('api', 'Ticket')
+    tickets = list(
+        Ticket.objects.filter(flight__isnull=True).exclude(ticket_number='').only('id', 'ticket_number', 'created_at')
+    )
+    numbers = {ticket.id: candidates(ticket.ticket_number) for ticket in tickets}
+    departures = {}
+    wanted = {number for values in numbers.values() for number in values}
+    for flight_id, number, departure_time in (
+        Flight.objects.filter(normalized_number__in=wanted)
+        .order_by('departure_time').values_list('id', 'normalized_number', 'departure_time')
+    ):
+        departures.setdefault(number, []).append((departure_time, flight_id))
+
+    linked = []
+    for ticket in tickets:
+        for number in numbers[ticket.id]:
+            flight_id = next(
+                (
+                    flight_id for departure_time, flight_id in departures.get(number, [])
+                    if ticket.created_at - grace <= departure_time <= ticket.created_at + horizon
+                ),
+                None,
+            )
+            if flight_id is not None:
+                ticket.flight_id = flight_id
+                linked.append(ticket)
+                break
+    Ticket.objects.bulk_update(linked, ['flight'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_service_routes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ticket_flight, migrations.RunPython.noop),
+    ]
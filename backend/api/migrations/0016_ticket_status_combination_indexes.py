@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_backfill_ticket_flight'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['service', 'status', 'created_at'], name='ticket_service_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['counter', 'status', 'created_at'], name='ticket_counter_status_idx'),
+        ),
+    ]
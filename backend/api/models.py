@@ -1,23 +1,80 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 import datetime
 import math
 
+# ============================
+#        SITE (Aéroport / Terminal)
+# ============================
+class Site(models.Model):
+    """
+    Un terminal (ou un aéroport) servi par le même déploiement. Comptoirs,
+    services et tickets appartiennent à un site ; les compagnies et le
+    programme des vols restent communs.
+    """
+    code = models.SlugField(max_length=20, unique=True, help_text="Identifiant court (Ex: LFW-T1), envoyé par les bornes et écrans.")
+    name = models.CharField(max_length=100)
+    airport_code = models.CharField(max_length=3, blank=True, default="", help_text="Code IATA de l'aéroport (Ex: LFW)")
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Site"
+        verbose_name_plural = "Sites"
+        ordering = ["code"]
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+def default_site_id():
+    """
+    Site des objets créés sans site explicite (installation mono-terminal).
+    Lu dans l'index en mémoire des sites actifs (api/sites.py) : aucune requête
+    par objet créé. Le site n'est créé que s'il manque (base sans migrations de
+    données, fixtures).
+    """
+    from .sites import active_sites
+
+    code = getattr(settings, 'SIOA_DEFAULT_SITE', 'MAIN')
+    site = active_sites().get(code)
+    if site is None:
+        site, _ = Site.objects.get_or_create(code=code, defaults={'name': "Terminal principal"})
+    return site.pk
+
+
 # ============================
 #        SERVICE (Ex: Check-in, Bagages)
 # ============================
 class Service(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    # Classe de service pour l'ordonnancement prioritaire (voir api.scheduling)
+    PRIORITY_CHOICES = [
+        ("STANDARD", "Standard"),
+        ("VIP", "VIP"),
+        ("ASSISTANCE", "Assistance spéciale"),
+    ]
+
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, default=default_site_id, related_name="services")
+    name = models.CharField(max_length=100)
     # Lettre préfixe pour le ticket (Ex: 'A' pour Check-in)
     prefix = models.CharField(max_length=1, default="A", help_text="Préfixe pour les tickets (ex: A, B, C)")
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    priority_class = models.CharField(
+        max_length=20,
+        choices=PRIORITY_CHOICES,
+        default="STANDARD",
+        help_text="Classe de priorité des tickets de ce service."
+    )
 
     class Meta:
         verbose_name = "Service"
         verbose_name_plural = "Services"
         ordering = ["name"]
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'name'], name='service_site_name_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.prefix})"
@@ -60,7 +117,8 @@ class Company(models.Model):
 #        COUNTER (Comptoir)
 # ============================
 class Counter(models.Model):
-    # Les 24 comptoirs fixes (A1-A12, B1-B12)
+    # Disposition du terminal historique : 24 comptoirs (A1-A12, B1-B12).
+    # Les autres sites ont leurs propres noms (uniques par site).
     COUNTER_CHOICES = [
         (f"{zone}{num}", f"Comptoir {zone}{num}")
         for zone in ['A', 'B']
@@ -72,11 +130,11 @@ class Counter(models.Model):
         ("FERME", "Fermé"),
     ]
 
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, default=default_site_id, related_name="counters")
+
     name = models.CharField(
-        max_length=5, 
-        choices=COUNTER_CHOICES, 
-        unique=True,
-        help_text="Identifiant physique (Ex: A1, B12)"
+        max_length=10, 
+        help_text="Identifiant physique, unique dans le site (Ex: A1, B12)"
     )
     
     # Le comptoir est assigné dynamiquement à une compagnie
@@ -102,10 +160,58 @@ class Counter(models.Model):
         verbose_name = "Comptoir"
         verbose_name_plural = "Comptoirs"
         ordering = ["name"]
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'name'], name='counter_site_name_uniq'),
+        ]
 
     def __str__(self):
         comp = self.assigned_company.name if self.assigned_company else "Non Assigné"
-        return f"{self.get_name_display()} ({comp}) - {self.status}"
+        return f"Comptoir {self.name} ({comp}) - {self.status}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut et affectation chargés, pour détecter une ouverture/fermeture
+        # ou un changement de compagnie ou de site au save() (voir signals.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_assignment = (instance.__dict__.get('site_id'), instance.__dict__.get('assigned_company_id'))
+        return instance
+
+
+# ============================
+#        SERVICE ROUTE (Pool de comptoirs d'un service)
+# ============================
+class ServiceRoute(models.Model):
+    """
+    Table de routage d'un service servi par un pool de comptoirs dédié
+    (Information, VIP, Accessibilité, Objets trouvés...) au lieu des comptoirs
+    de la compagnie du vol. Lue depuis l'index en mémoire de api.routing.
+    """
+    STRATEGY_CHOICES = [
+        ("SHORTEST_QUEUE", "File la plus courte"),
+        ("FIRST_OPEN", "Premier comptoir ouvert (ordre des noms)"),
+    ]
+
+    service = models.OneToOneField(Service, on_delete=models.CASCADE, related_name="route")
+    counters = models.ManyToManyField(Counter, related_name="service_routes", help_text="Comptoirs du pool (même site que le service).")
+    strategy = models.CharField(max_length=20, choices=STRATEGY_CHOICES, default="SHORTEST_QUEUE")
+    default_wait_minutes = models.PositiveIntegerField(
+        default=5,
+        help_text="TAE annoncé tant que le ticket n'est pas placé dans une file."
+    )
+    requires_flight = models.BooleanField(
+        default=False,
+        help_text="Si faux, le numéro saisi n'est pas validé comme vol (ex: Information)."
+    )
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Routage de service"
+        verbose_name_plural = "Routages de service"
+        ordering = ["service__name"]
+
+    def __str__(self):
+        return f"{self.service.name} → {self.get_strategy_display()}"
 
 
 # ============================
@@ -120,6 +226,8 @@ class Flight(models.Model):
     ]
 
     flight_number = models.CharField(max_length=20) # Ex: AF480
+    # Forme canonique (majuscules, sans espaces ni zéros en tête) pour une recherche indexée
+    normalized_number = models.CharField(max_length=20, editable=False, default="")
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="flights")
     
     departure_time = models.DateTimeField()
@@ -132,10 +240,18 @@ class Flight(models.Model):
         # Contrainte pour s'assurer qu'un vol est unique par numéro et par jour
         unique_together = ('flight_number', 'departure_time',) 
         ordering = ["departure_time"]
+        indexes = [
+            models.Index(fields=['normalized_number', 'departure_time'], name='flight_normalized_dep_idx'),
+        ]
 
     def __str__(self):
         return f"{self.flight_number} ({self.company.code})"
 
+    def save(self, *args, **kwargs):
+        from .flight_lookup import normalize_flight_number
+        self.normalized_number = normalize_flight_number(self.flight_number)
+        super().save(*args, **kwargs)
+
 
 # ============================
 #        TICKET (Voyageur/File d'attente)
@@ -156,6 +272,12 @@ class Ticket(models.Model):
     
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="tickets")
 
+    # Site du service (dénormalisé pour que les requêtes d'un site ne lisent que ses lignes)
+    site = models.ForeignKey(Site, on_delete=models.PROTECT, related_name="tickets", editable=False)
+
+    # Le départ précis résolu à l'émission (le même numéro de vol existe sur plusieurs jours)
+    flight = models.ForeignKey("Flight", on_delete=models.SET_NULL, null=True, blank=True, related_name="tickets")
+
     # OUTPUT : Numéro de file d'attente généré (Ex: A001)
     queue_number = models.CharField(
         max_length=10, 
@@ -166,37 +288,72 @@ class Ticket(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="WAITING") 
+
+    # Arrivée « virtuelle » : la file est servie par priority_key croissant (voir api.scheduling)
+    priority_key = models.DateTimeField(blank=True, null=True, editable=False)
     
     called_at = models.DateTimeField(blank=True, null=True)
+    served_at = models.DateTimeField(blank=True, null=True)
     
     # Le comptoir qui traite le ticket
     counter = models.ForeignKey(Counter, on_delete=models.SET_NULL, null=True, blank=True, related_name="tickets")
     
-    # Temps d'attente estimé, calculé lors de la création du ticket
-    estimated_waiting_time_minutes = models.PositiveIntegerField(
+    # Temps d'attente estimé, calculé à la création puis tenu à jour par api.tae
+    # (-1 : aucun comptoir ouvert, attente indéterminée)
+    estimated_waiting_time_minutes = models.IntegerField(
         default=0, 
-        help_text="Temps d'attente estimé à l'enregistrement (en minutes)."
+        help_text="Temps d'attente estimé en minutes (-1 si aucun comptoir ouvert)."
+    )
+
+    # Identifiant généré par la borne pour un ticket émis hors ligne (dédoublonnage à la synchronisation)
+    client_uuid = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+
+    # Rang dans la file du comptoir (1 = prochain appelé, 0 = hors file)
+    queue_position = models.PositiveIntegerField(
+        default=0,
+        help_text="Position dans la file du comptoir, tenue à jour par api.tae."
     )
 
     class Meta:
         verbose_name = "Ticket"
         verbose_name_plural = "Tickets"
-        ordering = ["created_at"] # Premier arrivé, premier servi (FIFO)
+        ordering = ["created_at"] # Ordre chronologique ; les files utilisent priority_key
+        indexes = [
+            models.Index(fields=['counter', 'status', 'priority_key', 'id'], name='ticket_counter_priority_idx'),
+            # Historique paginé par (created_at, id) : un index par filtre de tickets/,
+            # préfixé par le site pour les requêtes globales d'un site
+            models.Index(fields=['site', 'created_at', 'id'], name='ticket_site_created_idx'),
+            models.Index(fields=['site', 'status', 'created_at'], name='ticket_site_status_idx'),
+            models.Index(fields=['service', 'created_at'], name='ticket_service_created_idx'),
+            models.Index(fields=['counter', 'created_at'], name='ticket_counter_created_idx'),
+            # Combinaisons courantes des écrans de supervision (tickets en attente d'un service, d'un comptoir)
+            models.Index(fields=['service', 'status', 'created_at'], name='ticket_service_status_idx'),
+            models.Index(fields=['counter', 'status', 'created_at'], name='ticket_counter_status_idx'),
+            models.Index(fields=['flight', 'created_at'], name='ticket_flight_created_idx'),
+            models.Index(fields=['ticket_number', 'created_at'], name='ticket_number_created_idx'),
+        ]
 
     def __str__(self):
         return f"File {self.queue_number} (Vol {self.ticket_number})"
 
     def save(self, *args, **kwargs):
+        if not self.site_id:
+            self.site_id = self.service.site_id
         # Génération automatique du queue_number (Ex: A001) lors de la création
         if not self.queue_number:
-            today = datetime.date.today()
-            # On compte les tickets créés aujourd'hui pour ce service
-            count = Ticket.objects.filter(
-                service=self.service,
-                created_at__date=today
-            ).count()
+            # Séquence du jour par site et préfixe (voir QueueSequence)
+            day = timezone.localdate(self.created_at) if self.created_at else timezone.localdate()
+            number = QueueSequence.next_value(self.site_id, self.service.prefix, day)
             # Formatage : Préfixe service + numéro sur 3 chiffres (ex: A + 001)
-            self.queue_number = f"{self.service.prefix}{str(count + 1).zfill(3)}"
+            self.queue_number = f"{self.service.prefix}{str(number).zfill(3)}"
+
+        if self.priority_key is None:
+            from .scheduling import compute_priority_key
+            self.priority_key = compute_priority_key(
+                self.created_at or timezone.now(),
+                self.service,
+                self.flight.departure_time if self.flight_id else None,
+            )
             
         super().save(*args, **kwargs)
 
@@ -210,4 +367,213 @@ class Ticket(models.Model):
         self.status = "CALLED"
         self.called_at = timezone.now()
         self.counter = counter
-        self.save()
\ No newline at end of file
+        self.save()
+
+# ============================
+#        QUEUE SEQUENCE (Numérotation des tickets)
+# ============================
+class QueueSequence(models.Model):
+    """
+    Dernier numéro de file attribué par site, préfixe et jour. Remplace le
+    comptage des tickets du jour : un UPDATE d'une ligne au lieu d'un COUNT,
+    et pas de doublon entre deux émissions simultanées.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name="queue_sequences")
+    prefix = models.CharField(max_length=1)
+    day = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Séquence de file"
+        verbose_name_plural = "Séquences de file"
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'prefix', 'day'], name='queuesequence_site_prefix_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.site_id} {self.prefix} {self.day} : {self.last_value}"
+
+    @classmethod
+    def next_value(cls, site_id, prefix, day, count=1):
+        """
+        Réserve ``count`` numéros consécutifs et renvoie le dernier (1 pour le
+        premier ticket du jour). ``count > 1`` : bloc prêté à une borne (KioskLease).
+        """
+        with transaction.atomic():
+            sequence = cls.objects.filter(site_id=site_id, prefix=prefix, day=day)
+            if not sequence.update(last_value=models.F('last_value') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(site_id=site_id, prefix=prefix, day=day, last_value=count)
+                    return count
+                except IntegrityError:
+                    # Créée entre-temps par une émission concurrente
+                    sequence.update(last_value=models.F('last_value') + count)
+            return sequence.values_list('last_value', flat=True).get()
+
+
+# ============================
+#        KIOSK LEASE (Numéros prêtés à une borne)
+# ============================
+class KioskLease(models.Model):
+    """
+    Bloc de numéros de file réservé par une borne pour émettre des tickets
+    hors ligne (``start`` à ``end`` inclus, pour le préfixe du service et le jour).
+    Les tickets émis sont ensuite envoyés par ``kiosks/<kiosk_id>/sync/``.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name="kiosk_leases")
+    kiosk_id = models.CharField(max_length=64, help_text="Identifiant de la borne.")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="kiosk_leases")
+    day = models.DateField()
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Bail de borne"
+        verbose_name_plural = "Baux de borne"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=['site', 'kiosk_id', 'day'], name='kiosklease_kiosk_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kiosk_id} {self.service.prefix}{self.start}-{self.end} ({self.day})"
+
+
+# ============================
+#        IDEMPOTENCY KEY (Réponses rejouées aux relances des bornes)
+# ============================
+class IdempotencyKey(models.Model):
+    """
+    Réponse enregistrée pour un en-tête ``Idempotency-Key`` (voir api/idempotency.py).
+    ``status_code`` vide : la première requête est encore en cours.
+    """
+    scope = models.CharField(max_length=100, help_text="Site et endpoint de la requête.")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="Empreinte SHA-256 du corps de la requête.")
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response = models.JSONField(blank=True, null=True)
+    # Début du traitement (remis à jour si une requête abandonnée est reprise)
+    started_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotencykey_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotencykey_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+
+# ============================
+#        TICKET EVENT (Historique des transitions)
+# ============================
+class TicketEvent(models.Model):
+    """
+    Une transition d'état d'un ticket (appel, service, saut), enregistrée par
+    api.transitions dans la même transaction que la transition elle-même.
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="events")
+    from_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    counter = models.ForeignKey(Counter, on_delete=models.SET_NULL, null=True, blank=True, related_name="ticket_events")
+    actor = models.CharField(max_length=150, blank=True, default="", help_text="Agent à l'origine de la transition.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Événement de ticket"
+        verbose_name_plural = "Événements de ticket"
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=['ticket', 'created_at'], name='ticketevent_ticket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket_id} : {self.from_status} → {self.to_status}"
+
+
+# ============================
+#        AGENT SESSION (Vacation d'un agent à un comptoir)
+# ============================
+class AgentSession(models.Model):
+    """
+    Vacation d'un agent à un comptoir, de la connexion (``started_at``) à la
+    déconnexion (``ended_at``). Les compteurs sont incrémentés par
+    api.agent_sessions à chaque transition, sans agrégation sur les tickets.
+
+    - temps de traitement : de l'appel (``called_at``) au service du ticket ;
+    - temps d'inactivité : de la dernière action (connexion, appel, service,
+      saut) à l'appel suivant.
+    """
+    counter = models.ForeignKey(Counter, on_delete=models.CASCADE, related_name="agent_sessions")
+    agent = models.CharField(max_length=150, help_text="Agent connecté au comptoir.")
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    last_activity_at = models.DateTimeField(help_text="Dernière action (connexion, appel, service, saut).")
+    tickets_called = models.PositiveIntegerField(default=0)
+    tickets_served = models.PositiveIntegerField(default=0)
+    tickets_skipped = models.PositiveIntegerField(default=0)
+    handle_time = models.DurationField(default=datetime.timedelta, help_text="Cumul appel → service.")
+    idle_time = models.DurationField(default=datetime.timedelta, help_text="Cumul dernière action → appel suivant.")
+
+    class Meta:
+        verbose_name = "Session d'agent"
+        verbose_name_plural = "Sessions d'agent"
+        ordering = ["-started_at"]
+        constraints = [
+            # Une seule session ouverte par comptoir
+            models.UniqueConstraint(
+                fields=['counter'], condition=models.Q(ended_at__isnull=True), name='agentsession_one_open_per_counter',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['started_at'], name='agentsession_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.agent} @ {self.counter.name} ({self.started_at:%Y-%m-%d %H:%M})"
+
+    @property
+    def average_handle_time(self):
+        if not self.tickets_served:
+            return None
+        return self.handle_time / self.tickets_served
+
+
+# ============================
+#        SCHEDULED JOB (Tâche périodique)
+# ============================
+class ScheduledJob(models.Model):
+    """
+    État d'une tâche périodique de ``run_scheduler`` (voir api.scheduler).
+    La ligne sert aussi de verrou : ``locked_until`` empêche deux processus
+    d'exécuter la même tâche en même temps (sans broker externe).
+    """
+    name = models.CharField(max_length=100, unique=True)
+    interval_seconds = models.PositiveIntegerField(help_text="Intervalle entre deux exécutions.")
+
+    locked_until = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True, default="")
+
+    last_started_at = models.DateTimeField(blank=True, null=True)
+    last_finished_at = models.DateTimeField(blank=True, null=True)
+    last_success_at = models.DateTimeField(blank=True, null=True)
+    last_duration_ms = models.PositiveIntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+    run_count = models.PositiveIntegerField(default=0)
+    failure_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Tâche planifiée"
+        verbose_name_plural = "Tâches planifiées"
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} (toutes les {self.interval_seconds} s)"
@@ -0,0 +1,119 @@
+"""
+Pagination par curseur (keyset) de l'historique des tickets.
+
+Chaque page est lue à partir de la position ``(created_at, id)`` du dernier
+ticket renvoyé, par une comparaison de tuple
+(``created_at < c OR (created_at = c AND id < i)``) au lieu d'un OFFSET : le
+coût d'une page ne dépend ni de sa profondeur dans l'historique ni du nombre de
+tickets créés au même instant, et une page reste stable pendant que de
+nouveaux tickets sont émis.
+
+Le curseur (``?cursor=``) est opaque pour le client : position et sens de
+lecture encodés en base64.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class TicketCursorPagination(BasePagination):
+    # Du plus récent au plus ancien ; 'id' départage les tickets créés au même instant
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = "Curseur invalide."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, backwards = self.decode_cursor(request)
+
+        if position is not None:
+            created_at, pk = position
+            if backwards:
+                after = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            else:
+                after = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            queryset = queryset.filter(after)
+        ordering = ('created_at', 'id') if backwards else self.ordering
+        # Une ligne de plus pour savoir s'il reste une page dans ce sens
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            created_at = parse_datetime(data['c'])
+            pk = int(data['i'])
+            backwards = bool(data.get('r'))
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), backwards
+
+    def encode_cursor(self, ticket, backwards):
+        data = {'c': ticket.created_at.isoformat(), 'i': ticket.pk}
+        if backwards:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], backwards=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
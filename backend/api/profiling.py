@@ -0,0 +1,233 @@
+"""
+Profilage à la demande d'une requête en production.
+
+``ProfilingMiddleware`` n'est actif que si ``SIOA_PROFILING_ENABLED`` est vrai :
+sinon il se retire de la chaîne au démarrage (``MiddlewareNotUsed``) et ne
+coûte rien. Actif, il profile une requête :
+
+- si elle porte l'en-tête ``X-Sioa-Profile: 1`` et vient d'un utilisateur
+  staff, ou l'en-tête ``X-Sioa-Profile: <SIOA_PROFILING_SECRET>`` (outils sans
+  session) : l'en-tête seul permettrait à n'importe quel client de faire
+  profiler ses requêtes ;
+- ou par tirage, avec la probabilité ``SIOA_PROFILING_SAMPLE_RATE``.
+
+Le profil est statistique : un thread échantillonne la pile du thread qui
+exécute la vue toutes les ``SIOA_PROFILING_INTERVAL_MS`` ms
+(``sys._current_frames``), ce qui ne ralentit pas le code profilé comme
+cProfile. Sous ASGI, ce n'est pas le thread du middleware : une vue
+synchrone tourne dans le thread ``sync_to_async`` de la requête (où passent
+aussi les requêtes SQL des vues asynchrones), une vue asynchrone dans celui
+de la boucle d'événements. Les piles sont
+agrégées au format « folded » (``a;b;c 12``), lu directement par
+flamegraph.pl, speedscope ou inferno. La chronologie SQL (début, durée,
+requête) est relevée via ``connection.execute_wrapper``.
+
+Les ``SIOA_PROFILING_BUFFER`` derniers profils sont gardés en mémoire (par
+processus) et servis aux administrateurs par ``profiling/`` et
+``profiling/<id>/`` (``?output=folded`` pour le texte brut).
+"""
+import collections
+import itertools
+import random
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+PROFILE_HEADER = 'X-Sioa-Profile'
+PROFILE_ID_HEADER = 'X-Sioa-Profile-Id'
+# Longueur maximale d'une requête SQL conservée dans la chronologie
+MAX_SQL_LENGTH = 500
+
+_lock = threading.Lock()
+_profiles = collections.deque(maxlen=getattr(settings, 'SIOA_PROFILING_BUFFER', 50))
+_ids = itertools.count(1)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Échantillonne la pile d'un thread à intervalle fixe et compte les piles identiques."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sioa-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return [f"{stack} {count}" for stack, count in self.counts.most_common()]
+
+
+class SQLTimeline:
+    """``execute_wrapper`` qui note début (ms depuis le début de la requête), durée et SQL."""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        begin = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            self.queries.append({
+                'start_ms': round((begin - self.started) * 1000, 3),
+                'duration_ms': round((end - begin) * 1000, 3),
+                'sql': sql[:MAX_SQL_LENGTH],
+            })
+
+
+def profiles():
+    """Profils conservés, du plus récent au plus ancien."""
+    with _lock:
+        return list(reversed(_profiles))
+
+
+def get_profile(profile_id):
+    with _lock:
+        for profile in _profiles:
+            if profile['id'] == profile_id:
+                return profile
+    return None
+
+
+def clear_profiles():
+    with _lock:
+        _profiles.clear()
+
+
+def attach_timeline(timeline):
+    """
+    Branche ``timeline`` sur la connexion du thread courant ; renvoie
+    l'identifiant du thread (celui qui exécutera la vue synchrone sous ASGI).
+    """
+    connection.execute_wrappers.append(timeline)
+    return threading.get_ident()
+
+
+def detach_timeline(timeline):
+    connection.execute_wrappers.remove(timeline)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SIOA_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SIOA_PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'SIOA_PROFILING_INTERVAL_MS', 1) / 1000
+        self.secret = getattr(settings, 'SIOA_PROFILING_SECRET', '')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def should_profile(self, request, user):
+        """
+        ``user`` n'est consulté que pour ``X-Sioa-Profile: 1`` : il n'est pas
+        chargé (session, utilisateur) pour les autres requêtes.
+        """
+        value = request.headers.get(PROFILE_HEADER)
+        if value:
+            if self.secret and constant_time_compare(value, self.secret):
+                return True
+            return value == '1' and user is not None and user.is_staff
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.should_profile(request, getattr(request, 'user', None)):
+            return self.get_response(request)
+
+        started_at = timezone.now()
+        started = time.perf_counter()
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        timeline = SQLTimeline(started)
+        sampler.start()
+        try:
+            with connection.execute_wrapper(timeline):
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        return self.record(request, response, started_at, started, sampler, timeline)
+
+    async def __acall__(self, request):
+        user = await request.auser() if request.headers.get(PROFILE_HEADER) and hasattr(request, 'auser') else None
+        if not self.should_profile(request, user):
+            return await self.get_response(request)
+
+        started_at = timezone.now()
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        # Thread sync_to_async de la requête : vue synchrone et ORM des vues asynchrones
+        worker = await sync_to_async(attach_timeline)(timeline)
+        sampler = StackSampler(threading.get_ident() if self.is_async_view(request) else worker, self.interval)
+        sampler.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.stop()
+            await sync_to_async(detach_timeline)(timeline)
+        return self.record(request, response, started_at, started, sampler, timeline)
+
+    @staticmethod
+    def is_async_view(request):
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        return iscoroutinefunction(match.func)
+
+    def record(self, request, response, started_at, started, sampler, timeline):
+        duration_ms = (time.perf_counter() - started) * 1000
+        profile = {
+            'id': next(_ids),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'started_at': started_at,
+            'duration_ms': round(duration_ms, 3),
+            'sql_count': len(timeline.queries),
+            'sql_ms': round(sum(query['duration_ms'] for query in timeline.queries), 3),
+            'samples': sum(sampler.counts.values()),
+            'interval_ms': self.interval * 1000,
+            'folded': sampler.folded(),
+            'sql': timeline.queries,
+        }
+        with _lock:
+            _profiles.append(profile)
+        response[PROFILE_ID_HEADER] = str(profile['id'])
+        return response
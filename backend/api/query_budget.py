@@ -0,0 +1,32 @@
+"""
+Budgets de requêtes SQL et de latence déclarés par vue.
+
+Chaque vue de ``api/urls.py`` déclare le nombre maximal de requêtes qu'elle
+émet et sa latence maximale ; ``QueryBudgetTestCase`` (api/tests.py) appelle
+chaque endpoint sur des jeux de données de taille croissante et vérifie que le
+nombre de requêtes est identique à chaque taille (pas de N+1) et reste dans le
+budget. La latence, qui dépend de la machine et de sa charge, n'est vérifiée
+que sur demande (``SIOA_QUERY_BUDGET_TIMING=1``). Une vue sans budget fait
+échouer le test : ajouter ``@query_budget`` à toute nouvelle vue.
+
+    @query_budget(queries=2, ms=100)
+    class CounterListView(generics.ListAPIView):
+        ...
+"""
+
+
+def query_budget(queries, ms=200):
+    """
+    Déclare le budget d'une vue (classe DRF ou fonction) : ``queries`` requêtes
+    au plus, ``ms`` millisecondes au plus (mesurées sur SQLite en mémoire).
+    """
+    def decorator(view):
+        view.query_budget = {'queries': queries, 'ms': ms}
+        return view
+    return decorator
+
+
+def view_budget(callback):
+    """Budget de la vue résolue par ``django.urls.resolve`` (None si non déclaré)."""
+    view = getattr(callback, 'view_class', None) or callback
+    return getattr(view, 'query_budget', None)
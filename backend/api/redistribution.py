@@ -0,0 +1,98 @@
+"""
+Fermeture d'un comptoir et redistribution de sa file.
+
+Un comptoir passé à FERME garde ses tickets WAITING (``Ticket.counter``) alors
+que ``assign_counter_to_ticket`` ne lui en envoie plus : sans redistribution,
+ces voyageurs attendent indéfiniment. Ici, en une transaction :
+
+1. les tickets WAITING du comptoir fermé sont lus dans l'ordre de la file ;
+2. chacun est donné, dans cet ordre, au comptoir ouvert le moins chargé de la
+   même compagnie et du même site (tas sur la charge) ; à défaut (comptoir
+   sans compagnie, comme ceux des pools Information ou VIP, ou aucun comptoir
+   de la compagnie ouvert), aux autres comptoirs ouverts de ses pools de
+   service (``ServiceRoute``, voir api/routing.py) ;
+3. un seul ``bulk_update`` de ``counter``, recalcul du TAE des files touchées,
+   une seule publication ``queue_changed``.
+
+Les tickets gardent leur ``priority_key`` : dans leur nouvelle file, ils se
+placent selon leur ancienneté et leur priorité d'origine, et leur ordre relatif
+est conservé. Les tickets CALLED restent au comptoir (en cours de service).
+Sans comptoir ouvert pour la compagnie ni dans ses pools, la file reste en
+place (TAE -1).
+"""
+import heapq
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Counter, Ticket
+from .routing import pool_peers
+from .signals import queue_changed
+from .tae import OPEN_STATUSES, QUEUE_ORDERING, recompute_counter_queues
+
+
+def redistribute_waiting_tickets(counter):
+    """
+    Répartit les tickets WAITING de ``counter`` sur les autres comptoirs
+    ouverts de sa compagnie, sinon de ses pools de service.
+
+    Returns:
+        ``{counter_id: nombre de tickets reçus}``
+    """
+    # Pas de savepoint quand ``close_counter`` a déjà ouvert la transaction
+    with transaction.atomic(savepoint=False):
+        waiting = list(
+            Ticket.objects.select_for_update()
+            .filter(counter=counter, status='WAITING')
+            .only('id', 'counter_id')
+            .order_by(*QUEUE_ORDERING)
+        )
+        targets = []
+        open_counters = Counter.objects.filter(site_id=counter.site_id, status__in=OPEN_STATUSES).exclude(pk=counter.pk)
+        if waiting and counter.assigned_company_id:
+            targets = list(
+                open_counters.filter(assigned_company_id=counter.assigned_company_id).values_list('id', flat=True)
+            )
+        if waiting and not targets:
+            # Index des routes en mémoire : une requête de plus seulement si le comptoir est dans un pool
+            peers = pool_peers(counter.id)
+            if peers:
+                targets = list(open_counters.filter(pk__in=peers).values_list('id', flat=True))
+
+        moved = {}
+        if targets:
+            loads = dict(
+                Ticket.objects.filter(counter_id__in=targets, status__in=['WAITING', 'CALLED'])
+                .order_by().values_list('counter_id').annotate(count=Count('id'))
+            )
+            heap = [(loads.get(counter_id, 0), counter_id) for counter_id in targets]
+            heapq.heapify(heap)
+            for ticket in waiting:
+                load, counter_id = heapq.heappop(heap)
+                ticket.counter_id = counter_id
+                moved[counter_id] = moved.get(counter_id, 0) + 1
+                heapq.heappush(heap, (load + 1, counter_id))
+            Ticket.objects.bulk_update(waiting, ['counter'])
+
+        counter_ids = [counter.id, *moved]
+        recompute_counter_queues(counter_ids)
+        queue_changed.send(
+            sender=Counter, counter_ids=counter_ids, reason='counter-closed', moved=sum(moved.values()),
+        )
+    return moved
+
+
+def close_counter(counter):
+    """
+    Ferme le comptoir (UPDATE conditionnel, sans repasser par ``save``) puis
+    redistribue sa file. Sans effet sur le statut d'un comptoir déjà fermé ;
+    sa file restante est tout de même redistribuée.
+
+    Returns:
+        ``{counter_id: nombre de tickets reçus}``
+    """
+    with transaction.atomic():
+        if Counter.objects.filter(pk=counter.pk).exclude(status='FERME').update(status='FERME'):
+            counter.status = 'FERME'
+            counter._loaded_status = 'FERME'
+        return redistribute_waiting_tickets(counter)
@@ -0,0 +1,43 @@
+"""
+Rendu JSON rapide via orjson (dépendance optionnelle).
+
+Sans orjson, ``FastJSONRenderer`` se comporte exactement comme le
+``JSONRenderer`` de DRF.
+"""
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson est optionnel
+    orjson = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(value):
+    # Types non gérés nativement par orjson (Decimal, chaînes paresseuses, QuerySet...)
+    return _fallback_encoder.default(value)
+
+
+def dumps(data):
+    """Sérialise en JSON (bytes), compact, dates UTC suffixées par Z comme DRF."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z)
+    return JSONRenderer().render(data)
+
+
+def fast_json_response(data, status=200):
+    """Équivalent de ``JsonResponse`` pour les vues hors DRF (vues asynchrones)."""
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Indentation demandée (ex: ?format=json&indent=4) : rendu standard
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,108 @@
+"""
+Routage des services servis par un pool de comptoirs dédié.
+
+Un ``ServiceRoute`` associe un service (Information, VIP, Accessibilité,
+Objets trouvés...) à un pool de comptoirs, une stratégie et un TAE par défaut.
+Les services sans route sont servis par les comptoirs de la compagnie du vol
+(``views.assign_counter_to_ticket``).
+
+Les routes actives sont gardées en mémoire dans un index
+``service_id -> route`` : à l'émission, savoir si un service est routé est une
+lecture de dictionnaire, et choisir le comptoir coûte une requête (comptoirs
+ouverts du pool avec leur charge). L'index est invalidé à chaque modification
+des routes (signaux, voir api/signals.py) via un jeton de version rangé dans
+le cache partagé, comme l'index des vols (api/flight_lookup.py).
+"""
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from .models import Counter, ServiceRoute
+from .tae import OPEN_STATUSES
+
+ROUTING_VERSION_KEY = 'sioa:routing-version'
+
+_index_lock = threading.Lock()
+_index = {'version': None, 'routes': {}}
+
+
+def routing_version():
+    return caches['versions'].get(ROUTING_VERSION_KEY, 0)
+
+
+def invalidate_routing_index():
+    """À appeler après toute modification des routes ou de leurs pools."""
+    # Jeton aléatoire plutôt que incr() : incr() du cache fichier n'est pas atomique
+    # entre processus, deux invalidations simultanées pourraient n'en faire qu'une
+    caches['versions'].set(ROUTING_VERSION_KEY, uuid.uuid4().hex, None)
+    with _index_lock:
+        _index['version'] = None
+
+
+def routes():
+    """
+    Index en mémoire ``{service_id: route}`` des routes actives ; chaque route
+    est un dict (``counter_ids``, ``strategy``, ``default_wait_minutes``,
+    ``requires_flight``). Reconstruit en une requête quand la version change.
+    """
+    version = routing_version()
+    with _index_lock:
+        if _index['version'] == version:
+            return _index['routes']
+
+    index = {}
+    # Une ligne par comptoir du pool (jointure faite par la base)
+    rows = ServiceRoute.objects.filter(is_active=True).values(
+        'service_id', 'strategy', 'default_wait_minutes', 'requires_flight', 'counters',
+    )
+    for row in rows:
+        counter_id = row.pop('counters')
+        route = index.setdefault(row['service_id'], {**row, 'counter_ids': []})
+        if counter_id is not None:
+            route['counter_ids'].append(counter_id)
+
+    with _index_lock:
+        _index.update(version=version, routes=index)
+    return index
+
+
+def pool_peers(counter_id):
+    """Autres comptoirs des pools (routes actives) dont fait partie ``counter_id``."""
+    peers = set()
+    for route in routes().values():
+        if counter_id in route['counter_ids']:
+            peers.update(route['counter_ids'])
+    peers.discard(counter_id)
+    return peers
+
+
+def route_for(service):
+    """Route active du service, ou None (service servi par les comptoirs de la compagnie)."""
+    return routes().get(service.id)
+
+
+def requires_flight(service):
+    """Faux pour un service routé qui n'a pas besoin d'un vol (ex: Information)."""
+    route = route_for(service)
+    return route is None or route['requires_flight']
+
+
+def assign_pool_counter(route):
+    """
+    Comptoir ouvert du pool choisi selon la stratégie de la route (une requête).
+
+    Returns:
+        Le ``Counter`` choisi, ou None si aucun comptoir du pool n'est ouvert
+    """
+    counters = list(
+        Counter.objects.filter(pk__in=route['counter_ids'], status__in=OPEN_STATUSES).annotate(
+            load=Count('tickets', filter=Q(tickets__status__in=['WAITING', 'CALLED'])),
+        )
+    )
+    if not counters:
+        return None
+    if route['strategy'] == 'FIRST_OPEN':
+        return min(counters, key=lambda counter: counter.name)
+    return min(counters, key=lambda counter: (counter.load, counter.name))
@@ -0,0 +1,137 @@
+"""
+Planificateur de tâches périodiques en processus (sans broker externe).
+
+Les tâches sont déclarées avec ``@job(name, interval_seconds)`` (voir
+``api/jobs.py``) et exécutées par la commande ``run_scheduler``. Chaque tâche a
+une ligne ``ScheduledJob`` qui sert de verrou : la prise du verrou et la
+vérification d'échéance se font en un seul UPDATE conditionnel, ce qui marche
+à l'identique sur SQLite et PostgreSQL et empêche deux processus d'exécuter la
+même tâche simultanément.
+"""
+import datetime
+import logging
+import os
+import socket
+import time
+import traceback
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def job(name, interval_seconds, timeout_seconds=None):
+    """
+    Déclare une tâche périodique.
+
+    ``timeout_seconds`` (par défaut 2 × l'intervalle, au moins 60 s) borne la
+    durée du verrou si le processus meurt pendant l'exécution.
+    """
+    def decorator(func):
+        _registry[name] = {
+            'func': func,
+            'interval': datetime.timedelta(seconds=interval_seconds),
+            'timeout': datetime.timedelta(seconds=timeout_seconds or max(60, 2 * interval_seconds)),
+        }
+        return func
+    return decorator
+
+
+def registered_jobs():
+    return dict(_registry)
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def sync_jobs():
+    """Crée les lignes manquantes et aligne les intervalles sur le code."""
+    ScheduledJob.objects.bulk_create(
+        [
+            ScheduledJob(name=name, interval_seconds=int(spec['interval'].total_seconds()))
+            for name, spec in _registry.items()
+        ],
+        ignore_conflicts=True,
+    )
+    for name, spec in _registry.items():
+        ScheduledJob.objects.filter(name=name).exclude(
+            interval_seconds=int(spec['interval'].total_seconds())
+        ).update(interval_seconds=int(spec['interval'].total_seconds()))
+
+
+def acquire(name, owner, now=None, force=False):
+    """
+    Prend le verrou de la tâche si elle est due et libre. Renvoie True si acquis.
+    """
+    spec = _registry[name]
+    now = now or timezone.now()
+    candidates = ScheduledJob.objects.filter(name=name).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    )
+    if not force:
+        candidates = candidates.filter(
+            Q(last_started_at__isnull=True) | Q(last_started_at__lte=now - spec['interval'])
+        )
+    return candidates.update(locked_until=now + spec['timeout'], locked_by=owner, last_started_at=now) == 1
+
+
+def run_job(name, owner=None, force=False):
+    """
+    Exécute une tâche si son verrou est acquis et enregistre durée et résultat.
+
+    Returns:
+        None si la tâche n'a pas été lancée, sinon True (succès) ou False (échec)
+    """
+    owner = owner or default_owner()
+    if not acquire(name, owner, force=force):
+        return None
+
+    started = time.perf_counter()
+    error = ""
+    try:
+        _registry[name]['func']()
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Échec de la tâche planifiée %s", name)
+    duration_ms = int((time.perf_counter() - started) * 1000)
+
+    now = timezone.now()
+    fields = {
+        'locked_until': None,
+        'locked_by': "",
+        'last_finished_at': now,
+        'last_duration_ms': duration_ms,
+        'last_error': error,
+        'run_count': F('run_count') + 1,
+    }
+    if error:
+        fields['failure_count'] = F('failure_count') + 1
+    else:
+        fields['last_success_at'] = now
+    ScheduledJob.objects.filter(name=name, locked_by=owner).update(**fields)
+    return not error
+
+
+def run_pending(owner=None):
+    """Lance toutes les tâches dues. Renvoie ``{name: résultat}`` des tâches lancées."""
+    owner = owner or default_owner()
+    results = {}
+    for name in _registry:
+        result = run_job(name, owner)
+        if result is not None:
+            results[name] = result
+    return results
+
+
+def is_healthy(scheduled_job, now=None):
+    """Une tâche est saine si elle a réussi il y a moins de deux intervalles."""
+    if scheduled_job.last_success_at is None:
+        return False
+    now = now or timezone.now()
+    return now - scheduled_job.last_success_at <= 2 * datetime.timedelta(seconds=scheduled_job.interval_seconds)
@@ -0,0 +1,51 @@
+"""
+Ordonnancement prioritaire des files d'attente.
+
+Chaque ticket reçoit à l'émission une clé de priorité ``priority_key`` (une
+date « d'arrivée virtuelle ») ; la file d'un comptoir est servie par ordre
+croissant de cette clé :
+
+    priority_key = min(created_at - bonus de classe, departure_time - LATE_DEPARTURE_WINDOW)
+
+- la classe de service (VIP, Assistance spéciale) avance l'arrivée de quelques minutes ;
+- un passager dont le vol part bientôt passe devant ceux arrivés après
+  ``departure_time - LATE_DEPARTURE_WINDOW`` ;
+- la clé ne dépend pas de l'heure courante : un ticket qui attend ne peut être
+  dépassé que par un nombre borné de tickets plus récents (vieillissement, pas de famine).
+
+La clé étant fixe, elle est indexée avec (counter, status) : « appeler le
+suivant » (``api.transitions.call_next_ticket``) est une recherche dans un
+index B-tree, en O(log n).
+"""
+import datetime
+
+from django.conf import settings
+
+from .models import Ticket
+
+# Avance accordée par classe de service (Service.priority_class)
+CLASS_BOOSTS = {
+    'STANDARD': datetime.timedelta(0),
+    'VIP': datetime.timedelta(minutes=15),
+    'ASSISTANCE': datetime.timedelta(minutes=30),
+}
+LATE_DEPARTURE_WINDOW = datetime.timedelta(
+    minutes=getattr(settings, 'SIOA_LATE_DEPARTURE_WINDOW_MINUTES', 60)
+)
+
+
+def compute_priority_key(created_at, service, departure_time=None):
+    key = created_at - CLASS_BOOSTS.get(service.priority_class, datetime.timedelta(0))
+    if departure_time is not None:
+        key = min(key, departure_time - LATE_DEPARTURE_WINDOW)
+    return key
+
+
+def next_waiting_ticket(counter_id):
+    """Le ticket en tête de la file du comptoir (ou None)."""
+    return (
+        Ticket.objects.filter(counter_id=counter_id, status='WAITING')
+        .order_by('priority_key', 'id')
+        .first()
+    )
+
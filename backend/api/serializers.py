@@ -1,5 +1,8 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Service, Ticket, Flight, Company, Counter
+from .kiosk import DEFAULT_LEASE_SIZE, MAX_LEASE_SIZE, MAX_SYNC_BATCH
+from .models import Service, Ticket, Flight, Company, Counter, ScheduledJob, KioskLease
+from .scheduler import is_healthy
 
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,13 +20,35 @@ class TicketSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ticket
-        fields = ['id', 'service', 'service_name', 'ticket_number', 'queue_number', 'created_at', 'status', 'estimated_waiting_time_minutes', 'counter', 'assigned_counter_name']
-        read_only_fields = ['ticket_number', 'queue_number', 'created_at', 'estimated_waiting_time_minutes', 'counter', 'service', 'service_name', 'assigned_counter_name']
+        fields = ['id', 'service', 'service_name', 'ticket_number', 'queue_number', 'created_at', 'status', 'estimated_waiting_time_minutes', 'queue_position', 'counter', 'assigned_counter_name']
+        read_only_fields = ['ticket_number', 'queue_number', 'created_at', 'estimated_waiting_time_minutes', 'queue_position', 'counter', 'service', 'service_name', 'assigned_counter_name']
 
 class EnregistrementSerializer(serializers.Serializer):
     ticket_number = serializers.CharField(max_length=20)
     service_id = serializers.IntegerField()
 
+class KioskLeaseRequestSerializer(serializers.Serializer):
+    service_id = serializers.IntegerField()
+    size = serializers.IntegerField(min_value=1, max_value=MAX_LEASE_SIZE, default=DEFAULT_LEASE_SIZE)
+
+class KioskLeaseSerializer(serializers.ModelSerializer):
+    prefix = serializers.CharField(source='service.prefix', read_only=True)
+
+    class Meta:
+        model = KioskLease
+        fields = ['id', 'kiosk_id', 'service', 'prefix', 'day', 'start', 'end', 'created_at']
+
+class KioskTicketSerializer(serializers.Serializer):
+    """Ticket émis hors ligne par une borne, dans un de ses baux."""
+    client_uuid = serializers.UUIDField()
+    service_id = serializers.IntegerField()
+    ticket_number = serializers.CharField(max_length=20)
+    queue_number = serializers.CharField(max_length=10)
+    issued_at = serializers.DateTimeField()
+
+class KioskSyncSerializer(serializers.Serializer):
+    tickets = serializers.ListField(child=KioskTicketSerializer(), allow_empty=False, max_length=MAX_SYNC_BATCH)
+
 class FlightSerializer(serializers.ModelSerializer):
     company_name = serializers.CharField(source='company.name', read_only=True)
     company_code = serializers.CharField(source='company.code', read_only=True)
@@ -60,3 +85,46 @@ class TicketStatisticsSerializer(serializers.Serializer):
 
     def get_waiting_tickets_by_service(self, obj):
         return obj.get('waiting_tickets_by_service', [])
+
+
+class TicketFilterSerializer(serializers.Serializer):
+    """Paramètres de filtre de ``GET tickets/`` (tous optionnels)."""
+    status = serializers.CharField(required=False, help_text="Un ou plusieurs statuts séparés par des virgules.")
+    service = serializers.IntegerField(required=False)
+    counter = serializers.IntegerField(required=False)
+    flight = serializers.IntegerField(required=False)
+    company = serializers.RegexField(r'^[A-Za-z0-9]{2,3}$', required=False, help_text="Code IATA (préfixe du numéro de vol).")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate_status(self, value):
+        statuses = [status.strip().upper() for status in value.split(',') if status.strip()]
+        allowed = {choice for choice, _ in Ticket.STATUS_CHOICES}
+        unknown = [status for status in statuses if status not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f"Statut inconnu : {', '.join(unknown)}.")
+        return statuses
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from doit précéder date_to.")
+        return attrs
+
+
+class ScheduledJobSerializer(serializers.ModelSerializer):
+    healthy = serializers.SerializerMethodField()
+    running = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScheduledJob
+        fields = [
+            'name', 'interval_seconds', 'healthy', 'running', 'locked_by',
+            'last_started_at', 'last_finished_at', 'last_success_at', 'last_duration_ms',
+            'last_error', 'run_count', 'failure_count',
+        ]
+
+    def get_healthy(self, obj):
+        return is_healthy(obj)
+
+    def get_running(self, obj):
+        return obj.locked_until is not None and obj.locked_until > timezone.now()
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .display_feed import counter_changed, invalidate_all_display_feeds, invalidate_display_feeds
+from .flight_lookup import invalidate_flight_index
+from .forecasting import invalidate_forecasts
+from .models import Counter, Flight, ServiceRoute, Site
+from .routing import invalidate_routing_index
+from .sites import invalidate_site_index
+from .tae import recompute_counter_queues
+
+# Une ou plusieurs files ont changé (émission, transition, UPDATE en masse).
+# Arguments : counter_ids (comptoirs touchés), reason, et des compteurs propres à l'opération.
+queue_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def flight_schedule_changed(sender, **kwargs):
+    """Le programme a changé : l'index des vols du jour doit être reconstruit."""
+    invalidate_flight_index()
+    transaction.on_commit(invalidate_all_display_feeds)
+
+
+@receiver([post_save, post_delete], sender=ServiceRoute)
+@receiver(m2m_changed, sender=ServiceRoute.counters.through)
+def service_routes_changed(sender, **kwargs):
+    """Une route ou son pool a changé : l'index de routage doit être reconstruit."""
+    invalidate_routing_index()
+
+
+@receiver([post_save, post_delete], sender=Site)
+def sites_changed(sender, **kwargs):
+    """Un site a changé (création, activation, code) : l'index des sites doit être reconstruit."""
+    invalidate_site_index()
+
+
+@receiver(queue_changed)
+def refresh_feeds_on_queue_change(sender, counter_ids=None, **kwargs):
+    """
+    Les écrans des comptoirs touchés sont marqués périmés une fois la
+    transaction validée ; ils sont reconstruits à leur prochaine lecture.
+    """
+    counter_ids = list(counter_ids or [])
+    if counter_ids:
+        transaction.on_commit(lambda: invalidate_display_feeds(counter_ids))
+
+
+@receiver(post_save, sender=Counter)
+def refresh_feeds_on_counter_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: counter_changed(instance))
+
+
+@receiver(post_delete, sender=Counter)
+def refresh_feeds_on_counter_delete(sender, **kwargs):
+    transaction.on_commit(invalidate_all_display_feeds)
+    transaction.on_commit(invalidate_forecasts)
+
+
+@receiver(post_save, sender=Counter)
+def counter_assignment_changed(sender, instance, created, update_fields=None, **kwargs):
+    """Les prévisions d'arrivées ne couvrent que les compagnies ayant un comptoir au site."""
+    if update_fields is not None and not {'site', 'site_id', 'assigned_company', 'assigned_company_id'} & set(update_fields):
+        return
+    assignment = (instance.site_id, instance.assigned_company_id)
+    previous = getattr(instance, '_loaded_assignment', None)
+    instance._loaded_assignment = assignment
+    if created or previous != assignment:
+        transaction.on_commit(invalidate_forecasts)
+
+
+@receiver(post_save, sender=Counter)
+def counter_opened_or_closed(sender, instance, created, **kwargs):
+    """
+    Un comptoir ouvert ou fermé change le TAE de toute sa file ; un comptoir
+    qui ferme redistribue ses tickets en attente (voir api/redistribution.py).
+    """
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or previous == instance.status:
+        return
+    if instance.status == 'FERME':
+        from .redistribution import redistribute_waiting_tickets
+        redistribute_waiting_tickets(instance)
+    elif previous is None or previous == 'FERME':
+        recompute_counter_queues([instance.pk])
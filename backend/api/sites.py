@@ -0,0 +1,82 @@
+"""
+Site (terminal) courant d'une requête.
+
+Les bornes et écrans envoient le code de leur site dans l'en-tête
+``X-Sioa-Site`` (ou le paramètre ``?site=``). Sans indication, la requête
+porte sur le site par défaut ``SIOA_DEFAULT_SITE`` : une installation
+mono-terminal fonctionne sans changement.
+
+Les sites actifs sont gardés en mémoire (``code -> Site``) : trouver le site
+d'une requête de polling ne coûte aucune requête SQL. L'index est invalidé à
+chaque modification d'un site (signaux, voir api/signals.py) via un jeton de
+version rangé dans le cache partagé, comme l'index des vols.
+"""
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+
+from .models import Site, default_site_id
+
+SITE_HEADER = 'X-Sioa-Site'
+SITE_PARAM = 'site'
+SITES_VERSION_KEY = 'sioa:sites-version'
+
+_index_lock = threading.Lock()
+_index = {'version': None, 'sites': None}
+
+
+def default_site_code():
+    return getattr(settings, 'SIOA_DEFAULT_SITE', 'MAIN')
+
+
+def site_code(request):
+    """Code du site demandé (sans accès à la base)."""
+    return request.headers.get(SITE_HEADER) or request.GET.get(SITE_PARAM) or default_site_code()
+
+
+def invalidate_site_index():
+    """À appeler après toute modification d'un site."""
+    caches['versions'].set(SITES_VERSION_KEY, uuid.uuid4().hex, None)
+    with _index_lock:
+        _index['sites'] = None
+
+
+def active_sites():
+    """Index en mémoire ``{code: Site}`` des sites actifs, relu (une requête) quand la version change."""
+    version = caches['versions'].get(SITES_VERSION_KEY)
+    with _index_lock:
+        if _index['sites'] is not None and _index['version'] == version:
+            return _index['sites']
+    sites = {site.code: site for site in Site.objects.filter(is_active=True)}
+    with _index_lock:
+        _index.update(version=version, sites=sites)
+    return sites
+
+
+def get_site(code):
+    """
+    Raises:
+        Site.DoesNotExist: site inconnu ou désactivé
+    """
+    site = active_sites().get(code)
+    if site is not None:
+        return site
+    if code != default_site_code():
+        raise Site.DoesNotExist(f"Site '{code}' inconnu ou désactivé.")
+    # Base sans site (fixtures, tests) : le site par défaut est créé à la demande
+    return Site.objects.get(pk=default_site_id())
+
+
+def request_site(request):
+    try:
+        return get_site(site_code(request))
+    except Site.DoesNotExist:
+        raise Http404(f"Site '{site_code(request)}' inconnu.")
+
+
+async def arequest_site(request):
+    return await sync_to_async(request_site)(request)
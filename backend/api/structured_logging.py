@@ -0,0 +1,194 @@
+"""
+Journalisation structurée (une ligne JSON par événement) hors du thread de la requête.
+
+- ``RequestIdMiddleware`` attribue à chaque requête un identifiant (en-tête
+  ``X-Request-Id`` reçu, sinon généré), renvoyé dans la réponse et ajouté à
+  chaque ligne de log par ``RequestIdFilter``.
+- ``QueueListenerHandler`` ne fait que mettre l'enregistrement dans une file ;
+  un ``QueueListener`` le formate (``JSONFormatter``) et l'écrit depuis son
+  propre thread : aucune écriture sur stdout/stderr pendant la requête.
+- ``Event`` mesure les phases d'un traitement (``routing_ms``, ``tae_ms``...)
+  et le temps passé en base (``db_ms``). Les événements des chemins chauds
+  sont échantillonnés (``SIOA_LOG_SAMPLE_RATES``) ; un événement plus lent que
+  ``SIOA_LOG_SLOW_MS`` est toujours journalisé.
+
+Configuration : ``LOGGING`` dans settings.py.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+request_id = contextvars.ContextVar('sioa_request_id', default=None)
+
+# Attributs standard d'un LogRecord : tout le reste vient de ``extra``
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            # django.request journalise la réponse après la sortie du middleware
+            request = getattr(record, 'request', None)
+            record.request_id = getattr(request, 'request_id', None) or request_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in RESERVED_ATTRS})
+        if hasattr(data.get('request'), 'path'):
+            # LogRecord de django.request : la requête elle-même
+            data['request'] = f"{data['request'].method} {data['request'].get_full_path()}"
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """
+    ``QueueHandler`` qui démarre son ``QueueListener`` : le formatage JSON et
+    l'écriture (``stream``, stderr par défaut) se font dans le thread du listener.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        self._stopped = False
+        atexit.register(self.stop)
+
+    def stop(self):
+        # Vide la file ; sans effet si déjà arrêté
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def prepare(self, record):
+        # Le message et la trace sont figés ici ; les champs ``extra`` restent à part
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+@sync_and_async_middleware
+def RequestIdMiddleware(get_response):
+    # Compatible ASGI : les vues asynchrones (async_views.py) ne repassent pas par un thread
+    def start(request):
+        request.request_id = (request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)[:64]
+        return request_id.set(request.request_id)
+
+    def finish(request, response, token):
+        request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = start(request)
+            try:
+                response = await get_response(request)
+            except BaseException:
+                request_id.reset(token)
+                raise
+            return finish(request, response, token)
+    else:
+        def middleware(request):
+            token = start(request)
+            try:
+                response = get_response(request)
+            except BaseException:
+                request_id.reset(token)
+                raise
+            return finish(request, response, token)
+    return middleware
+
+
+def sample_rate(name):
+    return getattr(settings, 'SIOA_LOG_SAMPLE_RATES', {}).get(name, 1.0)
+
+
+class Event:
+    """
+    Événement chronométré ::
+
+        event = Event(logger, 'ticket.issued')
+        with event.track_db():
+            event.start('routing')
+            ...
+            event.stop('routing')
+        event.emit(queue_number=...)
+
+    ``track_db`` n'installe le chronométrage SQL que si l'événement est tiré
+    au sort ; les phases (deux appels à ``perf_counter``) sont toujours mesurées.
+    """
+
+    def __init__(self, logger, name):
+        self.logger = logger
+        self.name = name
+        self.sampled = random.random() < sample_rate(name)
+        self.started = time.perf_counter()
+        self.timings = {}
+        self._open = {}
+        self.db_ms = 0.0
+        self.db_queries = 0
+
+    def start(self, phase):
+        self._open[phase] = time.perf_counter()
+
+    def stop(self, phase):
+        elapsed = (time.perf_counter() - self._open.pop(phase)) * 1000
+        self.timings[f'{phase}_ms'] = self.timings.get(f'{phase}_ms', 0.0) + elapsed
+
+    def _time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - started) * 1000
+            self.db_queries += 1
+
+    def track_db(self):
+        if self.sampled:
+            return connection.execute_wrapper(self._time_query)
+        return contextlib.nullcontext()
+
+    def emit(self, level=logging.INFO, **fields):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        slow = total_ms >= getattr(settings, 'SIOA_LOG_SLOW_MS', 500)
+        if not (self.sampled or slow or level >= logging.WARNING):
+            return
+        extra = {'event': self.name, 'total_ms': round(total_ms, 3), 'slow': slow}
+        extra.update({key: round(value, 3) for key, value in self.timings.items()})
+        if self.sampled:
+            extra.update({'db_ms': round(self.db_ms, 3), 'db_queries': self.db_queries})
+        extra.update(fields)
+        self.logger.log(level, self.name, extra=extra)
@@ -0,0 +1,76 @@
+"""
+Balayage des tickets en attente dont le vol n'est plus enregistrable.
+
+- vol annulé (CANCELLED) ou enregistrement clos (départ dans moins de
+  ``SIOA_CHECKIN_CLOSE_MINUTES``) : les tickets WAITING passent à CANCELLED ;
+- clôture dans moins de ``SIOA_CHECKIN_BOOST_MINUTES`` : les tickets sont
+  placés en tête de file (``priority_key`` = départ - 1 jour, donc ordonnés par départ) ;
+- ticket sans vol (service Information, vol non résolu, ticket antérieur au
+  lien ``Ticket.flight``) en attente depuis plus de
+  ``SIOA_UNLINKED_TICKET_MAX_AGE_MINUTES`` : annulé.
+
+Chaque catégorie est traitée en un seul UPDATE joint à ``Flight`` ; les files
+touchées sont ensuite recalculées et le changement est publié via ``queue_changed``.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value
+from django.utils import timezone
+
+from .models import Flight, Ticket
+from .signals import queue_changed
+from .tae import recompute_counter_queues
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_CLOSE = datetime.timedelta(minutes=getattr(settings, 'SIOA_CHECKIN_CLOSE_MINUTES', 45))
+BOOST_WINDOW = datetime.timedelta(minutes=getattr(settings, 'SIOA_CHECKIN_BOOST_MINUTES', 30))
+# Une clé un jour avant le départ passe devant toute arrivée réelle de la journée
+URGENT_LEAD = datetime.timedelta(days=1)
+UNLINKED_MAX_AGE = datetime.timedelta(minutes=getattr(settings, 'SIOA_UNLINKED_TICKET_MAX_AGE_MINUTES', 240))
+
+
+def sweep_expired_tickets(now=None):
+    """
+    Annule ou priorise les tickets WAITING selon l'état de leur vol, ou leur
+    ancienneté pour les tickets sans vol.
+
+    Returns:
+        counts: ``{'cancelled': n, 'boosted': m}``
+    """
+    now = now or timezone.now()
+    checkin_closed = Q(flight__status='CANCELLED') | Q(flight__departure_time__lte=now + CHECKIN_CLOSE)
+    waiting = Ticket.objects.filter(status='WAITING', flight__isnull=False)
+    expired = Ticket.objects.filter(status='WAITING').filter(
+        (Q(flight__isnull=False) & checkin_closed)
+        | Q(flight__isnull=True, created_at__lte=now - UNLINKED_MAX_AGE)
+    )
+    urgent = waiting.exclude(checkin_closed).filter(
+        flight__departure_time__lte=now + CHECKIN_CLOSE + BOOST_WINDOW,
+        priority_key__gt=F('flight__departure_time') - URGENT_LEAD,
+    )
+
+    with transaction.atomic():
+        counter_ids = set(
+            Ticket.objects.filter(Q(pk__in=expired.values('pk')) | Q(pk__in=urgent.values('pk')))
+            .exclude(counter__isnull=True)
+            .order_by()
+            .values_list('counter_id', flat=True)
+            .distinct()
+        )
+        cancelled = expired.update(status='CANCELLED', queue_position=0)
+        departure = Subquery(Flight.objects.filter(pk=OuterRef('flight_id')).values('departure_time')[:1])
+        boosted = urgent.update(priority_key=ExpressionWrapper(
+            departure - Value(URGENT_LEAD), output_field=DateTimeField()
+        ))
+        if counter_ids:
+            recompute_counter_queues(counter_ids)
+
+    counts = {'cancelled': cancelled, 'boosted': boosted}
+    if cancelled or boosted:
+        logger.info("Balayage des tickets : %(cancelled)s annulés, %(boosted)s priorisés", counts)
+        queue_changed.send(sender=Ticket, counter_ids=counter_ids, reason='sweep', **counts)
+    return counts
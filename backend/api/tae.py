@@ -0,0 +1,97 @@
+"""
+Recalcul incrémental du Temps d'Attente Estimé (TAE) des tickets en file.
+
+Une file = les tickets actifs d'un comptoir. À chaque changement d'état
+(ticket émis, appelé, servi, sauté, comptoir ouvert ou fermé) seule la file
+du comptoir concerné est recalculée :
+
+    TAE = (personnes devant + tickets en cours au comptoir) × T_moyen
+
+et ``queue_position`` (rang 1, 2, 3... des tickets WAITING) est conservé pour
+que les écrans n'aient pas à retrier. Seules les lignes modifiées sont écrites,
+en un seul ``bulk_update``.
+"""
+import math
+
+from .models import Counter, Ticket
+
+# Temps de service par défaut des comptoirs sans compagnie (ex: Information)
+DEFAULT_SERVICE_MINUTES = 5
+# Ordre de service d'une file : clé de priorité (voir api.scheduling)
+QUEUE_ORDERING = ('priority_key', 'id')
+OPEN_STATUSES = ('LIBRE', 'OCCUPE')
+
+
+def estimate_minutes(people_ahead, service_minutes):
+    return math.ceil(people_ahead * service_minutes)
+
+
+def recompute_counter_queues(counter_ids):
+    """
+    Recalcule TAE et position de tous les tickets actifs des comptoirs donnés.
+
+    Deux lectures (comptoirs, tickets actifs) et au plus une écriture.
+
+    Returns:
+        estimates: ``{ticket_id: (tae_minutes, queue_position)}`` pour les
+        tickets recalculés (modifiés ou non)
+    """
+    counter_ids = {counter_id for counter_id in counter_ids if counter_id}
+    if not counter_ids:
+        return {}
+
+    counters = {
+        counter['id']: counter
+        for counter in Counter.objects.filter(id__in=counter_ids).values(
+            'id', 'status', 'assigned_company__average_service_time_minutes'
+        )
+    }
+    tickets = list(
+        Ticket.objects.filter(counter_id__in=counters, status__in=['WAITING', 'CALLED'])
+        .only('id', 'counter_id', 'status', 'estimated_waiting_time_minutes', 'queue_position')
+        .order_by('counter_id', *QUEUE_ORDERING)
+    )
+
+    # Tickets déjà appelés : le comptoir est occupé avant de servir la file
+    in_service = {}
+    for ticket in tickets:
+        if ticket.status == 'CALLED':
+            in_service[ticket.counter_id] = in_service.get(ticket.counter_id, 0) + 1
+
+    estimates = {}
+    changed = []
+    positions = {}
+    for ticket in tickets:
+        counter = counters[ticket.counter_id]
+        if ticket.status == 'CALLED':
+            estimate, position = 0, 0
+        else:
+            position = positions.get(ticket.counter_id, 0) + 1
+            positions[ticket.counter_id] = position
+            if counter['status'] in OPEN_STATUSES:
+                service_minutes = (
+                    counter['assigned_company__average_service_time_minutes'] or DEFAULT_SERVICE_MINUTES
+                )
+                people_ahead = position - 1 + in_service.get(ticket.counter_id, 0)
+                estimate = estimate_minutes(people_ahead, service_minutes)
+            else:
+                # Comptoir fermé : attente indéterminée, comme à l'émission
+                estimate = -1
+
+        estimates[ticket.id] = (estimate, position)
+        if (ticket.estimated_waiting_time_minutes, ticket.queue_position) != (estimate, position):
+            ticket.estimated_waiting_time_minutes = estimate
+            ticket.queue_position = position
+            changed.append(ticket)
+
+    if changed:
+        Ticket.objects.bulk_update(changed, ['estimated_waiting_time_minutes', 'queue_position'], batch_size=500)
+    return estimates
+
+
+def recompute_all_queues():
+    """Recalcule toutes les files (tâche périodique de rattrapage)."""
+    counter_ids = Ticket.objects.filter(
+        status__in=['WAITING', 'CALLED'], counter__isnull=False
+    ).order_by().values_list('counter_id', flat=True).distinct()
+    return recompute_counter_queues(list(counter_ids))
@@ -1,8 +1,78 @@
-from django.test import TestCase
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
 from .models import Company, Counter, Ticket, Service, Flight
-from .views import assign_counter_to_ticket
+from .views import assign_counter_to_ticket, TicketListView
+from .flight_import import import_flights
+from .tae import recompute_counter_queues
+from .scheduling import compute_priority_key
+from .transitions import InvalidTransition, apply_transition, call_next_ticket, serve_all_called
+from .sweeper import sweep_expired_tickets
+from .signals import queue_changed
+from . import scheduler
+from . import compression, display_feed, fastpath, flight_lookup, forecasting, idempotency, redistribution, routing, kiosk, profiling, query_budget, sites, structured_logging, throttling
+from .serializers import CounterSerializer, ServiceSerializer, TicketSerializer
+from .models import ScheduledJob, TicketEvent, Site, QueueSequence, IdempotencyKey, AgentSession, ServiceRoute
+from .flight_lookup import normalize_flight_number, flight_number_candidates, resolve_flight
 from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import resolve, reverse
 import datetime
+import gzip
+import importlib
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+import unittest
+import uuid
+from unittest import mock
+
+
+# Caches en mémoire pour tout le module, quel que soit le lanceur (manage.py test, pytest...) :
+# jamais les fichiers de CACHES, partagés entre lancements et avec le serveur de développement
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'sioa-tests-{alias}'}
+    for alias in ('default', 'versions', 'throttle')
+}
+_test_settings = override_settings(CACHES=TEST_CACHES)
+# Loggers de LOGGING (JSON sur stderr) muets pendant les tests : 4xx provoqués, balayages,
+# tâches en échec volontaire... ; assertLogs installe toujours son propre handler
+QUIET_LOGGERS = ('api', 'django.request')
+_saved_handlers = {}
+
+
+def setUpModule():
+    _test_settings.enable()
+    for name in QUIET_LOGGERS:
+        logger = logging.getLogger(name)
+        _saved_handlers[name] = logger.handlers
+        logger.handlers = [logging.NullHandler()]
+
+
+def tearDownModule():
+    for name, handlers in _saved_handlers.items():
+        logging.getLogger(name).handlers = handlers
+    _test_settings.disable()
+
+
+def clear_caches():
+    """Vide tous les caches : contenus, jetons de version et seaux de limitation de débit."""
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 class AssignCounterToTicketTestCase(TestCase):
@@ -221,3 +291,1892 @@ class AssignCounterToTicketTestCase(TestCase):
         # Vérifier que le statut est passé à OCCUPE
         self.assertEqual(self.counter_a2.status, "OCCUPE")
 
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    Tests des vues asynchrones (ASGI) montées sous /api/async/ : elles doivent
+    renvoyer les mêmes données que les vues DRF synchrones.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        Flight.objects.create(
+            flight_number="AF480",
+            company=self.company,
+            departure_time=timezone.now() + datetime.timedelta(hours=2),
+        )
+        Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="WAITING")
+
+    async def test_read_endpoints_match_sync_views(self):
+        for path in ['services/', 'counters/', f'counters/{self.counter.id}/tickets/', 'flights/af480/']:
+            async_response = await self.async_client.get(f'/api/async/{path}')
+            sync_response = await self.async_client.get(f'/api/{path}')
+            self.assertEqual(async_response.status_code, 200, path)
+            self.assertEqual(async_response.json(), sync_response.json(), path)
+
+    async def test_statistics(self):
+        response = await self.async_client.get('/api/async/tickets/statistics/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_waiting_tickets'], 1)
+        self.assertEqual(data['waiting_tickets_by_company'][0]['count'], 1)
+        self.assertEqual(data['debug_tickets_info'][0]['counter'], "A1")
+
+    async def test_generate_ticket(self):
+        response = await self.async_client.post(
+            '/api/async/tickets/generate-queue-ticket/',
+            {'ticket_number': 'af480', 'service_id': self.service.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['queue_number'], "A002")
+        self.assertEqual(response.json()['assigned_counter'], "A1")
+        self.assertEqual(await Ticket.objects.acount(), 2)
+
+    async def test_generate_ticket_unknown_flight(self):
+        response = await self.async_client.post(
+            '/api/async/tickets/generate-queue-ticket/',
+            {'ticket_number': 'AF999', 'service_id': self.service.id},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class FlightImportTestCase(TestCase):
+    """
+    Tests de l'import en masse du programme des vols (upsert par paquets).
+    """
+
+    def setUp(self):
+        self.af = Company.objects.create(name="Air France", code="AF")
+        self.et = Company.objects.create(name="Ethiopian Airlines", code="ET")
+        Flight.objects.create(
+            flight_number="AF480", company=self.af,
+            departure_time=datetime.datetime(2026, 3, 1, 10, 0, tzinfo=datetime.timezone.utc),
+        )
+        Flight.objects.create(
+            flight_number="ET901", company=self.et,
+            departure_time=datetime.datetime(2026, 3, 1, 12, 0, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_csv_upsert_counts(self):
+        csv_content = (
+            "flight_number,departure_time,status,gate\n"
+            "AF480,2026-03-01T10:00:00Z,ON_TIME,\n"        # inchangé
+            "ET901,2026-03-01T12:00:00Z,DELAYED,G4\n"      # mis à jour
+            "af481,2026-03-01T15:00:00+00:00,,\n"          # créé
+            "ZZ100,2026-03-01T15:00:00Z,ON_TIME,\n"        # compagnie inconnue
+            "AF482,pas-une-date,ON_TIME,\n"                # date invalide
+        )
+        report = import_flights(io.StringIO(csv_content), fmt='csv', chunk_size=2)
+
+        self.assertEqual(
+            (report['inserted'], report['updated'], report['unchanged'], report['rejected']),
+            (1, 1, 1, 2),
+        )
+        self.assertEqual([e['line'] for e in report['errors']], [4, 5])
+        et901 = Flight.objects.get(flight_number="ET901")
+        self.assertEqual((et901.status, et901.gate), ("DELAYED", "G4"))
+        self.assertTrue(Flight.objects.filter(flight_number="AF481", company=self.af).exists())
+        self.assertEqual(Flight.objects.count(), 3)
+
+    def test_json_lines(self):
+        content = (
+            '{"flight_number": "AF480", "departure_time": "2026-03-01T10:00:00Z", "status": "BOARDING"}\n'
+            '{"flight_number": "AF480", "departure_time": "2026-03-02T10:00:00Z"}\n'
+        )
+        report = import_flights(io.StringIO(content), fmt='json')
+        self.assertEqual((report['inserted'], report['updated']), (1, 1))
+        self.assertEqual(Flight.objects.filter(flight_number="AF480").count(), 2)
+
+    def test_import_endpoint(self):
+        upload = SimpleUploadedFile(
+            "schedule.csv",
+            b"flight_number,departure_time\nAF700,2026-03-01T18:00:00Z\n",
+            content_type="text/csv",
+        )
+        # Anonyme : refusé avant toute lecture du fichier
+        self.assertEqual(self.client.post('/api/flights/import/', {'file': upload}).status_code, 403)
+        self.assertFalse(Flight.objects.filter(flight_number="AF700").exists())
+
+        upload.seek(0)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "secret"))
+        response = self.client.post('/api/flights/import/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 1)
+
+    def test_import_endpoint_type_override(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "secret"))
+        # Extension trompeuse : le type est forcé par ?type=
+        upload = SimpleUploadedFile(
+            "schedule.txt",
+            b'{"flight_number": "AF701", "departure_time": "2026-03-01T19:00:00Z"}\n',
+            content_type="text/plain",
+        )
+        response = self.client.post('/api/flights/import/?type=json', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['inserted'], 1)
+
+        upload = SimpleUploadedFile("schedule.json", b"flight_number,departure_time\n", content_type="text/csv")
+        response = self.client.post('/api/flights/import/?type=xml', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_json_line_is_rejected_not_fatal(self):
+        content = (
+            '{"flight_number": "AF700", "departure_time": "2026-03-01T18:00:00Z"}\n'
+            '{"flight_number": "AF701", \n'
+            '{"flight_number": "AF702", "departure_time": "2026-03-01T20:00:00Z"}\n'
+        )
+        report = import_flights(io.StringIO(content), fmt='json', chunk_size=1)
+        self.assertEqual((report['inserted'], report['rejected']), (2, 1))
+        self.assertEqual(report['errors'][0]['line'], 2)
+        self.assertIn("JSON invalide", report['errors'][0]['error'])
+
+        with self.assertRaises(ValueError):
+            import_flights(io.StringIO('[{"flight_number": "AF703",'), fmt='json')
+        self.assertFalse(Flight.objects.filter(flight_number="AF703").exists())
+
+
+class SeedDataTestCase(TestCase):
+    """
+    Tests de la commande seed_data (bulk_create idempotent + historique synthétique).
+    """
+
+    def test_seed_is_idempotent(self):
+        call_command('seed_data', stdout=io.StringIO())
+        counts = (Company.objects.count(), Counter.objects.count(), Flight.objects.count(), Ticket.objects.count())
+        call_command('seed_data', stdout=io.StringIO())
+        self.assertEqual(
+            (Company.objects.count(), Counter.objects.count(), Flight.objects.count(), Ticket.objects.count()),
+            counts,
+        )
+        self.assertEqual(counts[1], 24)
+        self.assertFalse(Ticket.objects.filter(queue_number='').exists())
+
+    def test_synthetic_history(self):
+        call_command('seed_data', '--tickets', '500', '--days', '3', '--seed', '7', stdout=io.StringIO())
+        history = Ticket.objects.exclude(ticket_number__in=['AF1001', 'AF1002', 'ET2001'])
+        self.assertEqual(history.count(), 500)
+        self.assertFalse(history.filter(created_at__gt=timezone.now()).exists())
+        self.assertTrue(history.filter(status='DONE').exists())
+        # Numérotation unique par service et par jour, comme Ticket.save()
+        numbers = list(history.values_list('service_id', 'created_at__date', 'queue_number'))
+        self.assertEqual(len(numbers), len(set(numbers)))
+
+
+class FlightLookupTestCase(TestCase):
+    """
+    Tests de la résolution des vols : normalisation, choix du départ du jour
+    ou du prochain, et routage de la borne quand un numéro existe sur plusieurs jours.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.now = timezone.now()
+        self.yesterday = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=self.now - datetime.timedelta(days=1),
+        )
+        self.tomorrow = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=self.now + datetime.timedelta(days=1),
+        )
+
+    def test_normalization(self):
+        self.assertEqual(normalize_flight_number(" af 0480 "), "AF480")
+        self.assertEqual(normalize_flight_number("2j-012"), "2J12")
+        self.assertEqual(normalize_flight_number("ET901A"), "ET901A")
+        self.assertEqual(flight_number_candidates("KL2030 / af0480"), ["KL2030", "AF480"])
+        self.assertEqual(self.yesterday.normalized_number, "AF480")
+
+    def test_prefers_todays_departure_then_next(self):
+        self.assertEqual(resolve_flight("af 480", now=self.now), self.tomorrow)
+
+        today = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=self.now + datetime.timedelta(minutes=30),
+        )
+        # Le signal post_save invalide l'index des vols du jour
+        self.assertEqual(resolve_flight("AF0480", now=self.now), today)
+        self.assertEqual(resolve_flight("KL2030/AF480", now=self.now), today)
+        self.assertIsNone(resolve_flight("AF999", now=self.now))
+
+    def test_kiosk_and_detail_with_several_days(self):
+        response = self.client.post(
+            '/api/tickets/generate-queue-ticket/',
+            {'ticket_number': 'af 0480', 'service_id': self.service.id},
+        )
+        self.assertEqual(response.status_code, 201)
+        ticket = Ticket.objects.get()
+        self.assertEqual((ticket.flight, ticket.ticket_number), (self.tomorrow, "AF480"))
+
+        response = self.client.get('/api/flights/af480/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.tomorrow.id)
+
+    def test_unknown_company_message(self):
+        response = self.client.post(
+            '/api/tickets/generate-queue-ticket/',
+            {'ticket_number': 'ZZ100', 'service_id': self.service.id},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Code compagnie", response.json()['error'])
+
+    def test_index_invalidated_by_another_process(self):
+        today = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=self.now + datetime.timedelta(minutes=30),
+        )
+        self.assertEqual(resolve_flight("AF480", now=self.now).status, "ON_TIME")
+        # Écriture faite ailleurs (import en ligne de commande) : seul le jeton partagé change
+        Flight.objects.filter(pk=today.pk).update(status="DELAYED")
+        self.assertEqual(resolve_flight("AF480", now=self.now).status, "ON_TIME")
+        caches['versions'].set(flight_lookup.SCHEDULE_VERSION_KEY, "autre-processus", None)
+        self.assertEqual(resolve_flight("AF480", now=self.now).status, "DELAYED")
+
+    def test_backfill_migration(self):
+        migration = importlib.import_module('api.migrations.0015_backfill_ticket_flight')
+        today = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=self.now + datetime.timedelta(minutes=30),
+        )
+        linked = Ticket.objects.create(ticket_number="af 0480", service=self.service)
+        unknown = Ticket.objects.create(ticket_number="AF999", service=self.service)
+        self.assertIsNone(linked.flight)
+        migration.backfill_ticket_flight(django_apps, None)
+        linked.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual(linked.flight, today)
+        self.assertIsNone(unknown.flight)
+
+
+class TAERecomputationTestCase(TestCase):
+    """
+    Tests du recalcul incrémental du TAE et des positions dans la file d'un comptoir.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=4)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.other = Counter.objects.create(name="A2", assigned_company=self.company, status="LIBRE")
+        self.tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="WAITING")
+            for _ in range(3)
+        ]
+        self.untouched = Ticket.objects.create(
+            ticket_number="AF480", service=self.service, counter=self.other, status="WAITING",
+            estimated_waiting_time_minutes=99,
+        )
+        recompute_counter_queues([self.counter.id])
+
+    def state(self):
+        return [
+            (t.estimated_waiting_time_minutes, t.queue_position)
+            for t in Ticket.objects.filter(counter=self.counter).order_by('created_at', 'id')
+        ]
+
+    def test_positions_and_estimates(self):
+        self.assertEqual(self.state(), [(0, 1), (4, 2), (8, 3)])
+        # Seule la file concernée est recalculée
+        self.untouched.refresh_from_db()
+        self.assertEqual(self.untouched.estimated_waiting_time_minutes, 99)
+
+    def test_call_and_serve_update_queue(self):
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/call/')
+        self.assertEqual(self.state(), [(0, 0), (4, 1), (8, 2)])
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/serve/')
+        self.assertEqual(self.state()[1:], [(0, 1), (4, 2)])
+
+    def test_single_bulk_update(self):
+        Ticket.objects.filter(pk=self.tickets[0].pk).update(status='DONE')
+        with self.assertNumQueries(3):
+            recompute_counter_queues([self.counter.id])
+        with self.assertNumQueries(2):
+            recompute_counter_queues([self.counter.id])  # rien n'a changé : aucune écriture
+
+    def test_counter_closing_and_reopening(self):
+        # Sans autre comptoir ouvert pour la compagnie, la file reste au comptoir fermé
+        Counter.objects.filter(pk=self.other.pk).update(status="FERME")
+        self.counter.status = "FERME"
+        self.counter.save()
+        self.assertEqual(self.state(), [(-1, 1), (-1, 2), (-1, 3)])
+        counter = Counter.objects.get(pk=self.counter.pk)
+        counter.status = "LIBRE"
+        counter.save()
+        self.assertEqual(self.state(), [(0, 1), (4, 2), (8, 3)])
+
+    def test_issuance_returns_queue_estimate(self):
+        Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=timezone.now() + datetime.timedelta(hours=2),
+        )
+        response = self.client.post(
+            '/api/tickets/generate-queue-ticket/',
+            {'ticket_number': 'AF480', 'service_id': self.service.id},
+        )
+        self.assertEqual(response.status_code, 201)
+        # A2 a la file la plus courte (1 ticket) : 1 personne devant × 4 min
+        self.assertEqual(response.json()['assigned_counter'], "A2")
+        self.assertEqual(response.json()['estimated_waiting_time_minutes'], 4)
+
+
+class PrioritySchedulingTestCase(TestCase):
+    """
+    Tests de l'ordonnancement prioritaire : classe de service, départ imminent et ancienneté.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.standard = Service.objects.create(name="Enregistrement", prefix="C")
+        self.vip = Service.objects.create(name="Service VIP", prefix="V", priority_class="VIP")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.now = timezone.now()
+        self.late_flight = Flight.objects.create(
+            flight_number="AF100", company=self.company, departure_time=self.now + datetime.timedelta(minutes=20),
+        )
+        self.later_flight = Flight.objects.create(
+            flight_number="AF200", company=self.company, departure_time=self.now + datetime.timedelta(hours=4),
+        )
+
+    def make_ticket(self, service, flight, minutes_ago):
+        created_at = self.now - datetime.timedelta(minutes=minutes_ago)
+        return Ticket.objects.create(
+            ticket_number=flight.flight_number, service=service, flight=flight, counter=self.counter,
+            priority_key=compute_priority_key(created_at, service, flight.departure_time),
+        )
+
+    def test_priority_key(self):
+        key = compute_priority_key(self.now, self.vip)
+        self.assertEqual(key, self.now - datetime.timedelta(minutes=15))
+        # Départ dans 20 min : la clé est celle d'un passager arrivé il y a 40 min
+        key = compute_priority_key(self.now, self.standard, self.late_flight.departure_time)
+        self.assertEqual(key, self.now - datetime.timedelta(minutes=40))
+
+    def test_call_next_order(self):
+        old_standard = self.make_ticket(self.standard, self.later_flight, minutes_ago=60)
+        new_standard = self.make_ticket(self.standard, self.later_flight, minutes_ago=5)
+        vip = self.make_ticket(self.vip, self.later_flight, minutes_ago=10)
+        late = self.make_ticket(self.standard, self.late_flight, minutes_ago=1)
+
+        called = [call_next_ticket(self.counter) for _ in range(4)]
+        # L'ancienneté protège le ticket arrivé il y a 60 min (pas de famine)
+        self.assertEqual(called, [old_standard, late, vip, new_standard])
+        self.assertIsNone(call_next_ticket(self.counter))
+        self.counter.refresh_from_db()
+        self.assertEqual(self.counter.status, "OCCUPE")
+
+    def test_call_next_endpoint_and_tae_order(self):
+        standard = self.make_ticket(self.standard, self.later_flight, minutes_ago=5)
+        late = self.make_ticket(self.standard, self.late_flight, minutes_ago=1)
+        recompute_counter_queues([self.counter.id])
+        late.refresh_from_db()
+        standard.refresh_from_db()
+        self.assertEqual((late.queue_position, standard.queue_position), (1, 2))
+
+        response = self.client.post(f'/api/counters/{self.counter.id}/call-next/')
+        self.assertEqual(response.json()['ticket_id'], late.id)
+        standard.refresh_from_db()
+        self.assertEqual((standard.queue_position, standard.estimated_waiting_time_minutes), (1, 3))
+
+    def test_save_sets_priority_key(self):
+        ticket = Ticket.objects.create(ticket_number="AF100", service=self.vip, flight=self.late_flight)
+        self.assertEqual(ticket.priority_key, self.late_flight.departure_time - datetime.timedelta(minutes=60))
+
+
+class SweeperTestCase(TestCase):
+    """
+    Tests du balayage des tickets dont le vol est parti, annulé ou clos.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Enregistrement", prefix="C")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        now = timezone.now()
+
+        def ticket_for(flight_number, departure, flight_status="ON_TIME", ticket_status="WAITING"):
+            flight = Flight.objects.create(
+                flight_number=flight_number, company=self.company, departure_time=departure, status=flight_status,
+            )
+            return Ticket.objects.create(
+                ticket_number=flight_number, service=self.service, flight=flight,
+                counter=self.counter, status=ticket_status,
+            )
+
+        self.departed = ticket_for("AF1", now - datetime.timedelta(hours=1))
+        self.closed = ticket_for("AF2", now + datetime.timedelta(minutes=30))
+        self.cancelled_flight = ticket_for("AF3", now + datetime.timedelta(hours=5), flight_status="CANCELLED")
+        self.closing_soon = ticket_for("AF4", now + datetime.timedelta(minutes=60))
+        self.on_time = ticket_for("AF5", now + datetime.timedelta(hours=5))
+        self.called = ticket_for("AF6", now - datetime.timedelta(hours=1), ticket_status="CALLED")
+        # Sans vol : annulé seulement après SIOA_UNLINKED_TICKET_MAX_AGE_MINUTES
+        self.stale = Ticket.objects.create(ticket_number="INFO", service=self.service, counter=self.counter)
+        Ticket.objects.filter(pk=self.stale.pk).update(created_at=now - datetime.timedelta(hours=5))
+        self.recent = Ticket.objects.create(ticket_number="INFO2", service=self.service, counter=self.counter)
+
+    def test_sweep(self):
+        published = []
+        handler = lambda sender, **kwargs: published.append(kwargs)
+        queue_changed.connect(handler)
+        self.addCleanup(queue_changed.disconnect, handler)
+
+        # Savepoint + lecture des comptoirs + 2 UPDATE + recalcul (2 lectures, 1 écriture) + release
+        with self.assertNumQueries(8):
+            counts = sweep_expired_tickets()
+
+        self.assertEqual(counts, {'cancelled': 4, 'boosted': 1})
+        statuses = dict(Ticket.objects.values_list('ticket_number', 'status'))
+        self.assertEqual(statuses, {
+            "AF1": "CANCELLED", "AF2": "CANCELLED", "AF3": "CANCELLED",
+            "AF4": "WAITING", "AF5": "WAITING", "AF6": "CALLED",
+            "INFO": "CANCELLED", "INFO2": "WAITING",
+        })
+        self.closing_soon.refresh_from_db()
+        self.on_time.refresh_from_db()
+        self.assertEqual(
+            self.closing_soon.priority_key,
+            self.closing_soon.flight.departure_time - datetime.timedelta(days=1),
+        )
+        self.assertEqual((self.closing_soon.queue_position, self.on_time.queue_position), (1, 2))
+        self.assertEqual(published[0]['cancelled'], 4)
+        self.assertEqual(published[0]['counter_ids'], {self.counter.id})
+
+        # Idempotent : un second passage ne change rien
+        self.assertEqual(sweep_expired_tickets(), {'cancelled': 0, 'boosted': 0})
+
+
+class SchedulerTestCase(TestCase):
+    """
+    Tests du planificateur : verrou par ligne, échéances, suivi des exécutions.
+    """
+
+    def setUp(self):
+        self.calls = []
+        registry = scheduler._registry.copy()
+        self.addCleanup(lambda: (scheduler._registry.clear(), scheduler._registry.update(registry)))
+        scheduler._registry.clear()
+
+        @scheduler.job('ok', interval_seconds=60)
+        def ok():
+            self.calls.append('ok')
+
+        @scheduler.job('boom', interval_seconds=60)
+        def boom():
+            raise RuntimeError("boom")
+
+        scheduler.sync_jobs()
+
+    def test_lock_prevents_overlap(self):
+        self.assertTrue(scheduler.acquire('ok', 'worker-1'))
+        self.assertFalse(scheduler.acquire('ok', 'worker-2', force=True))
+        # Verrou expiré (processus mort) : un autre worker peut reprendre la tâche
+        later = timezone.now() + datetime.timedelta(minutes=5)
+        self.assertTrue(scheduler.acquire('ok', 'worker-2', now=later))
+
+    def test_run_pending_records_results(self):
+        self.assertEqual(scheduler.run_pending('worker-1'), {'ok': True, 'boom': False})
+        # Pas encore dues : rien n'est relancé
+        self.assertEqual(scheduler.run_pending('worker-1'), {})
+        self.assertEqual(self.calls, ['ok'])
+
+        ok = ScheduledJob.objects.get(name='ok')
+        boom = ScheduledJob.objects.get(name='boom')
+        self.assertIsNone(ok.locked_until)
+        self.assertIsNotNone(ok.last_success_at)
+        self.assertEqual((ok.run_count, ok.failure_count), (1, 0))
+        self.assertEqual((boom.run_count, boom.failure_count), (1, 1))
+        self.assertIn("RuntimeError", boom.last_error)
+
+    def test_health_endpoint(self):
+        scheduler.run_pending('worker-1')
+        self.assertEqual(self.client.get('/api/scheduler/jobs/').status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "secret"))
+        response = self.client.get('/api/scheduler/jobs/')
+        self.assertEqual(response.status_code, 200)
+        health = {job['name']: job['healthy'] for job in response.json()}
+        self.assertEqual(health, {'boom': False, 'ok': True})
+
+
+class FastPathTestCase(TestCase):
+    """
+    Tests du chemin rapide des endpoints de polling (api/fastpath.py) : même
+    JSON que les serializers DRF, nombre de requêtes indépendant du volume.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A", description="Enregistrement")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        Counter.objects.create(name="I1", status="FERME")
+        for _ in range(3):
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="WAITING")
+        Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="CALLED")
+        Ticket.objects.create(ticket_number="AF123", service=self.service, status="DONE", estimated_waiting_time_minutes=9)
+
+    def test_same_json_as_serializers(self):
+        response = self.client.get('/api/services/')
+        self.assertEqual(response.json(), self.as_json(ServiceSerializer(Service.objects.all(), many=True).data))
+
+        response = self.client.get('/api/counters/')
+        self.assertEqual(response.json(), self.as_json(CounterSerializer(Counter.objects.all(), many=True).data))
+
+        response = self.client.get(f'/api/counters/{self.counter.id}/tickets/')
+        tickets = Ticket.objects.filter(counter=self.counter, status__in=['WAITING', 'CALLED']).order_by('priority_key', 'id')
+        self.assertEqual(response.json(), self.as_json(TicketSerializer(tickets, many=True).data))
+
+    def test_constant_query_count(self):
+        def counts():
+            result = {}
+            for path in ['counters/', f'counters/{self.counter.id}/tickets/', 'tickets/statistics/']:
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(f'/api/{path}').status_code, 200)
+                result[path] = len(ctx.captured_queries)
+            return result
+
+        before = counts()
+        for _ in range(20):
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="WAITING")
+        self.assertEqual(counts(), before)
+        # 6 requêtes agrégées ; le site de la requête est lu dans l'index en mémoire
+        self.assertEqual(before['tickets/statistics/'], 6)
+
+    def test_statistics(self):
+        data = fastpath.ticket_statistics(self.service.site_id)
+        self.assertEqual(data['total_waiting_tickets'], 4)
+        self.assertEqual(data['average_wait_time_minutes'], 9)
+        self.assertEqual(data['waiting_tickets_by_company'], [
+            {'counter__assigned_company__name': "Air France", 'counter__assigned_company__code': "AF", 'count': 4},
+        ])
+        self.assertEqual(data['waiting_tickets_by_service'], [{'service__name': "Check-in", 'count': 4}])
+
+    @staticmethod
+    def as_json(data):
+        return json.loads(JSONRenderer().render(data))
+
+
+class PayloadTrimmingTestCase(TestCase):
+    """
+    Tests de ?fields= et ?compact= sur les endpoints de polling (api/fastpath.py),
+    vues DRF et vues asynchrones.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        Counter.objects.create(name="I1", status="FERME")
+        for _ in range(3):
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, status="WAITING")
+
+    def test_fields(self):
+        response = self.client.get('/api/counters/?fields=status,name')
+        self.assertEqual(response.json(), [{'name': "A1", 'status': "LIBRE"}, {'name': "I1", 'status': "FERME"}])
+
+        response = self.client.get(f'/api/counters/{self.counter.id}/tickets/?fields=queue_number')
+        self.assertEqual(response.json(), [{'queue_number': "A001"}, {'queue_number': "A002"}, {'queue_number': "A003"}])
+
+    def test_unknown_field(self):
+        response = self.client.get('/api/services/?fields=name,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()['fields'][0])
+
+    def test_compact_counters(self):
+        data = self.client.get('/api/counters/?compact=1').json()
+        self.assertEqual(data['fields'], [
+            'id', 'name', 'status', 'assigned_company.id', 'assigned_company.name', 'assigned_company.code',
+        ])
+        self.assertEqual(data['rows'], [
+            [self.counter.id, "A1", "LIBRE", self.company.id, "Air France", "AF"],
+            [self.counter.id + 1, "I1", "FERME", None, None, None],
+        ])
+
+    def test_compact_empty_list_keeps_columns(self):
+        response = self.client.get('/api/counters/0/tickets/?compact=1&fields=id,status')
+        self.assertEqual(response.json(), {'fields': ['id', 'status'], 'rows': []})
+
+    def test_statistics_sections(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/tickets/statistics/?fields=total_waiting_tickets')
+        self.assertEqual(response.json(), {'total_waiting_tickets': 3})
+        # Le COUNT seul : les autres sections ne sont pas calculées
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_compact_statistics(self):
+        data = self.client.get('/api/tickets/statistics/?compact=1').json()
+        self.assertNotIn('debug_tickets_info', data)
+        self.assertEqual(data['waiting_tickets_by_service'], {'fields': ['service__name', 'count'], 'rows': [["Check-in", 3]]})
+
+        data = self.client.get('/api/tickets/statistics/?compact=1&fields=debug_tickets_info').json()
+        self.assertEqual(list(data), ['debug_tickets_info'])
+        self.assertEqual(len(data['debug_tickets_info']['rows']), 3)
+
+    async def test_async_views_match(self):
+        for path in [
+            'counters/?compact=1', 'services/?fields=id,prefix', f'counters/{self.counter.id}/tickets/?fields=id',
+            'tickets/statistics/?compact=1', 'tickets/statistics/?fields=waiting_tickets_by_company',
+            'counters/?fields=unknown',
+        ]:
+            async_response = await self.async_client.get(f'/api/async/{path}')
+            sync_response = await self.async_client.get(f'/api/{path}')
+            self.assertEqual(async_response.status_code, sync_response.status_code, path)
+            self.assertEqual(async_response.json(), sync_response.json(), path)
+
+
+@override_settings(SIOA_COMPRESSION_MIN_BYTES=200)
+class CompressionTestCase(TestCase):
+    """Tests de la compression des réponses (api/compression.py)."""
+
+    def setUp(self):
+        service = Service.objects.create(name="Check-in", prefix="A")
+        for _ in range(20):
+            Ticket.objects.create(ticket_number="AF480", service=service, status="WAITING")
+
+    def test_gzip_above_threshold(self):
+        response = self.client.get('/api/tickets/statistics/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['total_waiting_tickets'], 20)
+
+    def test_small_or_unaccepted_responses_untouched(self):
+        response = self.client.get('/api/tickets/statistics/?fields=total_waiting_tickets', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        for header in ['', 'identity', 'gzip;q=0']:
+            response = self.client.get('/api/tickets/statistics/', HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+            self.assertEqual(response.json()['total_waiting_tickets'], 20)
+
+    def test_html_never_compressed(self):
+        # API navigable : jeton CSRF dans la page (BREACH)
+        response = self.client.get('/api/tickets/statistics/', HTTP_ACCEPT='text/html', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertGreater(len(response.content), compression.min_bytes())
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_choose_encoding(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(compression.choose_encoding('br, gzip'), 'gzip')
+            self.assertIsNone(compression.choose_encoding('br'))
+        with mock.patch.object(compression, 'brotli', object()):
+            self.assertEqual(compression.choose_encoding('gzip, br'), 'br')
+            self.assertEqual(compression.choose_encoding('br;q=0.5, gzip'), 'gzip')
+            self.assertEqual(compression.choose_encoding('*'), 'br')
+        self.assertIsNone(compression.choose_encoding(None))
+
+    async def test_async_views(self):
+        response = await self.async_client.get('/api/async/tickets/statistics/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['total_waiting_tickets'], 20)
+
+
+class TicketHistoryTestCase(TestCase):
+    """
+    Tests de l'historique des tickets (GET tickets/) : pagination par curseur,
+    filtres, et utilisation d'un index pour chaque filtre.
+    """
+
+    def setUp(self):
+        self.af = Company.objects.create(name="Air France", code="AF")
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.af, status="LIBRE")
+        for i in range(7):
+            Ticket.objects.create(
+                ticket_number="AF480" if i % 2 else "ET900", service=self.service,
+                counter=self.counter, status="DONE" if i < 3 else "WAITING",
+            )
+        # Tous les tickets sont créés dans la même seconde : l'id départage
+        Ticket.objects.update(created_at=timezone.now())
+
+    def test_cursor_pages_cover_history_once(self):
+        seen = []
+        url = '/api/tickets/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [ticket['id'] for ticket in data['results']]
+            url = data['next']
+        self.assertEqual(seen, list(Ticket.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_cursor_is_a_keyset_on_created_at_and_id(self):
+        first = self.client.get('/api/tickets/?page_size=3').json()
+        self.assertIsNone(first['previous'])
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(first['next']).json()
+        # Position (created_at, id) dans la requête, sans OFFSET
+        sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('"api_ticket"."id" <', sql)
+
+        # Retour arrière : même page que la première
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([t['id'] for t in previous['results']], [t['id'] for t in first['results']])
+        self.assertIsNone(previous['previous'])
+        self.assertEqual(self.client.get(previous['next']).json()['results'], second['results'])
+
+        self.assertEqual(self.client.get('/api/tickets/?cursor=pas-un-curseur').status_code, 404)
+
+    def test_filters(self):
+        def ids(query):
+            response = self.client.get(f'/api/tickets/?{query}')
+            self.assertEqual(response.status_code, 200, query)
+            return {ticket['id'] for ticket in response.json()['results']}
+
+        self.assertEqual(ids('status=waiting'), set(Ticket.objects.filter(status='WAITING').values_list('id', flat=True)))
+        self.assertEqual(ids('company=af'), set(Ticket.objects.filter(ticket_number='AF480').values_list('id', flat=True)))
+        self.assertEqual(ids('status=DONE,WAITING&company=ET&counter=%d' % self.counter.id), set(
+            Ticket.objects.filter(ticket_number='ET900').values_list('id', flat=True)
+        ))
+        today = timezone.localdate()
+        self.assertEqual(len(ids(f'date_from={today}&date_to={today}')), 7)
+        self.assertEqual(ids(f'date_to={today - datetime.timedelta(days=1)}'), set())
+        self.assertEqual(self.client.get('/api/tickets/?status=PERDU').status_code, 400)
+
+    def test_every_filter_uses_an_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan d'exécution propre à SQLite")
+        today = timezone.localdate()
+        queries = [
+            '', 'status=WAITING', f'service={self.service.id}', f'counter={self.counter.id}', 'flight=1',
+            'company=AF', f'date_from={today}', f'status=WAITING&company=AF&date_from={today}',
+            f'service={self.service.id}&status=WAITING', f'counter={self.counter.id}&status=WAITING',
+        ]
+        request_factory = APIRequestFactory()
+        for query in queries:
+            view = TicketListView()
+            view.request = view.initialize_request(request_factory.get(f'/api/tickets/?{query}'))
+            plan = view.get_queryset().order_by('-created_at', '-id').explain()
+            self.assertNotRegex(plan, r'SCAN api_ticket(?! USING)', query)
+
+    def test_detail_returns_latest_ticket(self):
+        latest = Ticket.objects.filter(ticket_number='AF480').order_by('-id').first()
+        response = self.client.get('/api/tickets/af480/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], latest.id)
+        first = Ticket.objects.filter(ticket_number='AF480').order_by('id').first()
+        response = self.client.get(f'/api/tickets/AF480/?queue_number={first.queue_number}')
+        self.assertEqual(response.json()['id'], first.id)
+        self.assertEqual(self.client.get('/api/tickets/XX000/').status_code, 404)
+
+
+class CounterWriteCoalescingTestCase(TestCase):
+    """
+    Tests du nombre d'écritures par action agent : le comptoir n'est réécrit
+    que si son statut change, et le ticket seulement sur les colonnes modifiées.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter)
+            for _ in range(3)
+        ]
+        recompute_counter_queues([self.counter.id])
+
+    def writes(self, ticket, action):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'/api/tickets/{ticket.id}/{action}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))
+        ]
+
+    def test_writes_per_action(self):
+        first, second, third = self.tickets
+        # Appel : ticket + événement + comptoir LIBRE -> OCCUPE + session de l'agent + positions de la file
+        writes = self.writes(first, 'call')
+        self.assertEqual(len(writes), 5)
+        self.assertIn('"called_at"', writes[0])
+        self.assertNotIn('"ticket_number"', writes[0])
+
+        # Second appel, comptoir déjà OCCUPE : pas d'écriture du comptoir
+        self.assertFalse(any('api_counter' in sql for sql in self.writes(second, 'call')))
+
+        # Service : ticket + événement + comptoir OCCUPE -> LIBRE + session + TAE de la file restante
+        self.assertEqual(len(self.writes(first, 'serve')), 5)
+        self.counter.refresh_from_db()
+        self.assertEqual(self.counter.status, "LIBRE")
+
+        # Service suivant, comptoir déjà LIBRE : ticket + événement + session + file, pas le comptoir
+        writes = self.writes(second, 'serve')
+        self.assertEqual(len(writes), 4)
+        self.assertFalse(any('api_counter' in sql for sql in writes))
+        third.refresh_from_db()
+        self.assertEqual(third.queue_position, 1)
+
+    def test_closed_counter_is_not_reopened(self):
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/call/')
+        Counter.objects.filter(pk=self.counter.pk).update(status="FERME")
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/serve/')
+        self.counter.refresh_from_db()
+        self.assertEqual(self.counter.status, "FERME")
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class AgentSessionTestCase(TestCase):
+    """Tests des sessions d'agent et de leurs compteurs (api/agent_sessions.py)."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter)
+            for _ in range(3)
+        ]
+        recompute_counter_queues([self.counter.id])
+
+    def login(self, agent="agent1"):
+        response = self.client.post(f'/api/counters/{self.counter.id}/session/', {'agent': agent}, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return AgentSession.objects.get(pk=response.json()['session_id'])
+
+    def test_counters_updated_per_transition(self):
+        session = self.login()
+        first, second, third = self.tickets
+        start = session.started_at
+        with mock.patch('api.transitions.timezone.now', return_value=start + datetime.timedelta(seconds=30)):
+            apply_transition(first.id, 'call')
+        with mock.patch('api.transitions.timezone.now', return_value=start + datetime.timedelta(seconds=150)):
+            apply_transition(first.id, 'serve')
+        with mock.patch('api.transitions.timezone.now', return_value=start + datetime.timedelta(seconds=160)):
+            apply_transition(second.id, 'call')
+        with mock.patch('api.transitions.timezone.now', return_value=start + datetime.timedelta(seconds=170)):
+            apply_transition(second.id, 'skip')
+
+        session.refresh_from_db()
+        self.assertEqual((session.tickets_called, session.tickets_served, session.tickets_skipped), (2, 1, 1))
+        self.assertEqual(session.handle_time, datetime.timedelta(seconds=120))
+        # Connexion -> 1er appel (30 s) + service -> 2e appel (10 s)
+        self.assertEqual(session.idle_time, datetime.timedelta(seconds=40))
+        self.assertEqual(session.average_handle_time, datetime.timedelta(seconds=120))
+
+    def test_serve_all_adds_handle_time_of_each_ticket(self):
+        session = self.login()
+        for ticket in self.tickets[:2]:
+            apply_transition(ticket.id, 'call')
+        Ticket.objects.filter(pk__in=[t.id for t in self.tickets[:2]]).update(
+            called_at=timezone.now() - datetime.timedelta(minutes=2),
+        )
+        serve_all_called(self.counter)
+        session.refresh_from_db()
+        self.assertEqual(session.tickets_served, 2)
+        self.assertGreaterEqual(session.handle_time, datetime.timedelta(minutes=4))
+
+    def test_no_session_no_error(self):
+        apply_transition(self.tickets[0].id, 'call')
+        self.assertFalse(AgentSession.objects.exists())
+
+    def test_login_closes_previous_session_and_logout(self):
+        first = self.login("agent1")
+        second = self.login("agent2")
+        first.refresh_from_db()
+        self.assertIsNotNone(first.ended_at)
+        self.assertIsNone(second.ended_at)
+
+        url = f'/api/counters/{self.counter.id}/session/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(self.client.post(url, {}, content_type='application/json').status_code, 400)
+
+    def test_supervisor_reads_session_counters(self):
+        self.login()
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/call/')
+        self.client.post(f'/api/tickets/{self.tickets[0].id}/serve/')
+
+        # Site lu dans l'index en mémoire : une requête pour les sessions, quel que soit le nombre de tickets
+        with self.assertNumQueries(1):
+            rows = self.client.get('/api/sessions/').json()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['agent'], "agent1")
+        self.assertEqual(rows[0]['counter_name'], "A1")
+        self.assertEqual(rows[0]['tickets_served'], 1)
+        self.assertIsNotNone(rows[0]['average_handle_seconds'])
+
+        self.client.delete(f'/api/counters/{self.counter.id}/session/')
+        self.assertEqual(self.client.get('/api/sessions/').json(), [])
+        self.assertEqual(len(self.client.get('/api/sessions/?active=0').json()), 1)
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class CounterClosureTestCase(TestCase):
+    """Tests de la fermeture d'un comptoir et de la redistribution de sa file (api/redistribution.py)."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.other = Company.objects.create(name="Brussels Airlines", code="SN")
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.closing = Counter.objects.create(name="A1", assigned_company=self.company, status="OCCUPE")
+        self.a2 = Counter.objects.create(name="A2", assigned_company=self.company, status="LIBRE")
+        self.a3 = Counter.objects.create(name="A3", assigned_company=self.company, status="LIBRE")
+        Counter.objects.create(name="A4", assigned_company=self.company, status="FERME")
+        Counter.objects.create(name="B1", assigned_company=self.other, status="LIBRE")
+        # A2 a déjà deux tickets en file
+        for _ in range(2):
+            Ticket.objects.create(ticket_number="AF100", service=self.service, counter=self.a2)
+        self.called = Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.closing, status="CALLED")
+        self.waiting = [
+            Ticket.objects.create(ticket_number=f"AF{480 + i}", service=self.service, counter=self.closing)
+            for i in range(6)
+        ]
+        recompute_counter_queues([self.closing.id, self.a2.id])
+
+    def test_close_balances_load_and_keeps_order(self):
+        events = []
+        handler = lambda sender, **kwargs: events.append(kwargs)
+        queue_changed.connect(handler)
+        try:
+            moved = redistribution.close_counter(self.closing)
+        finally:
+            queue_changed.disconnect(handler)
+
+        self.assertEqual(moved, {self.a3.id: 4, self.a2.id: 2})
+        self.assertEqual(Counter.objects.get(pk=self.closing.pk).status, "FERME")
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['reason'], 'counter-closed')
+        self.assertEqual(events[0]['moved'], 6)
+
+        # Le ticket en cours de service reste au comptoir fermé
+        self.called.refresh_from_db()
+        self.assertEqual(self.called.counter_id, self.closing.id)
+        # A3 (vide) reçoit les premiers tickets ; chaque file garde l'ordre d'origine
+        a3 = list(Ticket.objects.filter(counter=self.a3).order_by('queue_position').values_list('id', flat=True))
+        self.assertEqual(a3, sorted(a3))
+        self.assertEqual(a3[:2], [self.waiting[0].id, self.waiting[1].id])
+        self.assertEqual(Ticket.objects.get(pk=a3[0]).estimated_waiting_time_minutes, 0)
+        self.assertEqual(Ticket.objects.filter(counter=self.a2, status='WAITING').count(), 4)
+
+    def test_query_count_independent_of_queue_length(self):
+        with CaptureQueriesContext(connection) as ctx:
+            redistribution.close_counter(self.closing)
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        # Statut du comptoir, bulk_update des comptoirs, bulk_update du TAE
+        self.assertEqual(len(writes), 3)
+
+    def test_no_open_counter_keeps_queue(self):
+        Counter.objects.filter(pk__in=[self.a2.pk, self.a3.pk]).update(status="FERME")
+        self.assertEqual(redistribution.close_counter(self.closing), {})
+        self.assertEqual(Ticket.objects.filter(counter=self.closing, status='WAITING').count(), 6)
+        self.waiting[0].refresh_from_db()
+        self.assertEqual(self.waiting[0].estimated_waiting_time_minutes, -1)
+
+    def test_pool_counter_falls_back_to_route_pool(self):
+        # Comptoirs du pool Information : sans compagnie
+        information = Service.objects.create(name="Information", prefix="I")
+        b8 = Counter.objects.create(name="B8", status="OCCUPE")
+        b9 = Counter.objects.create(name="B9", status="LIBRE")
+        ServiceRoute.objects.create(service=information).counters.set([b8, b9])
+        self.addCleanup(routing.invalidate_routing_index)
+        for _ in range(3):
+            Ticket.objects.create(ticket_number="INFO", service=information, counter=b8)
+
+        self.assertEqual(redistribution.close_counter(b8), {b9.id: 3})
+        self.assertFalse(Ticket.objects.filter(counter=b8, status='WAITING').exists())
+
+    def test_save_as_ferme_redistributes(self):
+        counter = Counter.objects.get(pk=self.closing.pk)
+        counter.status = "FERME"
+        counter.save()
+        self.assertFalse(Ticket.objects.filter(counter=self.closing, status='WAITING').exists())
+
+    def test_api(self):
+        response = self.client.post(f'/api/counters/{self.closing.id}/close/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['moved'], 6)
+        self.assertEqual(self.client.post('/api/counters/999999/close/').status_code, 404)
+
+
+class TicketTransitionTestCase(TestCase):
+    """
+    Tests de la machine à états (api/transitions.py) : UPDATE conditionnels,
+    horodatage, historique et service groupé.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        self.tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter)
+            for _ in range(3)
+        ]
+
+    def test_concurrent_call_has_single_winner(self):
+        ticket = self.tickets[0]
+        apply_transition(ticket.id, 'call', actor="agent-1")
+        # Le second agent a lu le ticket WAITING avant l'appel du premier
+        with self.assertRaises(InvalidTransition):
+            apply_transition(ticket.id, 'call', actor="agent-2")
+        response = self.client.post(f'/api/tickets/{ticket.id}/call/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], "Ticket is not in WAITING status")
+        self.assertEqual(
+            list(TicketEvent.objects.filter(ticket=ticket).values_list('to_status', 'actor')),
+            [('CALLED', "agent-1")],
+        )
+
+    def test_timestamps_and_events(self):
+        ticket = self.tickets[0]
+        apply_transition(ticket.id, 'call')
+        served = apply_transition(ticket.id, 'serve')
+        self.assertIsNotNone(served.called_at)
+        self.assertGreaterEqual(served.served_at, served.called_at)
+        self.assertEqual(
+            list(served.events.values_list('from_status', 'to_status', 'counter')),
+            [('WAITING', 'CALLED', self.counter.id), ('CALLED', 'DONE', self.counter.id)],
+        )
+        self.assertEqual(self.client.post('/api/tickets/999999/call/').status_code, 404)
+
+    def test_serve_all_called(self):
+        for ticket in self.tickets[:2]:
+            apply_transition(ticket.id, 'call')
+        response = self.client.post(f'/api/counters/{self.counter.id}/serve-all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()['ticket_ids']), [t.id for t in self.tickets[:2]])
+        self.assertEqual(Ticket.objects.filter(status='DONE', served_at__isnull=False).count(), 2)
+        self.assertEqual(TicketEvent.objects.filter(to_status='DONE').count(), 2)
+        self.counter.refresh_from_db()
+        self.assertEqual(self.counter.status, "LIBRE")
+        self.tickets[2].refresh_from_db()
+        self.assertEqual((self.tickets[2].queue_position, self.tickets[2].estimated_waiting_time_minutes), (1, 0))
+
+
+class DisplayFeedTestCase(TestCase):
+    """
+    Tests des flux d'affichage précalculés (api/display_feed.py) : contenu,
+    service sans requête SQL, reconstruction après un changement d'état.
+    """
+
+    def setUp(self):
+        clear_caches()
+        display_feed._local_feeds.clear()
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company, status="LIBRE")
+        Counter.objects.create(name="B8", status="LIBRE")
+        self.flight = Flight.objects.create(
+            flight_number="AF480", company=self.company, status="DELAYED", gate="G4",
+            departure_time=timezone.now() + datetime.timedelta(hours=2),
+        )
+        self.tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, counter=self.counter, flight=self.flight)
+            for _ in range(5)
+        ]
+        recompute_counter_queues([self.counter.id])
+        apply_transition(self.tickets[0].id, 'call')
+
+    def test_feed_content(self):
+        response = self.client.get('/api/display/zone-a/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([board['name'] for board in data['counters']], ["A1"])
+        board = data['counters'][0]
+        self.assertEqual(board['status'], "OCCUPE")
+        self.assertEqual([t['queue_number'] for t in board['now_serving']], [self.tickets[0].queue_number])
+        self.assertEqual([t['queue_position'] for t in board['next']], [1, 2, 3])
+        self.assertEqual(board['waiting_count'], 4)
+        self.assertEqual(data['flights'][0]['status'], "DELAYED")
+        self.assertEqual(self.client.get('/api/display/information/').json()['counters'][0]['name'], "B8")
+        self.assertEqual(self.client.get('/api/display/zone-z/').status_code, 404)
+
+    def test_served_from_cache_until_state_changes(self):
+        first = self.client.get('/api/display/zone-a/').content
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/display/zone-a/').content, first)
+
+        # La transition publie queue_changed : le flux est marqué périmé après commit,
+        # sans rendu sur le chemin d'écriture (liste des comptoirs déjà en mémoire)
+        display_feed.counter_feeds()
+        with self.captureOnCommitCallbacks() as callbacks:
+            apply_transition(self.tickets[0].id, 'serve')
+        with self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+        # Reconstruit à la lecture suivante (comptoirs, tickets), puis servi du cache
+        with self.assertNumQueries(2):
+            board = self.client.get('/api/display/zone-a/').json()['counters'][0]
+        self.assertEqual(board['now_serving'], [])
+        self.assertEqual(board['waiting_count'], 4)
+        with self.assertNumQueries(0):
+            self.client.get('/api/display/zone-a/')
+
+        # Le flux d'un autre profil n'est pas touché
+        self.client.get('/api/display/information/')
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition(self.tickets[1].id, 'call')
+        with self.assertNumQueries(0):
+            self.client.get('/api/display/information/')
+
+    def test_shared_between_processes(self):
+        first = self.client.get('/api/display/zone-a/').content
+        # Autre processus : pas de copie locale, flux lu dans le cache partagé
+        display_feed._local_feeds.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/display/zone-a/').content, first)
+
+        # Vol modifié : tous les flux sont périmés
+        with self.captureOnCommitCallbacks(execute=True):
+            Flight.objects.filter(pk=self.flight.pk).update(status="BOARDING")
+            self.flight.refresh_from_db()
+            self.flight.save()
+        self.assertEqual(self.client.get('/api/display/zone-a/').json()['flights'][0]['status'], "BOARDING")
+
+    async def test_async_feed(self):
+        response = await self.async_client.get('/api/async/display/zone-a/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['counters'][0]['waiting_count'], 4)
+
+
+class SiteTenancyTestCase(TestCase):
+    """
+    Tests multi-terminal : chaque site a ses comptoirs, services, tickets,
+    numérotation et flux d'affichage ; les requêtes d'un site ne lisent que ses lignes.
+    """
+
+    def setUp(self):
+        clear_caches()
+        display_feed._local_feeds.clear()
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=timezone.now() + datetime.timedelta(hours=2),
+        )
+        self.main = Site.objects.get(code="MAIN")
+        self.t2 = Site.objects.create(code="T2", name="Terminal 2")
+        # T2 disparaît au rollback : l'index des sites doit être relu
+        self.addCleanup(sites.invalidate_site_index)
+        self.services = {}
+        self.counters = {}
+        for site in (self.main, self.t2):
+            self.services[site.code] = Service.objects.create(site=site, name="Check-in", prefix="A")
+            self.counters[site.code] = Counter.objects.create(site=site, name="A1", assigned_company=self.company)
+
+    def generate(self, site_code, service):
+        return self.client.post(
+            '/api/tickets/generate-queue-ticket/', {'ticket_number': 'AF480', 'service_id': service.id},
+            HTTP_X_SIOA_SITE=site_code,
+        )
+
+    def test_queues_are_isolated(self):
+        self.assertEqual(self.generate("MAIN", self.services["MAIN"]).json()['queue_number'], "A001")
+        response = self.generate("T2", self.services["T2"])
+        self.assertEqual(response.status_code, 201)
+        # Numérotation et comptoir propres au site
+        self.assertEqual(response.json()['queue_number'], "A001")
+        self.assertEqual(Ticket.objects.get(site=self.t2).counter, self.counters["T2"])
+        # Un service d'un autre site n'est pas proposé
+        self.assertEqual(self.generate("T2", self.services["MAIN"]).status_code, 400)
+
+        stats = self.client.get('/api/tickets/statistics/?site=T2').json()
+        self.assertEqual(stats['total_waiting_tickets'], 1)
+        services = self.client.get('/api/services/', HTTP_X_SIOA_SITE="T2").json()
+        self.assertEqual([service['id'] for service in services], [self.services["T2"].id])
+        self.assertEqual(self.client.get('/api/counters/?site=T9').status_code, 404)
+
+    def test_display_feeds_are_per_site(self):
+        self.generate("T2", self.services["T2"])
+        main = self.client.get('/api/display/zone-a/').json()
+        t2 = self.client.get('/api/display/zone-a/?site=T2').json()
+        self.assertEqual((main['site'], t2['site']), ("MAIN", "T2"))
+        self.assertEqual(main['counters'][0]['waiting_count'], 0)
+        self.assertEqual(t2['counters'][0]['waiting_count'], 1)
+
+    def test_site_queries_use_site_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan d'exécution propre à SQLite")
+        for queryset in (
+            fastpath.active_tickets(self.t2.id),
+            fastpath.done_tickets(self.t2.id),
+            fastpath.debug_tickets_queryset(self.t2.id),
+        ):
+            self.assertRegex(queryset.explain(), r'USING (COVERING )?INDEX ticket_site_')
+
+    def test_site_index(self):
+        sites.get_site("T2")
+        with self.assertNumQueries(0):
+            self.assertEqual(sites.get_site("T2"), self.t2)
+        self.t2.is_active = False
+        self.t2.save()
+        with self.assertRaises(Site.DoesNotExist):
+            sites.get_site("T2")
+        self.assertEqual(self.client.get('/api/counters/?site=T2').status_code, 404)
+
+    def test_default_site_read_from_index(self):
+        main = sites.get_site(sites.default_site_code())
+        # Défaut des FK ``site`` : pas de requête par objet instancié
+        with self.assertNumQueries(0):
+            services = [Service(name=f"S{i}", prefix="S") for i in range(3)]
+        self.assertEqual({service.site_id for service in services}, {main.pk})
+
+    def test_queue_sequence(self):
+        today = timezone.localdate()
+        self.assertEqual([QueueSequence.next_value(self.t2.id, "B", today) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(QueueSequence.next_value(self.main.id, "B", today), 1)
+
+
+class KioskSyncTestCase(TestCase):
+    """Tests des baux de numéros et de la synchronisation des bornes hors ligne."""
+
+    def setUp(self):
+        clear_caches()
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        self.flight = Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=timezone.now() + datetime.timedelta(hours=3),
+        )
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.counter = Counter.objects.create(name="A1", assigned_company=self.company)
+
+    def lease(self, kiosk_id="K1", size=10):
+        return self.client.post(
+            f'/api/kiosks/{kiosk_id}/leases/', {'service_id': self.service.id, 'size': size}, content_type='application/json',
+        )
+
+    def sync(self, tickets, kiosk_id="K1"):
+        return self.client.post(f'/api/kiosks/{kiosk_id}/sync/', {'tickets': tickets}, content_type='application/json')
+
+    def offline_ticket(self, queue_number, minutes_ago, ticket_number="AF480"):
+        return {
+            'client_uuid': str(uuid.uuid4()),
+            'service_id': self.service.id,
+            'ticket_number': ticket_number,
+            'queue_number': queue_number,
+            'issued_at': (timezone.now() - datetime.timedelta(minutes=minutes_ago)).isoformat(),
+        }
+
+    def test_lease_reserves_block_on_sequence(self):
+        response = self.lease(size=10)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['start'], response.json()['end'], response.json()['prefix']), (1, 10, "A"))
+        self.assertEqual((self.lease(kiosk_id="K2", size=5).json()['start']), 11)
+        # Les tickets émis en ligne continuent après les blocs prêtés
+        online = self.client.post(
+            '/api/tickets/generate-queue-ticket/', {'ticket_number': 'AF480', 'service_id': self.service.id},
+        )
+        self.assertEqual(online.json()['queue_number'], "A016")
+        self.assertEqual(self.lease(size=0).status_code, 400)
+
+    def test_sync_is_idempotent_and_keeps_issue_order(self):
+        self.lease()
+        late = self.offline_ticket("A002", minutes_ago=5)
+        early = self.offline_ticket("A001", minutes_ago=20)
+        response = self.sync([late, early])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created'])
+        self.assertEqual([result['assigned_counter'] for result in results], ["A1", "A1"])
+
+        first = Ticket.objects.get(client_uuid=early['client_uuid'])
+        second = Ticket.objects.get(client_uuid=late['client_uuid'])
+        self.assertEqual((first.queue_number, first.queue_position), ("A001", 1))
+        self.assertEqual(second.queue_position, 2)
+        self.assertEqual(first.created_at.isoformat(), datetime.datetime.fromisoformat(early['issued_at']).isoformat())
+        self.assertEqual(first.flight, self.flight)
+
+        # Relance du même lot : aucun doublon
+        again = self.sync([early, late]).json()['results']
+        self.assertEqual([result['status'] for result in again], ['duplicate', 'duplicate'])
+        self.assertEqual(again[0]['queue_number'], "A001")
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_sync_rejects_numbers_outside_leases(self):
+        self.lease(kiosk_id="K2", size=5)
+        results = self.sync([
+            self.offline_ticket("A001", minutes_ago=1),
+            self.offline_ticket("A999", minutes_ago=1),
+            self.offline_ticket("A003", minutes_ago=1, ticket_number="ZZ100"),
+        ], kiosk_id="K2").json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'rejected', 'rejected'])
+        self.assertIn("hors des baux", results[1]['error'])
+        # Bail d'une autre borne
+        self.assertEqual(self.sync([self.offline_ticket("A002", minutes_ago=1)]).json()['results'][0]['status'], 'rejected')
+        self.assertEqual(self.sync([]).status_code, 400)
+
+    def test_sync_rejects_reused_numbers(self):
+        self.lease()
+        # Même numéro sous deux client_uuid, dans le lot puis dans un lot suivant
+        results = self.sync([
+            self.offline_ticket("A005", minutes_ago=3), self.offline_ticket("A005", minutes_ago=2),
+        ]).json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'rejected'])
+        self.assertIn("déjà attribué", results[1]['error'])
+        self.assertEqual(self.sync([self.offline_ticket("a005", minutes_ago=1)]).json()['results'][0]['status'], 'rejected')
+        self.assertEqual(Ticket.objects.filter(queue_number="A005").count(), 1)
+
+
+class IdempotencyTestCase(TestCase):
+    """Tests de l'en-tête Idempotency-Key sur l'émission de tickets."""
+
+    def setUp(self):
+        clear_caches()
+        self.company = Company.objects.create(name="Air France", code="AF", average_service_time_minutes=3)
+        Flight.objects.create(
+            flight_number="AF480", company=self.company,
+            departure_time=timezone.now() + datetime.timedelta(hours=3),
+        )
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        Counter.objects.create(name="A1", assigned_company=self.company)
+
+    def generate(self, key, ticket_number='AF480', prefix='/api'):
+        return self.client.post(
+            f'{prefix}/tickets/generate-queue-ticket/', {'ticket_number': ticket_number, 'service_id': self.service.id},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_original_response(self):
+        first = self.generate('retry-1')
+        self.assertEqual(first.status_code, 201)
+        # Relance : aucune écriture, même réponse (y compris via la vue asynchrone)
+        with CaptureQueriesContext(connection) as ctx:
+            retry = self.generate('retry-1')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(self.generate('retry-1', prefix='/api/async').json(), first.json())
+        self.assertEqual(Ticket.objects.count(), 1)
+
+        self.assertEqual(self.generate('retry-2').json()['queue_number'], "A002")
+        self.assertEqual(self.generate('').json()['queue_number'], "A003")
+
+    def test_key_reused_for_other_request(self):
+        self.generate('reuse')
+        self.assertEqual(self.generate('reuse', ticket_number='AF999').status_code, 422)
+
+    def test_request_in_progress(self):
+        now = timezone.now()
+        scope = "MAIN:generate-queue-ticket"
+        fingerprint = idempotency.fingerprint({'ticket_number': 'AF480', 'service_id': self.service.id})
+        IdempotencyKey.objects.create(scope=scope, key='busy', fingerprint=fingerprint, started_at=now, expires_at=now + idempotency.TTL)
+        # Réponse immédiate, sans attente de la première requête
+        started = time.monotonic()
+        response = self.generate('busy')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, str(idempotency.RETRY_AFTER)))
+        self.assertLess(time.monotonic() - started, 1)
+        response = self.generate('busy', prefix='/api/async')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, str(idempotency.RETRY_AFTER)))
+        # Requête abandonnée (worker tué) : la relance reprend la clé
+        IdempotencyKey.objects.filter(key='busy').update(started_at=now - idempotency.ABANDON_AFTER)
+        self.assertEqual(self.generate('busy').status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key='busy').status_code, 201)
+
+    def test_failed_request_releases_key(self):
+        self.assertEqual(self.generate('fail', ticket_number='ZZ100').status_code, 400)
+        # Erreur de validation : réponse conservée, pas de ticket
+        self.assertEqual(self.generate('fail', ticket_number='ZZ100').status_code, 400)
+        with mock.patch('api.views.emettre_ticket', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.generate('crash')
+        self.assertFalse(IdempotencyKey.objects.filter(key='crash').exists())
+        self.assertEqual(idempotency.purge_expired(timezone.now() + idempotency.TTL), 1)
+
+
+@override_settings(SIOA_RATE_LIMITS={
+    'issuance': {'rate': 1, 'burst': 2, 'global_rate': 1, 'global_burst': 3},
+    'dashboard': {'rate': 1, 'burst': 2},
+    'agent': {'rate': 1, 'burst': 5},
+}, SIOA_TRUSTED_KIOSKS=['kiosk-1', 'kiosk-2'])
+class RateLimitTestCase(TestCase):
+    """Tests de la limitation de débit par client et classe de requêtes."""
+
+    def setUp(self):
+        clear_caches()
+        self.service = Service.objects.create(name="Information", prefix="I")
+        self.counter = Counter.objects.create(name="B8")
+        ServiceRoute.objects.create(service=self.service).counters.set([self.counter])
+        # Les routes disparaissent au rollback du test, sans signal : l'index en mémoire non plus
+        self.addCleanup(routing.invalidate_routing_index)
+
+    def generate(self, client):
+        return self.client.post(
+            '/api/tickets/generate-queue-ticket/', {'ticket_number': 'INFO', 'service_id': self.service.id},
+            content_type='application/json', HTTP_X_SIOA_CLIENT=client,
+        )
+
+    def test_token_bucket(self):
+        self.assertEqual([throttling.take_token('t', rate=2, burst=2, now=100.0) for _ in range(3)], [0, 0, 0.5])
+        # Un jeton rendu toutes les 0,5 s
+        self.assertEqual(throttling.take_token('t', rate=2, burst=2, now=100.5), 0)
+        self.assertEqual(throttling.take_token('t', rate=2, burst=2, now=100.5), 0.5)
+
+    def test_shed_before_database_work(self):
+        self.assertEqual([self.generate('kiosk-1').status_code for _ in range(2)], [201, 201])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.generate('kiosk-1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        # Autre borne : seau propre, puis seau global (3 émissions) épuisé
+        self.assertEqual(self.generate('kiosk-2').status_code, 201)
+        self.assertEqual(self.generate('kiosk-2').status_code, 429)
+        self.assertEqual(Ticket.objects.count(), 3)
+
+    def test_agent_actions_not_shed_by_dashboard_load(self):
+        statuses = [self.client.get('/api/counters/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(self.client.get('/api/async/counters/').status_code, 429)
+        response = self.client.post(f'/api/counters/{self.counter.id}/call-next/')
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_unknown_client_header_falls_back_to_ip(self):
+        # Changer de valeur d'en-tête ne donne pas un nouveau seau
+        statuses = [self.generate(f'rotating-{i}').status_code for i in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+
+    def test_agent_buckets_per_counter(self):
+        other = Counter.objects.create(name="B9")
+        statuses = [self.client.post(f'/api/counters/{self.counter.id}/serve-all/').status_code for _ in range(6)]
+        self.assertEqual(statuses[-1], 429)
+        # Même adresse IP, autre comptoir : seau distinct
+        self.assertNotEqual(self.client.post(f'/api/counters/{other.id}/serve-all/').status_code, 429)
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class QueryBudgetTestCase(TestCase):
+    """
+    Budgets de requêtes et de latence de chaque endpoint de api/urls.py (voir
+    api/query_budget.py), mesurés sur des historiques de taille croissante.
+    Tailles : SIOA_QUERY_BUDGET_SIZES (ex. ``10,1000,100000`` ; défaut ``10,1000``).
+    La latence dépend de la machine : elle n'est vérifiée qu'avec
+    SIOA_QUERY_BUDGET_TIMING=1 (mesures sur une machine de référence).
+    """
+
+    def setUp(self):
+        clear_caches()
+        display_feed._local_feeds.clear()
+        # Le seed crée des routes de service
+        self.addCleanup(routing.invalidate_routing_index)
+        self.addCleanup(profiling.clear_profiles)
+
+    def requests(self):
+        """(nom d'URL, méthode, chemin, données, statut attendu) de chaque endpoint, sur les données du seed."""
+        counter = Counter.objects.get(name="A1")
+        service = Service.objects.get(prefix="C")
+        # Hors de A1 : call-next et serve-all modifient sa file
+        waiting = Ticket.objects.create(
+            ticket_number="AF480", service=service, counter=Counter.objects.get(name="A2"), status="WAITING",
+        )
+        lease = kiosk.grant_lease(service.site, "K1", service, size=1)
+        sync = {'tickets': [{
+            'client_uuid': str(uuid.uuid4()), 'service_id': service.id, 'ticket_number': 'AF480',
+            'queue_number': f"C{lease.start:03d}", 'issued_at': timezone.now().isoformat(),
+        }]}
+        upload = SimpleUploadedFile("schedule.csv", b"flight_number,departure_time\nAF700,2026-03-01T18:00:00Z\n")
+        # Profil existant pour profile-detail (profilage inactif dans les réglages)
+        with override_settings(SIOA_PROFILING_ENABLED=True, SIOA_PROFILING_SECRET='budget'):
+            profiled = profiling.ProfilingMiddleware(lambda request: HttpResponse())(
+                APIRequestFactory().get('/', HTTP_X_SIOA_PROFILE='budget'),
+            )
+        profile_id = profiled['X-Sioa-Profile-Id']
+        return [
+            ('service-list', 'get', '/api/services/', None, 200),
+            ('counter-list', 'get', '/api/counters/', None, 200),
+            ('counter-tickets-list', 'get', f'/api/counters/{counter.id}/tickets/', None, 200),
+            ('counter-call-next', 'post', f'/api/counters/{counter.id}/call-next/', None, 200),
+            ('counter-serve-all', 'post', f'/api/counters/{counter.id}/serve-all/', None, 200),
+            ('counter-close', 'post', f'/api/counters/{counter.id}/close/', None, 200),
+            ('counter-session', 'post', f'/api/counters/{counter.id}/session/', {'agent': 'agent1'}, 201),
+            ('agent-sessions', 'get', '/api/sessions/', None, 200),
+            ('arrival-forecast', 'get', '/api/forecast/arrivals/', None, 200),
+            ('ticket-list', 'get', '/api/tickets/?status=WAITING', None, 200),
+            ('ticket-create', 'post', '/api/tickets/create/', {'service': service.id}, 201),
+            ('generate-queue-ticket', 'post', '/api/tickets/generate-queue-ticket/', {'ticket_number': 'AF480', 'service_id': service.id}, 201),
+            ('ticket-statistics', 'get', '/api/tickets/statistics/', None, 200),
+            ('ticket-action', 'post', f'/api/tickets/{waiting.id}/call/', None, 200),
+            ('ticket-detail', 'get', '/api/tickets/AF480/', None, 200),
+            ('kiosk-leases', 'post', '/api/kiosks/K1/leases/', {'service_id': service.id, 'size': 10}, 201),
+            ('kiosk-sync', 'post', '/api/kiosks/K1/sync/', sync, 200),
+            ('flight-import', 'post', '/api/flights/import/', {'file': upload}, 200),
+            ('flight-detail', 'get', '/api/flights/AF480/', None, 200),
+            ('display-profiles', 'get', '/api/display/', None, 200),
+            ('display-feed', 'get', '/api/display/zone-a/', None, 200),
+            ('scheduler-jobs', 'get', '/api/scheduler/jobs/', None, 200),
+            ('profile-list', 'get', '/api/profiling/', None, 200),
+            ('profile-detail', 'get', f'/api/profiling/{profile_id}/', None, 200),
+        ]
+
+    def measure(self, method, path, data, admin=False):
+        """(réponse, requêtes, lectures, ms) de l'appel ; ``admin`` : session d'un superutilisateur."""
+        self.client.logout()
+        if admin:
+            self.client.force_login(User.objects.get_or_create(
+                username='budget-admin', defaults={'is_staff': True, 'is_superuser': True},
+            )[0])
+        if method == 'get':
+            # Mesure en régime établi (caches d'index de vols, flux d'affichage...)
+            self.client.get(path)
+            call = lambda: self.client.get(path)
+        elif data is not None and 'file' in data:
+            call = lambda: self.client.post(path, data)
+        else:
+            call = lambda: self.client.post(path, data or {}, content_type='application/json')
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = call()
+            elapsed = (time.perf_counter() - started) * 1000
+        reads = sum(1 for query in ctx.captured_queries if query['sql'].startswith('SELECT'))
+        return response, len(ctx.captured_queries), reads, elapsed
+
+    def test_every_endpoint_has_a_budget(self):
+        from . import urls
+        missing = [
+            pattern.name for pattern in urls.urlpatterns
+            if query_budget.view_budget(resolve(reverse(pattern.name, kwargs=self.sample_kwargs(pattern))).func) is None
+        ]
+        self.assertEqual(missing, [])
+        self.assertEqual(
+            {pattern.name for pattern in urls.urlpatterns},
+            {name for name, *_ in self.requests_for_names()},
+        )
+
+    def test_query_counts_are_constant_and_within_budget(self):
+        sizes = [int(size) for size in os.environ.get('SIOA_QUERY_BUDGET_SIZES', '10,1000').split(',')]
+        check_timing = os.environ.get('SIOA_QUERY_BUDGET_TIMING') == '1'
+        reads_by_size = {}
+        for size in sizes:
+            # Même état de départ à chaque taille : seed, mesures, puis annulation
+            with transaction.atomic():
+                call_command('seed_data', '--tickets', str(size), '--days', '2', '--seed', '1', stdout=io.StringIO())
+                clear_caches()
+                display_feed._local_feeds.clear()
+                for name, method, path, data, expected in self.requests():
+                    view = resolve(path.split('?')[0]).func
+                    budget = query_budget.view_budget(view)
+                    admin = IsAdminUser in getattr(getattr(view, 'view_class', None), 'permission_classes', [])
+                    response, queries, reads, elapsed = self.measure(method, path, data, admin)
+                    # Budgets mesurés sur le chemin nominal, pas sur un refus (400, 403...)
+                    self.assertEqual(response.status_code, expected, f"{name} ({size} tickets)")
+                    self.assertLessEqual(queries, budget['queries'], f"{name} ({size} tickets)")
+                    if check_timing:
+                        self.assertLessEqual(elapsed, budget['ms'], f"{name} ({size} tickets)")
+                    reads_by_size.setdefault(name, set()).add(reads)
+                transaction.set_rollback(True)
+        # Lectures identiques à chaque taille (pas de N+1) ; les écritures conditionnelles
+        # (TAE ou statut de comptoir inchangés) peuvent varier d'une unité selon les données
+        self.assertEqual({name: values for name, values in reads_by_size.items() if len(values) > 1}, {})
+
+    def requests_for_names(self):
+        call_command('seed_data', '--tickets', '10', stdout=io.StringIO())
+        return self.requests()
+
+    @staticmethod
+    def sample_kwargs(pattern):
+        return {name: (1 if converter.regex == '[0-9]+' else 'x') for name, converter in pattern.pattern.converters.items()}
+
+
+@override_settings(SIOA_PROFILING_ENABLED=True, SIOA_RATE_LIMITS={})
+class ProfilingTestCase(TestCase):
+    """Tests du profilage à la demande (api/profiling.py)."""
+
+    def setUp(self):
+        profiling.clear_profiles()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        Service.objects.create(name="Check-in", prefix="A")
+
+    def test_profile_on_header(self):
+        self.assertNotIn('X-Sioa-Profile-Id', self.client.get('/api/tickets/statistics/'))
+        # En-tête seul : réservé au staff
+        self.assertNotIn('X-Sioa-Profile-Id', self.client.get('/api/tickets/statistics/', HTTP_X_SIOA_PROFILE='1'))
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/tickets/statistics/', HTTP_X_SIOA_PROFILE='1')
+        profile_id = int(response['X-Sioa-Profile-Id'])
+
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/profiling/').status_code, 403)
+        self.client.force_login(self.admin)
+        listed = self.client.get('/api/profiling/').json()
+        self.assertEqual([profile['id'] for profile in listed], [profile_id])
+        self.assertNotIn('sql', listed[0])
+
+        profile = self.client.get(f'/api/profiling/{profile_id}/').json()
+        self.assertEqual((profile['path'], profile['status']), ('/api/tickets/statistics/', 200))
+        self.assertEqual(profile['sql_count'], 6)
+        self.assertTrue(all(query['start_ms'] >= 0 for query in profile['sql']))
+        folded = self.client.get(f'/api/profiling/{profile_id}/?output=folded')
+        self.assertEqual(folded['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(self.client.get('/api/profiling/999/').status_code, 404)
+
+    def test_sampler_collects_folded_stacks(self):
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        sampler.stop()
+        self.assertTrue(sampler.counts)
+        stack, count = sampler.folded()[0].rsplit(' ', 1)
+        self.assertIn('ProfilingTestCase.test_sampler_collects_folded_stacks', stack)
+        self.assertGreater(int(count), 0)
+
+    @override_settings(SIOA_PROFILING_SECRET='s3cret')
+    def test_profile_on_shared_secret(self):
+        self.assertNotIn('X-Sioa-Profile-Id', self.client.get('/api/services/', HTTP_X_SIOA_PROFILE='wrong'))
+        response = self.client.get('/api/tickets/statistics/', HTTP_X_SIOA_PROFILE='s3cret')
+        self.assertEqual(profiling.get_profile(int(response['X-Sioa-Profile-Id']))['sql_count'], 6)
+
+    @override_settings(SIOA_PROFILING_SECRET='s3cret')
+    async def test_profile_under_asgi(self):
+        # Vue synchrone et vue asynchrone : le SQL est relevé dans le thread qui exécute la vue
+        for path, sql_count in (('/api/tickets/statistics/', 6), ('/api/async/services/', 1)):
+            response = await self.async_client.get(path, headers={'X-Sioa-Profile': 's3cret'})
+            self.assertEqual(response.status_code, 200)
+            profile = profiling.get_profile(int(response['X-Sioa-Profile-Id']))
+            self.assertEqual(profile['sql_count'], sql_count, path)
+
+    @override_settings(SIOA_PROFILING_ENABLED=False)
+    def test_disabled_middleware_is_removed(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+        self.assertNotIn('X-Sioa-Profile-Id', self.client.get('/api/services/', HTTP_X_SIOA_PROFILE='1'))
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class StructuredLoggingTestCase(TestCase):
+    """Tests des logs JSON (api/structured_logging.py)."""
+
+    def setUp(self):
+        self.service = Service.objects.create(name="Information", prefix="I")
+        ServiceRoute.objects.create(service=self.service).counters.set([Counter.objects.create(name="B8")])
+        self.addCleanup(routing.invalidate_routing_index)
+
+    def test_queue_handler_writes_json_off_thread(self):
+        stream = io.StringIO()
+        handler = structured_logging.QueueListenerHandler(stream)
+        handler.addFilter(structured_logging.RequestIdFilter())
+        logger = logging.getLogger('api.tests.structured')
+        logger.addHandler(handler)
+        token = structured_logging.request_id.set('req-1')
+        try:
+            logger.warning("Comptoir %s fermé", "A1", extra={'event': 'counter.closed', 'counter_id': 3})
+        finally:
+            structured_logging.request_id.reset(token)
+            logger.removeHandler(handler)
+            handler.stop()
+        # Second arrêt (atexit) sans effet
+        handler.stop()
+        line = json.loads(stream.getvalue())
+        self.assertEqual(line['message'], "Comptoir A1 fermé")
+        self.assertEqual((line['event'], line['counter_id'], line['request_id']), ('counter.closed', 3, 'req-1'))
+
+    @override_settings(SIOA_LOG_SAMPLE_RATES={'ticket.issued': 1.0})
+    def test_issuance_event_timings(self):
+        with self.assertLogs('api.views', level='INFO') as logs:
+            response = self.client.post(
+                '/api/tickets/generate-queue-ticket/', {'ticket_number': 'INFO', 'service_id': self.service.id},
+                content_type='application/json', HTTP_X_REQUEST_ID='kiosk-42',
+            )
+        self.assertEqual(response['X-Request-Id'], 'kiosk-42')
+        record = logs.records[0]
+        self.assertEqual((record.event, record.queue_number, record.assigned_counter), ('ticket.issued', 'I001', 'B8'))
+        for field in ('create_ms', 'tae_ms', 'routing_ms', 'db_ms', 'total_ms'):
+            self.assertGreaterEqual(getattr(record, field), 0, field)
+        self.assertGreater(record.db_queries, 0)
+
+    @override_settings(SIOA_LOG_SAMPLE_RATES={'ticket.issued': 0.0}, SIOA_LOG_SLOW_MS=100000)
+    def test_unsampled_events_are_dropped_unless_slow(self):
+        logger = logging.getLogger('api.views')
+        with self.assertNoLogs('api.views', level='INFO'):
+            structured_logging.Event(logger, 'ticket.issued').emit()
+        with override_settings(SIOA_LOG_SLOW_MS=0), self.assertLogs('api.views', level='INFO') as logs:
+            structured_logging.Event(logger, 'ticket.issued').emit()
+        self.assertTrue(logs.records[0].slow)
+        self.assertFalse(hasattr(logs.records[0], 'db_ms'))
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class ArrivalForecastTestCase(TestCase):
+    """Tests de la prévision des arrivées (api/forecasting.py)."""
+
+    def setUp(self):
+        clear_caches()
+        self.service = Service.objects.create(name="Check-in", prefix="A")
+        self.site = self.service.site
+        self.company = Company.objects.create(name="Air France", code="AF", average_daily_passengers=100)
+        Counter.objects.create(name="A1", assigned_company=self.company)
+        self.day = timezone.localdate() + datetime.timedelta(days=1)
+        self.start, _ = forecasting.day_bounds(self.day)
+
+    def flight(self, number, hour, company=None, day=None):
+        start = self.start if day is None else forecasting.day_bounds(day)[0]
+        return Flight.objects.create(
+            flight_number=number, company=company or self.company,
+            departure_time=start + datetime.timedelta(hours=hour),
+        )
+
+    def test_convolve_shifts_departures_by_profile(self):
+        departures = [0] * (forecasting.BINS_PER_DAY + forecasting.LEAD_BINS)
+        departures[48] = 2
+        profile = [0.0] * forecasting.LEAD_BINS
+        profile[8], profile[4] = 0.75, 0.25
+        with mock.patch.object(forecasting, 'numpy', None):
+            [row] = forecasting.convolve([departures], [profile])
+        self.assertEqual(len(row), forecasting.BINS_PER_DAY)
+        self.assertAlmostEqual(row[40], 1.5)
+        self.assertAlmostEqual(row[44], 0.5)
+        self.assertAlmostEqual(sum(row), 2)
+
+    @unittest.skipIf(forecasting.numpy is None, "NumPy non installé")
+    def test_convolve_numpy_matches_pure_python(self):
+        rng = random.Random(1)
+        width = forecasting.BINS_PER_DAY + forecasting.LEAD_BINS
+        departures = [[rng.choice([0, 0, 0, 1, 2]) for _ in range(width)] for _ in range(3)]
+        profiles = [forecasting.normalized([rng.random() for _ in range(forecasting.LEAD_BINS)]) for _ in range(3)]
+        vectorized = forecasting.convolve(departures, profiles)
+        with mock.patch.object(forecasting, 'numpy', None):
+            expected = forecasting.convolve(departures, profiles)
+        self.assertEqual(len(vectorized), 3)
+        for row, expected_row in zip(vectorized, expected):
+            self.assertEqual(len(row), forecasting.BINS_PER_DAY)
+            for value, expected_value in zip(row, expected_row):
+                self.assertAlmostEqual(value, expected_value)
+
+    def test_only_companies_with_counters_at_site(self):
+        other = Company.objects.create(name="Brussels Airlines", code="SN", average_daily_passengers=40)
+        self.flight("AF480", 10)
+        self.flight("SN101", 11, company=other)
+        forecast = forecasting.forecast_day(self.site.id, self.day)
+        self.assertEqual([c['code'] for c in forecast['companies']], ["AF"])
+        # Un comptoir affecté à SN au site : la prévision en cache est périmée
+        with self.captureOnCommitCallbacks(execute=True):
+            Counter.objects.create(name="A2", assigned_company=other)
+        forecast = forecasting.forecast_day(self.site.id, self.day)
+        self.assertEqual([c['code'] for c in forecast['companies']], ["AF", "SN"])
+
+    def test_default_profile_spreads_average_passengers(self):
+        self.flight("AF480", 10)
+        self.flight("AF482", 16)
+        forecast = forecasting.forecast_day(self.site.id, self.day)
+        [company] = forecast['companies']
+        self.assertEqual(company['source'], 'default')
+        self.assertEqual(len(company['arrivals']), forecasting.BINS_PER_DAY)
+        self.assertAlmostEqual(company['total'], 100, places=0)
+        # Aucune arrivée après la fermeture (H-45) du dernier vol
+        self.assertEqual(sum(company['arrivals'][16 * 4 - 2:]), 0)
+        self.assertGreater(company['arrivals'][16 * 4 - 3], 0)
+
+    def test_history_profile_and_volume(self):
+        past = self.flight("AF480", 12, day=self.day - datetime.timedelta(days=3))
+        tickets = [
+            Ticket.objects.create(ticket_number="AF480", service=self.service, flight=past)
+            for _ in range(forecasting.MIN_SAMPLES + 10)
+        ]
+        Ticket.objects.filter(pk__in=[t.pk for t in tickets]).update(
+            created_at=past.departure_time - datetime.timedelta(hours=2, minutes=5),
+        )
+        self.flight("AF480", 12)
+
+        forecast = forecasting.forecast_day(self.site.id, self.day)
+        [company] = forecast['companies']
+        self.assertEqual(company['source'], 'history')
+        # Tous arrivés 2h05 avant le départ : 8 tranches avant celle du départ (12:00), soit 10:00
+        self.assertEqual(company['arrivals'][40], forecasting.MIN_SAMPLES + 10)
+        self.assertEqual(company['total'], forecasting.MIN_SAMPLES + 10)
+
+    def test_cached_until_schedule_changes(self):
+        self.flight("AF480", 10)
+        first = forecasting.forecast_day(self.site.id, self.day)
+        with self.assertNumQueries(0):
+            self.assertEqual(forecasting.forecast_day(self.site.id, self.day), first)
+
+        other = Company.objects.create(name="Brussels Airlines", code="SN", average_daily_passengers=40)
+        Counter.objects.create(name="A2", assigned_company=other)
+        self.flight("SN101", 11, company=other)
+        forecast = forecasting.forecast_day(self.site.id, self.day)
+        self.assertEqual([c['code'] for c in forecast['companies']], ["AF", "SN"])
+        self.assertAlmostEqual(sum(forecast['total']), 140, places=0)
+
+    def test_next_morning_departures_counted(self):
+        self.flight("AF480", 24 + 1)
+        [company] = forecasting.forecast_day(self.site.id, self.day)['companies']
+        self.assertGreater(company['total'], 0)
+        self.assertGreater(company['arrivals'][-1], 0)
+
+    def test_api_window(self):
+        self.flight("AF480", 10)
+        response = self.client.get(f'/api/forecast/arrivals/?date={self.day.isoformat()}&hours=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['total']), 8)
+        self.assertEqual(data['bin_minutes'], 15)
+        self.assertEqual(len(data['companies'][0]['arrivals']), 8)
+        self.assertEqual(self.client.get('/api/forecast/arrivals/?date=demain').status_code, 400)
+
+
+@override_settings(SIOA_RATE_LIMITS={})
+class ServiceRoutingTestCase(TestCase):
+    """Tests du routage des services vers un pool de comptoirs (api/routing.py)."""
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Air France", code="AF")
+        self.information = Service.objects.create(name="Information", prefix="I")
+        self.vip = Service.objects.create(name="Salon VIP", prefix="V", priority_class="VIP")
+        self.checkin = Service.objects.create(name="Check-in", prefix="A")
+        self.b8 = Counter.objects.create(name="B8")
+        self.b9 = Counter.objects.create(name="B9")
+        self.v1 = Counter.objects.create(name="V1")
+        self.v2 = Counter.objects.create(name="V2")
+        self.a1 = Counter.objects.create(name="A1", assigned_company=self.company)
+        ServiceRoute.objects.create(service=self.information, default_wait_minutes=7).counters.set([self.b8, self.b9])
+        ServiceRoute.objects.create(service=self.vip, strategy="FIRST_OPEN", requires_flight=True).counters.set([self.v2, self.v1])
+        Flight.objects.create(
+            flight_number="AF480", company=self.company, departure_time=timezone.now() + datetime.timedelta(hours=2),
+        )
+        self.addCleanup(routing.invalidate_routing_index)
+
+    def generate(self, service, ticket_number="AF480"):
+        return self.client.post(
+            '/api/tickets/generate-queue-ticket/', {'ticket_number': ticket_number, 'service_id': service.id},
+            content_type='application/json',
+        )
+
+    def test_index_lookup_without_queries(self):
+        routing.routes()
+        with self.assertNumQueries(0):
+            self.assertIsNone(routing.route_for(self.checkin))
+            self.assertEqual(sorted(routing.route_for(self.information)['counter_ids']), [self.b8.id, self.b9.id])
+            self.assertFalse(routing.requires_flight(self.information))
+            self.assertTrue(routing.requires_flight(self.vip))
+
+    def test_pool_shortest_queue_without_flight(self):
+        Ticket.objects.create(ticket_number="INFO", service=self.information, counter=self.b8)
+        response = self.generate(self.information, ticket_number="QUESTION")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['assigned_counter'], "B9")
+        self.assertEqual(response.json()['company'], "Information")
+
+    def test_first_open_strategy_with_flight(self):
+        self.assertEqual(self.generate(self.vip).json()['assigned_counter'], "V1")
+        Counter.objects.filter(pk=self.v1.pk).update(status="FERME")
+        self.assertEqual(self.generate(self.vip).json()['assigned_counter'], "V2")
+        # Vol exigé : numéro inconnu refusé
+        self.assertEqual(self.generate(self.vip, ticket_number="ZZ999").status_code, 400)
+
+    def test_closed_pool_falls_back_to_company_counters(self):
+        Counter.objects.filter(pk__in=[self.v1.pk, self.v2.pk]).update(status="FERME")
+        self.assertEqual(self.generate(self.vip).json()['assigned_counter'], "A1")
+
+    def test_pool_change_invalidates_index(self):
+        self.assertIsNone(routing.route_for(self.checkin))
+        route = ServiceRoute.objects.create(service=self.checkin)
+        self.assertEqual(routing.route_for(self.checkin)['counter_ids'], [])
+        route.counters.add(self.a1)
+        self.assertEqual(routing.route_for(self.checkin)['counter_ids'], [self.a1.id])
+        route.delete()
+        self.assertIsNone(routing.route_for(self.checkin))
+
+    def test_unrouted_information_service_requires_flight(self):
+        # Plus de détection par le nom du service : sans route, « Information » exige un vol
+        ServiceRoute.objects.filter(service=self.information).delete()
+        self.assertEqual(self.generate(self.information, ticket_number="QUESTION").status_code, 400)
@@ -0,0 +1,158 @@
+"""
+Limitation de débit (token bucket) et délestage avant tout accès à la base.
+
+Une boucle d'écran déréglée ou une rafale de relances d'une borne suffisent à
+saturer l'unique écrivain SQLite. Chaque requête est classée :
+
+- ``issuance`` : émission de tickets (bornes) ;
+- ``dashboard`` : lectures des écrans et tableaux de bord ;
+- ``agent`` : actions des agents aux comptoirs (appel, service...) ;
+- ``import`` : imports du programme des vols (administrateurs).
+
+Chaque classe a un seau par client et, pour ``issuance`` et ``dashboard``, un
+seau global qui borne la charge totale. Le client est :
+
+- pour les bornes, l'en-tête ``X-Sioa-Client``, seulement s'il désigne une borne
+  connue (``SIOA_TRUSTED_KIOSKS``) : une valeur libre suffirait à changer de
+  seau à chaque requête ;
+- pour les agents, le comptoir visé, sinon l'utilisateur authentifié : plusieurs
+  comptoirs derrière le même NAT ne partagent pas un seau ;
+- sinon l'adresse IP.
+
+Les actions des agents n'ont pas de seau global : une surcharge des écrans ou
+des bornes ne les bloque jamais.
+
+Un seau vide renvoie 429 avec ``Retry-After`` (throttles DRF, vérifiés avant le
+handler de la vue). L'état des seaux est rangé dans son propre cache (alias
+``throttle``), séparé des jetons de version : les seaux, un par client, ne
+peuvent pas les faire expulser. Avec Redis, ce cache est partagé ; la lecture
+puis l'écriture ne sont pas atomiques entre processus, ce qui peut laisser
+passer quelques requêtes de plus en rafale, sans conséquence ici. Sans Redis,
+c'est un cache en mémoire propre à chaque processus (pas d'accès disque à
+chaque requête) : les débits s'entendent alors par worker.
+"""
+import functools
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+CLIENT_HEADER = 'X-Sioa-Client'
+
+# rate : jetons rendus par seconde ; burst : capacité du seau
+DEFAULT_RATE_LIMITS = {
+    'issuance': {'rate': 2, 'burst': 10, 'global_rate': 30, 'global_burst': 60},
+    'dashboard': {'rate': 10, 'burst': 40, 'global_rate': 200, 'global_burst': 400},
+    'agent': {'rate': 5, 'burst': 30},
+    'import': {'rate': 0.1, 'burst': 5, 'global_rate': 0.2, 'global_burst': 10},
+}
+
+_lock = threading.Lock()
+
+
+def rate_limits():
+    # Lu à chaque requête : SIOA_RATE_LIMITS = {} désactive la limitation
+    return getattr(settings, 'SIOA_RATE_LIMITS', DEFAULT_RATE_LIMITS)
+
+
+def take_token(name, rate, burst, now=None):
+    """
+    Retire un jeton du seau ``name``.
+
+    Returns:
+        0 si la requête passe, sinon le délai (secondes) avant le prochain jeton
+    """
+    now = time.time() if now is None else now
+    key = f'sioa:bucket:{name}'
+    buckets = caches['throttle']
+    with _lock:
+        tokens, updated = buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        # Un seau non utilisé pendant le temps d'un remplissage complet disparaît du cache
+        buckets.set(key, (tokens - 1, now), math.ceil(burst / rate) + 1)
+    return 0
+
+
+def check(scope, client):
+    """Délai d'attente (0 si la requête est admise) pour un client et une classe de requêtes."""
+    spec = rate_limits().get(scope)
+    if not spec:
+        return 0
+    wait = take_token(f'{scope}:{client}', spec['rate'], spec['burst'])
+    if not wait and spec.get('global_rate'):
+        wait = take_token(f'{scope}:*', spec['global_rate'], spec['global_burst'])
+    return wait
+
+
+def trusted_kiosks():
+    return getattr(settings, 'SIOA_TRUSTED_KIOSKS', ())
+
+
+def client_id(request, fallback):
+    """Borne déclarée par ``X-Sioa-Client`` si elle est connue, sinon ``fallback`` (adresse IP)."""
+    kiosk = request.headers.get(CLIENT_HEADER)
+    if kiosk and kiosk in trusted_kiosks():
+        return f'kiosk:{kiosk}'
+    return fallback
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def allow_request(self, request, view):
+        self.delay = check(self.scope, self.get_client(request, view))
+        return not self.delay
+
+    def get_client(self, request, view):
+        return client_id(request, self.get_ident(request))
+
+    def wait(self):
+        return self.delay
+
+
+class IssuanceThrottle(TokenBucketThrottle):
+    scope = 'issuance'
+
+
+class DashboardThrottle(TokenBucketThrottle):
+    scope = 'dashboard'
+
+
+class ImportThrottle(TokenBucketThrottle):
+    scope = 'import'
+
+
+class AgentThrottle(TokenBucketThrottle):
+    scope = 'agent'
+
+    def get_client(self, request, view):
+        # Authentification déjà faite par DRF à ce stade : request.user ne coûte rien
+        counter_id = view.kwargs.get('counter_id')
+        if counter_id is not None:
+            return f'counter:{counter_id}'
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return self.get_ident(request)
+
+
+def throttled(scope):
+    """Équivalent des throttles DRF pour les vues asynchrones (``async_views.py``)."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # Même adresse que les throttles DRF (NUM_PROXIES pour X-Forwarded-For)
+            wait = await sync_to_async(check)(scope, client_id(request, BaseThrottle().get_ident(request)))
+            if wait:
+                response = JsonResponse({"detail": "Trop de requêtes."}, status=429)
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""
+Machine à états des tickets : appel, service, saut.
+
+Chaque transition est un seul UPDATE conditionnel sur l'état de départ
+(``WHERE id = ? AND status = 'WAITING'``) : si deux agents appellent le même
+ticket au même moment, un seul UPDATE touche la ligne et l'autre reçoit
+``InvalidTransition`` au lieu d'écraser silencieusement la première écriture.
+
+Dans la même transaction : horodatage (``called_at``, ``served_at``),
+``TicketEvent`` pour l'historique, statut du comptoir et recalcul de la file,
+compteurs de la session de l'agent (api.agent_sessions), puis publication
+via ``queue_changed``.
+"""
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .agent_sessions import handle_time, record_transition
+from .models import Counter, Ticket, TicketEvent
+from .scheduling import next_waiting_ticket
+from .signals import queue_changed
+from .tae import recompute_counter_queues
+
+# action -> état requis, nouvel état, horodatage, (statut du comptoir, depuis les statuts)
+TRANSITIONS = {
+    'call': {'from': 'WAITING', 'to': 'CALLED', 'stamp': 'called_at', 'counter': ('OCCUPE', ['LIBRE'])},
+    'serve': {'from': 'CALLED', 'to': 'DONE', 'stamp': 'served_at', 'counter': ('LIBRE', ['OCCUPE'])},
+    'skip': {'from': 'CALLED', 'to': 'WAITING', 'stamp': None, 'counter': ('LIBRE', ['OCCUPE'])},
+}
+
+
+class InvalidTransition(Exception):
+    """Le ticket n'est pas (ou plus) dans l'état requis par l'action."""
+
+    def __init__(self, action):
+        self.action = action
+        self.required_status = TRANSITIONS[action]['from']
+        super().__init__(f"Ticket is not in {self.required_status} status")
+
+
+def set_counter_status(counter, new_status, from_statuses):
+    """
+    Passe le comptoir à ``new_status`` s'il est dans l'un des ``from_statuses``.
+
+    Un seul UPDATE conditionnel, et aucune écriture si le statut est déjà le
+    bon : appeler/servir à la chaîne ne réécrit pas la ligne du comptoir. Un
+    comptoir FERME n'est jamais rouvert par une action sur un ticket.
+
+    Returns:
+        True si la ligne a été modifiée
+    """
+    if counter is None or counter.status == new_status:
+        return False
+    changed = bool(
+        Counter.objects.filter(pk=counter.pk, status__in=from_statuses).update(status=new_status)
+    )
+    if changed:
+        counter.status = new_status
+        counter._loaded_status = new_status
+    return changed
+
+
+def apply_transition(ticket_id, action, actor="", counter=None):
+    """
+    Applique ``action`` au ticket.
+
+    Args:
+        counter: instance du comptoir déjà chargée par l'appelant (mise à jour en place)
+
+    Returns:
+        Le ticket après transition
+
+    Raises:
+        Ticket.DoesNotExist: ticket inconnu
+        InvalidTransition: le ticket n'est pas dans l'état requis
+    """
+    spec = TRANSITIONS[action]
+    now = timezone.now()
+    fields = {'status': spec['to']}
+    if spec['stamp']:
+        fields[spec['stamp']] = now
+
+    with transaction.atomic():
+        if not Ticket.objects.filter(pk=ticket_id, status=spec['from']).update(**fields):
+            if not Ticket.objects.filter(pk=ticket_id).exists():
+                raise Ticket.DoesNotExist(f"Ticket {ticket_id} introuvable.")
+            raise InvalidTransition(action)
+
+        ticket = Ticket.objects.select_related('service', 'counter').get(pk=ticket_id)
+        if counter is not None and counter.pk == ticket.counter_id:
+            ticket.counter = counter
+        TicketEvent.objects.create(
+            ticket=ticket, from_status=spec['from'], to_status=spec['to'],
+            counter_id=ticket.counter_id, actor=actor,
+        )
+        counter_status, counter_from = spec['counter']
+        set_counter_status(ticket.counter, counter_status, from_statuses=counter_from)
+        record_transition(
+            ticket.counter_id, action, now,
+            handle_time=handle_time(ticket.called_at, now) if action == 'serve' else None,
+        )
+        recompute_counter_queues([ticket.counter_id])
+        queue_changed.send(sender=Ticket, counter_ids=[ticket.counter_id], reason=action, ticket_id=ticket.id)
+    return ticket
+
+
+def call_next_ticket(counter, actor=""):
+    """
+    Appelle le ticket prioritaire de la file du comptoir.
+
+    Si un autre agent a appelé le même ticket entre-temps, l'UPDATE
+    conditionnel échoue et on passe au suivant.
+
+    Returns:
+        Le ticket appelé, ou None si la file est vide
+    """
+    while True:
+        ticket = next_waiting_ticket(counter.id)
+        if ticket is None:
+            return None
+        try:
+            return apply_transition(ticket.pk, 'call', actor=actor, counter=counter)
+        except InvalidTransition:
+            continue
+
+
+def serve_all_called(counter, actor=""):
+    """
+    Termine tous les tickets CALLED du comptoir (fin de vacation, guichet groupe).
+
+    Un UPDATE pour les tickets, un INSERT groupé pour les événements, un
+    UPDATE pour la session de l'agent.
+
+    Returns:
+        Les ids des tickets servis
+    """
+    with transaction.atomic():
+        called = Ticket.objects.select_for_update().filter(counter=counter, status='CALLED')
+        called_at = dict(called.values_list('id', 'called_at'))
+        ticket_ids = list(called_at)
+        if not ticket_ids:
+            return []
+        now = timezone.now()
+        Ticket.objects.filter(pk__in=ticket_ids, status='CALLED').update(status='DONE', served_at=now)
+        TicketEvent.objects.bulk_create([
+            TicketEvent(ticket_id=ticket_id, from_status='CALLED', to_status='DONE', counter=counter, actor=actor)
+            for ticket_id in ticket_ids
+        ])
+        set_counter_status(counter, 'LIBRE', from_statuses=['OCCUPE'])
+        record_transition(
+            counter.id, 'serve', now, count=len(ticket_ids),
+            handle_time=sum((handle_time(stamp, now) for stamp in called_at.values()), datetime.timedelta()),
+        )
+        recompute_counter_queues([counter.id])
+        queue_changed.send(sender=Ticket, counter_ids=[counter.id], reason='serve-all', served=len(ticket_ids))
+    return ticket_ids
@@ -1,16 +1,28 @@
 from django.urls import path
 from .views import (
-    ServiceListView, TicketCreateView, TicketDetailView,
+    ServiceListView, TicketCreateView, TicketDetailView, TicketListView,
     GenererTicketEtCalculerTAEView, FlightDetailView, CounterListView,
-    TicketStatisticsView, CounterTicketsListView, TicketActionView
+    TicketStatisticsView, CounterTicketsListView, TicketActionView,
+    FlightImportView, CallNextTicketView, ServeAllCalledView, ScheduledJobListView,
+    DisplayProfileListView, DisplayFeedView, KioskLeaseView, KioskSyncView,
+    ProfileListView, ProfileDetailView, AgentSessionView, AgentSessionListView,
+    ArrivalForecastView, CloseCounterView,
 )
 
 urlpatterns = [
     path('services/', ServiceListView.as_view(), name='service-list'),
     path('counters/', CounterListView.as_view(), name='counter-list'),
     path('counters/<int:counter_id>/tickets/', CounterTicketsListView.as_view(), name='counter-tickets-list'),
+    path('counters/<int:counter_id>/call-next/', CallNextTicketView.as_view(), name='counter-call-next'),
+    path('counters/<int:counter_id>/serve-all/', ServeAllCalledView.as_view(), name='counter-serve-all'),
+    path('counters/<int:counter_id>/close/', CloseCounterView.as_view(), name='counter-close'),
+    path('counters/<int:counter_id>/session/', AgentSessionView.as_view(), name='counter-session'),
+
+    # Sessions des agents (superviseur)
+    path('sessions/', AgentSessionListView.as_view(), name='agent-sessions'),
 
     # Tickets
+    path('tickets/', TicketListView.as_view(), name='ticket-list'),
     path('tickets/create/', TicketCreateView.as_view(), name='ticket-create'),
     path('tickets/generate-queue-ticket/', GenererTicketEtCalculerTAEView.as_view(), name='generate-queue-ticket'),
     path('tickets/statistics/', TicketStatisticsView.as_view(), name='ticket-statistics'),
@@ -18,6 +30,25 @@ urlpatterns = [
     path('tickets/<str:ticket_number>/', TicketDetailView.as_view(), name='ticket-detail'),
 
     # Flights
+    path('flights/import/', FlightImportView.as_view(), name='flight-import'),
     path('flights/<str:flight_number>/', FlightDetailView.as_view(), name='flight-detail'),
+
+    # Bornes hors ligne
+    path('kiosks/<str:kiosk_id>/leases/', KioskLeaseView.as_view(), name='kiosk-leases'),
+    path('kiosks/<str:kiosk_id>/sync/', KioskSyncView.as_view(), name='kiosk-sync'),
+
+    # Prévision des arrivées
+    path('forecast/arrivals/', ArrivalForecastView.as_view(), name='arrival-forecast'),
+
+    # Écrans publics
+    path('display/', DisplayProfileListView.as_view(), name='display-profiles'),
+    path('display/<str:profile>/', DisplayFeedView.as_view(), name='display-feed'),
+
+    # Scheduler
+    path('scheduler/jobs/', ScheduledJobListView.as_view(), name='scheduler-jobs'),
+
+    # Profilage (administrateurs)
+    path('profiling/', ProfileListView.as_view(), name='profile-list'),
+    path('profiling/<int:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
 ]
 
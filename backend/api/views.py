@@ -1,15 +1,50 @@
+import datetime
+import io
+import logging
 import math
-from django.db.models import Count, Q
+from django.db import IntegrityError
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
 from rest_framework import generics
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from django.core.exceptions import ObjectDoesNotExist
 # Assurez-vous d'importer les modèles et le serializer
-from .models import Company, Counter, Ticket, Service, Flight
-from .serializers import EnregistrementSerializer, ServiceSerializer, TicketSerializer, FlightSerializer, CounterSerializer, TicketStatisticsSerializer
+from . import agent_sessions, display_feed, forecasting, redistribution, routing, fastpath, idempotency, kiosk, profiling
+from .models import Company, Counter, Ticket, Service, Flight, ScheduledJob, Site
+from .flight_import import import_flights
+from .flight_lookup import resolve_flight
+from .pagination import TicketCursorPagination
+from .query_budget import query_budget
+from .scheduling import compute_priority_key
+from .signals import queue_changed
+from .sites import request_site, site_code
+from .structured_logging import Event
+from .tae import recompute_counter_queues
+from .throttling import AgentThrottle, DashboardThrottle, ImportThrottle, IssuanceThrottle
+from .transitions import InvalidTransition, apply_transition, call_next_ticket, serve_all_called, set_counter_status
+from .serializers import (
+    EnregistrementSerializer, TicketSerializer, TicketFilterSerializer, FlightSerializer, ScheduledJobSerializer,
+    KioskLeaseRequestSerializer, KioskLeaseSerializer, KioskSyncSerializer,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def request_actor(request):
+    """Nom de l'agent pour l'historique des transitions (vide si anonyme)."""
+    user = getattr(request, 'user', None)
+    return user.get_username() if user is not None and user.is_authenticated else ""
 
 
 def assign_counter_to_ticket(company, new_ticket):
@@ -31,7 +66,7 @@ def assign_counter_to_ticket(company, new_ticket):
         assigned_counter: L'objet Counter assigné ou None si aucun disponible
     """
     # 1. & 2. Trouver TOUS les comptoirs assignés à cette compagnie (même fermés)
-    all_counters = Counter.objects.filter(assigned_company=company)
+    all_counters = Counter.objects.filter(site_id=new_ticket.site_id, assigned_company=company)
     
     # 3. Filtrer les comptoirs ouverts (LIBRE ou OCCUPE, pas FERME)
     open_counters = all_counters.filter(status__in=['LIBRE', 'OCCUPE'])
@@ -57,52 +92,338 @@ def assign_counter_to_ticket(company, new_ticket):
     new_ticket.counter = assigned_counter
     
     # Mettre à jour le statut du comptoir si nécessaire (passer à OCCUPE s'il était LIBRE)
-    if assigned_counter.status == 'LIBRE':
-        assigned_counter.status = 'OCCUPE'
-        assigned_counter.save()
+    set_counter_status(assigned_counter, 'OCCUPE', from_statuses=['LIBRE'])
     
     return assigned_counter
 
 
-class ServiceListView(generics.ListAPIView):
-    queryset = Service.objects.all()
-    serializer_class = ServiceSerializer
+def emettre_ticket(service, company, ticket_number_input, flight=None, issued_at=None, queue_number=None, client_uuid=None):
+    """
+    Crée le ticket, calcule le TAE et assigne un comptoir.
+
+    Partagé par la vue synchrone (WSGI) et la vue asynchrone (ASGI) : les
+    recherches de validation (service, compagnie, vol) sont faites par l'appelant.
+
+    Args:
+        service: Le Service demandé
+        company: La Company du vol (None pour un service routé sans vol, ex: Information)
+        ticket_number_input: Le numéro de vol saisi, en majuscules
+        flight: Le départ résolu par ``resolve_flight`` (None sans vol)
+        issued_at: Heure d'émission par une borne hors ligne (défaut : maintenant)
+        queue_number: Numéro pris dans un bail de la borne (défaut : séquence du jour)
+        client_uuid: Identifiant du ticket généré par la borne
+
+    Returns:
+        response_data: Le dictionnaire renvoyé à la borne
+    """
+    # Événement ``ticket.issued`` : durées des phases et temps SQL (voir api/structured_logging.py)
+    event = Event(logger, 'ticket.issued')
+    with event.track_db():
+        response_data = _emettre_ticket(
+            event, service, company, ticket_number_input, flight, issued_at, queue_number, client_uuid,
+        )
+    event.emit(
+        site_id=service.site_id,
+        service_id=service.id,
+        queue_number=response_data['queue_number'],
+        assigned_counter=response_data['assigned_counter'],
+        estimated_waiting_time_minutes=response_data['estimated_waiting_time_minutes'],
+        offline=issued_at is not None,
+    )
+    return response_data
+
+
+def _emettre_ticket(event, service, company, ticket_number_input, flight, issued_at, queue_number, client_uuid):
+    company_code = ticket_number_input[:2]
+
+    # --- TÂCHE A : Enregistrement et Attribution du queue_number ---
+    
+    # Création du Ticket. La méthode save() génère le queue_number (ex: A001).
+    event.start('create')
+    new_ticket = Ticket(
+        ticket_number=ticket_number_input, # Le numéro de vol
+        service=service,
+        flight=flight,
+        status="WAITING",
+        queue_number=queue_number,
+        client_uuid=client_uuid,
+    )
+    if issued_at is not None:
+        # Ticket émis hors ligne : la file garde l'ordre d'arrivée réel à la borne
+        new_ticket.priority_key = compute_priority_key(
+            issued_at, service, flight.departure_time if flight else None,
+        )
+    new_ticket.save() 
+    if issued_at is not None:
+        # created_at (auto_now_add) est écrit par la seconde sauvegarde ci-dessous
+        new_ticket.created_at = issued_at
+    event.stop('create')
+
+    # --- TÂCHE B : Calculer le Temps d'Attente Estimé (TAE) ---
+    event.start('tae')
+
+    # 1. Détermination des variables de calcul
+    
+    # Service routé vers un pool de comptoirs (ex: Information) : TAE par défaut de la route
+    route = routing.route_for(service)
+    if route is not None:
+        estimated_time = route['default_wait_minutes']
+        details = f"Service {service.name} - assigné à un comptoir de son pool."
+        active_counters_count = len(route['counter_ids'])
+    else:
+        # N_compteur : Nombre de comptoirs ouverts (LIBRE ou OCCUPE) attribués à CETTE compagnie
+        active_counters_count = Counter.objects.filter(
+            site_id=service.site_id,
+            assigned_company=company,
+            status__in=['LIBRE', 'OCCUPE']
+        ).count()
+
+        # N_voyageurs_avant : Nombre de voyageurs en attente pour CE vol (même ticket_number)
+        # qui sont arrivés avant ce nouveau ticket.
+        waiting_tickets_count = Ticket.objects.filter(
+            site_id=service.site_id,
+            ticket_number=ticket_number_input,
+            status__in=['WAITING', 'CALLED'], 
+            created_at__lt=new_ticket.created_at
+        ).count()
+
+        T_moyen = company.average_service_time_minutes
+
+        # 2. Formule de Calcul du Temps d'Attente (TAE)
+        if active_counters_count == 0:
+            estimated_time = -1 
+            details = f"Aucun comptoir ouvert pour {company.name} (Code {company_code})."
+        else:
+            estimated_time = math.ceil(
+                (waiting_tickets_count / active_counters_count) * T_moyen
+            )
+            details = f"Basé sur {waiting_tickets_count} personnes devant et {active_counters_count} comptoirs actifs de {company.name}."
+    event.stop('tae')
+    
+    # --- TÂCHE C : Attribution d'un Comptoir (avec stratégie file la plus courte) ---
+    event.start('routing')
+    try:
+        # Assignation intelligente du comptoir
+        assigned_counter = None
+
+        # Service routé : comptoir du pool selon la stratégie de la route (voir api/routing.py)
+        if route is not None:
+            assigned_counter = routing.assign_pool_counter(route)
+        # Sinon utiliser la logique générique par compagnie
+        if assigned_counter is None:
+            assigned_counter = assign_counter_to_ticket(company, new_ticket)
+    except Exception:
+        # Gérer l'erreur si aucun comptoir n'est disponible ou autre problème
+        logger.exception(
+            "Erreur lors de l'attribution du comptoir",
+            extra={'event': 'ticket.routing_failed', 'ticket_id': new_ticket.id, 'site_id': service.site_id},
+        )
+        assigned_counter = None
+        # Le ticket sera créé sans comptoir assigné, ce qui est géré par null=True
+    event.stop('routing')
+
+    # 3. Mise à jour du modèle Ticket
+    new_ticket.estimated_waiting_time_minutes = estimated_time
+    if assigned_counter:
+        new_ticket.counter = assigned_counter
+    new_ticket.save() # Sauvegarde tous les champs mis à jour
+
+    # 4. Le TAE d'un ticket assigné est celui de sa position dans la file du comptoir,
+    # recalculé ensuite à chaque changement d'état (voir api.tae)
+    if assigned_counter:
+        event.start('tae')
+        estimated_time, position = recompute_counter_queues([assigned_counter.id])[new_ticket.id]
+        new_ticket.estimated_waiting_time_minutes = estimated_time
+        new_ticket.queue_position = position
+        if estimated_time >= 0:
+            details = f"Position {position} dans la file du comptoir {assigned_counter.name}."
+        event.stop('tae')
+        queue_changed.send(sender=Ticket, counter_ids=[assigned_counter.id], reason='issue', ticket_id=new_ticket.id)
+
+    # 5. Retour
+    response_data = {
+        "queue_number": new_ticket.queue_number,
+        "estimated_waiting_time_minutes": estimated_time,
+        "details": details,
+        "company": company.name if company else service.name,
+        "assigned_counter": assigned_counter.name if assigned_counter else "Aucun"
+    }
+
+    return response_data
 
-class CounterListView(generics.ListAPIView):
-    queryset = Counter.objects.all()
-    serializer_class = CounterSerializer
 
+def _shape_rows(request, rows, available):
+    """?fields= et ?compact= des endpoints de polling (voir api/fastpath.py)."""
+    try:
+        return fastpath.shape_rows(rows, request.query_params, available)
+    except fastpath.InvalidFields as exc:
+        raise ValidationError({'fields': [str(exc)]})
+
+
+@query_budget(queries=1, ms=50)
+class ServiceListView(APIView):
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, *args, **kwargs):
+        # Polling des bornes : projection .values() au lieu du serializer (voir api/fastpath.py)
+        rows = list(fastpath.services_queryset(request_site(request).id))
+        return Response(_shape_rows(request, rows, fastpath.SERVICE_FIELDS))
+
+@query_budget(queries=1, ms=50)
+class CounterListView(APIView):
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, *args, **kwargs):
+        rows = fastpath.counters_queryset(request_site(request).id)
+        return Response(_shape_rows(request, [fastpath.counter_row(row) for row in rows], fastpath.COUNTER_FIELDS))
+
+@query_budget(queries=7, ms=100)
 class TicketCreateView(generics.CreateAPIView):
+    throttle_classes = [IssuanceThrottle]
+
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
 
+    def perform_create(self, serializer):
+        # ``service`` est en lecture seule dans TicketSerializer : lu ici, limité au site
+        try:
+            service = Service.objects.get(pk=self.request.data.get('service'), site=request_site(self.request))
+        except (Service.DoesNotExist, ValueError, TypeError):
+            raise ValidationError({'service': "Service introuvable."})
+        serializer.save(service=service)
+
+@query_budget(queries=1, ms=50)
+class TicketListView(generics.ListAPIView):
+    """
+    Historique des tickets, paginé par curseur (voir api/pagination.py).
+
+    Filtres : ?status=WAITING,CALLED&service=&counter=&flight=&company=AF&date_from=&date_to=
+    Chaque filtre seul a un index (champ, created_at) du modèle Ticket, ainsi que
+    les combinaisons service+statut et comptoir+statut ; pour les autres
+    combinaisons, la base lit l'index du filtre le plus sélectif et applique les
+    autres filtres aux lignes lues.
+    """
+    throttle_classes = [DashboardThrottle]
+
+    serializer_class = TicketSerializer
+    pagination_class = TicketCursorPagination
+
+    def get_queryset(self):
+        filters = TicketFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        queryset = Ticket.objects.filter(site=request_site(self.request)).select_related('service', 'counter')
+        if params.get('status'):
+            queryset = queryset.filter(status__in=params['status'])
+        for field in ('service', 'counter', 'flight'):
+            if field in params:
+                queryset = queryset.filter(**{f'{field}_id': params[field]})
+        if params.get('company'):
+            # Préfixe en intervalle [AF, AG[ plutôt qu'un LIKE : utilisable par l'index sur ticket_number
+            prefix = params['company'].upper()
+            queryset = queryset.filter(
+                ticket_number__gte=prefix,
+                ticket_number__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1),
+            )
+        if params.get('date_from'):
+            queryset = queryset.filter(created_at__gte=local_midnight(params['date_from']))
+        if params.get('date_to'):
+            queryset = queryset.filter(
+                created_at__lt=local_midnight(params['date_to'] + datetime.timedelta(days=1))
+            )
+        return queryset
+
+@query_budget(queries=1, ms=50)
 class TicketDetailView(generics.RetrieveAPIView):
-    queryset = Ticket.objects.all()
+    throttle_classes = [DashboardThrottle]
+
+    queryset = Ticket.objects.select_related('service', 'counter')
     serializer_class = TicketSerializer
     lookup_field = 'ticket_number'
 
     def get_object(self):
-        queryset = self.get_queryset()
-        filter_kwargs = {self.lookup_field: self.kwargs[self.lookup_field]}
-        obj = get_object_or_404(queryset, **filter_kwargs)
+        # Le numéro de vol n'est pas unique (un ticket par passager et par jour) :
+        # on renvoie le ticket le plus récent, éventuellement précisé par ?queue_number=
+        queryset = self.get_queryset().filter(
+            site=request_site(self.request), ticket_number=self.kwargs[self.lookup_field].upper()
+        )
+        queue_number = self.request.query_params.get('queue_number')
+        if queue_number:
+            queryset = queryset.filter(queue_number=queue_number.upper())
+        obj = queryset.order_by('-created_at', '-id').first()
+        if obj is None:
+            raise Http404
         return obj
 
+@query_budget(queries=1, ms=50)
 class FlightDetailView(APIView):
+    throttle_classes = [DashboardThrottle]
+
     def get(self, request, flight_number, *args, **kwargs):
-        try:
-            flight = Flight.objects.get(flight_number__iexact=flight_number)
-            serializer = FlightSerializer(flight)
-            return Response(serializer.data)
-        except Flight.DoesNotExist:
+        flight = resolve_flight(flight_number)
+        if flight is None:
             return Response({"error": "Vol non trouvé."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = FlightSerializer(flight)
+        return Response(serializer.data)
+
+@query_budget(queries=7, ms=100)
+class FlightImportView(APIView):
+    """
+    Importe le programme des vols envoyé en multipart (champ ``file``).
+    Le format est déduit de l'extension ou forcé avec ``?type=csv|json`` (``?format=`` est réservé
+    par DRF au choix du rendu). Réservé aux administrateurs : un vol passé à CANCELLED fait
+    annuler ses tickets en attente par le balayage (api/sweeper.py).
+    """
+    parser_classes = [MultiPartParser]
+    permission_classes = [IsAdminUser]
+    throttle_classes = [ImportThrottle]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Fichier 'file' manquant."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.query_params.get('type') or ('csv' if upload.name.lower().endswith('.csv') else 'json')
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report = import_flights(stream, fmt=fmt)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
 
+@query_budget(queries=21, ms=100)
 class GenererTicketEtCalculerTAEView(APIView):
     """
     Crée un nouveau ticket, identifie la compagnie via le code IATA (2 premières lettres
     du ticket_number) et calcule le Temps d'Attente Estimé (TAE).
+
+    Avec un en-tête ``Idempotency-Key``, une relance de la borne rejoue la
+    réponse d'origine au lieu d'émettre un second ticket (voir api/idempotency.py).
     """
+    throttle_classes = [IssuanceThrottle]
 
     def post(self, request, *args, **kwargs):
+        try:
+            key = idempotency.request_key(request)
+            if key is None:
+                return self.generate(request)
+            scope = f"{site_code(request)}:generate-queue-ticket"
+            replay = idempotency.begin(scope, key, idempotency.fingerprint(request.data))
+        except idempotency.IdempotencyError as e:
+            headers = {'Retry-After': str(e.retry_after)} if isinstance(e, idempotency.IdempotencyInProgress) else None
+            return Response({'error': str(e)}, status=e.status_code, headers=headers)
+        if replay is not None:
+            return Response(replay[1], status=replay[0], headers={idempotency.REPLAYED_HEADER: 'true'})
+        try:
+            response = self.generate(request)
+        except Exception:
+            idempotency.abort(scope, key)
+            raise
+        idempotency.complete(scope, key, response.status_code, response.data)
+        return response
+
+    def generate(self, request):
         # 1. Validation des données d'entrée
         serializer = EnregistrementSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -114,18 +435,23 @@ class GenererTicketEtCalculerTAEView(APIView):
         company_code = ticket_number_input[:2] 
 
         try:
-            service = Service.objects.get(pk=service_id)
+            # Un service n'est proposé que par les bornes de son site
+            service = Service.objects.get(pk=service_id, site=request_site(request))
             
-            # Pour le service Information, on ne valide pas la compagnie ni le vol
-            if service.name and 'information' in service.name.lower():
-                company = None  # Pas de compagnie pour Information
+            # Service routé sans vol (ex: Information) : on ne valide pas la compagnie ni le vol
+            if not routing.requires_flight(service):
+                company = None  # Pas de compagnie sans vol
+                flight = None
             else:
-                # 🌟 ÉTAPE CLÉ : Identifier la Compagnie via le code IATA
-                company = Company.objects.get(code__iexact=company_code) 
-                
-                # Vérification facultative : Assurer que le vol existe (pour la robustesse)
-                # Nous utilisons ici le Flight pour valider l'existence du vol réel
-                Flight.objects.get(flight_number=ticket_number_input)
+                # 🌟 ÉTAPE CLÉ : Identifier le départ (casse, espaces, partage de code, vol du jour)
+                flight = resolve_flight(ticket_number_input)
+                if flight is None:
+                    # Message précis : code compagnie inconnu ou vol non planifié
+                    Company.objects.get(code__iexact=company_code)
+                    raise Flight.DoesNotExist
+                # La compagnie est celle du vol réel (et non celle du code saisi)
+                company = flight.company
+                ticket_number_input = flight.flight_number
 
         except Service.DoesNotExist:
             return Response(
@@ -143,219 +469,254 @@ class GenererTicketEtCalculerTAEView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # --- TÂCHE A : Enregistrement et Attribution du queue_number ---
-        
-        # Création du Ticket. La méthode save() génère le queue_number (ex: A001).
-        new_ticket = Ticket(
-            ticket_number=ticket_number_input, # Le numéro de vol
-            service=service,
-            status="WAITING"
-        )
-        new_ticket.save() 
+        response_data = emettre_ticket(service, company, ticket_number_input, flight=flight)
 
-        # --- TÂCHE B : Calculer le Temps d'Attente Estimé (TAE) ---
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
-        # 1. Détermination des variables de calcul
-        
-        # Pour Information, pas de calcul de TAE sophistiqué
-        if service.name and 'information' in service.name.lower():
-            estimated_time = 5  # Temps d'attente par défaut pour Information
-            details = "Service Information - assigné à comptoir B8 ou B9"
-            active_counters_count = 2  # Pour Information seulement
-        else:
-            # N_compteur : Nombre de comptoirs ouverts (LIBRE ou OCCUPE) attribués à CETTE compagnie
-            active_counters_count = Counter.objects.filter(
-                assigned_company=company,
-                status__in=['LIBRE', 'OCCUPE']
-            ).count()
-
-            # N_voyageurs_avant : Nombre de voyageurs en attente pour CE vol (même ticket_number)
-            # qui sont arrivés avant ce nouveau ticket.
-            waiting_tickets_count = Ticket.objects.filter(
-                ticket_number=ticket_number_input,
-                status__in=['WAITING', 'CALLED'], 
-                created_at__lt=new_ticket.created_at
-            ).count()
-
-            T_moyen = company.average_service_time_minutes
-
-            # 2. Formule de Calcul du Temps d'Attente (TAE)
-            if active_counters_count == 0:
-                estimated_time = -1 
-                details = f"Aucun comptoir ouvert pour {company.name} (Code {company_code})."
-            else:
-                estimated_time = math.ceil(
-                    (waiting_tickets_count / active_counters_count) * T_moyen
-                )
-                details = f"Basé sur {waiting_tickets_count} personnes devant et {active_counters_count} comptoirs actifs de {company.name}."
-        
-        # --- TÂCHE C : Attribution d'un Comptoir (avec stratégie file la plus courte) ---
+@query_budget(queries=7, ms=100)
+class KioskLeaseView(APIView):
+    """Réserve un bloc de numéros de file pour l'émission hors ligne d'une borne."""
+    throttle_classes = [IssuanceThrottle]
+
+    def post(self, request, kiosk_id, *args, **kwargs):
+        serializer = KioskLeaseRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        site = request_site(request)
         try:
-            # Assignation intelligente du comptoir
-            assigned_counter = None
-
-            # Cas spécial : si le service est "Information", restreindre aux comptoirs B8 et B9
-            if service.name and 'information' in service.name.lower():
-                preferred_names = ['B8', 'B9']
-                preferred_counters = Counter.objects.filter(name__in=preferred_names, status__in=['LIBRE', 'OCCUPE'])
-                if preferred_counters.exists():
-                    counter_loads = {}
-                    for counter in preferred_counters:
-                        queue_count = Ticket.objects.filter(counter=counter, status__in=['WAITING', 'CALLED']).count()
-                        counter_loads[counter] = queue_count
-                    assigned_counter = min(counter_loads, key=counter_loads.get)
-            # Sinon utiliser la logique générique par compagnie
-            if assigned_counter is None:
-                assigned_counter = assign_counter_to_ticket(company, new_ticket)
-        except Exception as e:
-            # Gérer l'erreur si aucun comptoir n'est disponible ou autre problème
-            print(f"Erreur lors de l'attribution du comptoir: {e}")
-            assigned_counter = None
-            # Le ticket sera créé sans comptoir assigné, ce qui est géré par null=True
-
-        # 3. Mise à jour du modèle Ticket
-        new_ticket.estimated_waiting_time_minutes = estimated_time
-        if assigned_counter:
-            new_ticket.counter = assigned_counter
-        new_ticket.save() # Sauvegarde tous les champs mis à jour
-
-        # 4. Retour
-        response_data = {
-            "queue_number": new_ticket.queue_number,
-            "estimated_waiting_time_minutes": estimated_time,
-            "details": details,
-            "company": company.name if company else "Information",
-            "assigned_counter": assigned_counter.name if assigned_counter else "Aucun"
-        }
-        
-        return Response(response_data, status=status.HTTP_201_CREATED)
+            service = Service.objects.get(pk=serializer.validated_data['service_id'], site=site)
+        except Service.DoesNotExist:
+            return Response(
+                {"error": f"Service '{serializer.validated_data['service_id']}' introuvable."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lease = kiosk.grant_lease(site, kiosk_id, service, serializer.validated_data['size'])
+        return Response(KioskLeaseSerializer(lease).data, status=status.HTTP_201_CREATED)
+
+# Budget mesuré pour un lot d'un ticket (chaque ticket du lot passe par emettre_ticket)
+@query_budget(queries=20, ms=200)
+class KioskSyncView(APIView):
+    """
+    Reçoit les tickets émis hors ligne par une borne. Idempotent : un ticket
+    déjà reçu (même client_uuid) est renvoyé avec le statut ``duplicate``.
+    """
+    throttle_classes = [IssuanceThrottle]
 
+    def post(self, request, kiosk_id, *args, **kwargs):
+        serializer = KioskSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = kiosk.sync_tickets(request_site(request), kiosk_id, serializer.validated_data['tickets'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+# debug_tickets_info liste tous les tickets du site : ~0,5 s à 100 000 tickets
+@query_budget(queries=6, ms=1000)
 class TicketStatisticsView(APIView):
+    throttle_classes = [DashboardThrottle]
+
     def get(self, request, *args, **kwargs):
-        # Total waiting tickets
-        total_waiting_tickets = Ticket.objects.filter(status__in=['WAITING', 'CALLED']).count()
-
-        # Calculate average waiting time for completed tickets
-        done_tickets = Ticket.objects.filter(status='DONE')
-        avg_wait_time = 0
-        if done_tickets.exists():
-            done_count = done_tickets.count()
-            if done_count > 0:
-                # Calculate average from estimated times
-                total_estimated_time = sum(t.estimated_waiting_time_minutes or 0 for t in done_tickets)
-                avg_wait_time = round(total_estimated_time / done_count) if total_estimated_time > 0 else 0
-
-        # Waiting tickets by company
-        debug_tickets_info = []
-        all_tickets = Ticket.objects.all()
-        for ticket in all_tickets:
-            counter_info = "N/A"
-            company_info = "N/A"
-            if ticket.counter:
-                counter_info = ticket.counter.name
-                if ticket.counter.assigned_company:
-                    company_info = ticket.counter.assigned_company.name
-            debug_tickets_info.append({
-                'ticket_number': ticket.ticket_number,
-                'counter': counter_info,
-                'company': company_info,
-                'service': ticket.service.name if ticket.service else "N/A",
-                'status': ticket.status
-            })
-
-        # Waiting tickets by company: extract company from ticket_number (first 2 chars = IATA code)
-        # and find the company name
-        waiting_tickets_by_company = []
+        site = request_site(request)
         try:
-            company_counts = {}
-            for ticket in Ticket.objects.filter(status__in=['WAITING', 'CALLED']):
-                if len(ticket.ticket_number) >= 2:
-                    company_code = ticket.ticket_number[:2].upper()
-                    try:
-                        company = Company.objects.get(code__iexact=company_code)
-                        key = (company.name, company.code)
-                        company_counts[key] = company_counts.get(key, 0) + 1
-                    except Company.DoesNotExist:
-                        pass
-            
-            waiting_tickets_by_company = [
-                {'counter__assigned_company__name': k[0], 'counter__assigned_company__code': k[1], 'count': v}
-                for k, v in sorted(company_counts.items())
-            ]
-        except Exception as e:
-            print(f"Error computing waiting_tickets_by_company: {e}")
-            import traceback
-            traceback.print_exc()
-            waiting_tickets_by_company = []
-        
-        # Waiting tickets by service: count all WAITING/CALLED tickets grouped by service
-        waiting_tickets_by_service = (
-            Ticket.objects.filter(status__in=['WAITING', 'CALLED'], service__isnull=False)
-            .values('service__name')
-            .annotate(count=Count('id'))
-            .order_by('service__name')
+            sections = fastpath.statistics_sections(request.query_params)
+        except fastpath.InvalidFields as exc:
+            raise ValidationError({'fields': [str(exc)]})
+        event = Event(logger, 'statistics.computed')
+        with event.track_db():
+            # Requêtes agrégées en nombre fixe, seulement pour les sections demandées
+            data = fastpath.ticket_statistics(site.id, sections)
+        event.emit(site_id=site.id, sections=len(sections), total_waiting_tickets=data.get('total_waiting_tickets'))
+        return Response(fastpath.shape_statistics(data, request.query_params))
+
+@query_budget(queries=1, ms=50)
+class CounterTicketsListView(APIView):
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, counter_id, *args, **kwargs):
+        rows = fastpath.counter_tickets_queryset(
+            counter_id, fastpath.counter_tickets_limit(request.query_params)
         )
+        return Response(_shape_rows(request, [fastpath.ticket_row(row) for row in rows], fastpath.TICKET_FIELDS))
 
-        try:
-            data = {
-                'total_waiting_tickets': total_waiting_tickets,
-                'average_wait_time_minutes': avg_wait_time,
-                'waiting_tickets_by_company': waiting_tickets_by_company,
-                'waiting_tickets_by_service': list(waiting_tickets_by_service),
-                'debug_tickets_info': debug_tickets_info,
-            }
-            serializer = TicketStatisticsSerializer(data)
-            return Response(serializer.data)
-        except Exception as e:
-            print(f"Error in TicketStatisticsView: {e}")
-            import traceback
-            traceback.print_exc()
-            return Response({"error": str(e)}, status=500)
-
-class CounterTicketsListView(generics.ListAPIView):
-    serializer_class = TicketSerializer
+@query_budget(queries=13, ms=300)
+class CallNextTicketView(APIView):
+    """
+    Appelle le ticket prioritaire de la file du comptoir (classe de service,
+    départ imminent, ancienneté) au lieu du plus ancien.
+    """
+    throttle_classes = [AgentThrottle]
+
+    def post(self, request, counter_id, *args, **kwargs):
+        counter = get_object_or_404(Counter, pk=counter_id)
+        ticket = call_next_ticket(counter, actor=request_actor(request))
+        if ticket is None:
+            return Response({'error': 'Aucun ticket en attente'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'status': 'Ticket called', 'ticket_id': ticket.id, 'queue_number': ticket.queue_number}, status=status.HTTP_200_OK)
+
+@query_budget(queries=11, ms=300)
+class ServeAllCalledView(APIView):
+    """Termine d'un coup tous les tickets appelés d'un comptoir."""
+    throttle_classes = [AgentThrottle]
+
+    def post(self, request, counter_id, *args, **kwargs):
+        counter = get_object_or_404(Counter, pk=counter_id)
+        ticket_ids = serve_all_called(counter, actor=request_actor(request))
+        return Response({'status': 'Tickets served', 'ticket_ids': ticket_ids}, status=status.HTTP_200_OK)
+
+@query_budget(queries=11, ms=300)
+class CloseCounterView(APIView):
+    """
+    Ferme le comptoir et répartit ses tickets en attente sur les autres
+    comptoirs ouverts de la compagnie, dans l'ordre de la file.
+    """
+    throttle_classes = [AgentThrottle]
+
+    def post(self, request, counter_id, *args, **kwargs):
+        counter = get_object_or_404(Counter, pk=counter_id)
+        moved = redistribution.close_counter(counter)
+        return Response({
+            'status': 'Counter closed',
+            'counter': counter.id,
+            'moved': sum(moved.values()),
+            'redistribution': {str(target): count for target, count in moved.items()},
+        }, status=status.HTTP_200_OK)
+
+@query_budget(queries=11, ms=200)
+class TicketActionView(APIView):
+    throttle_classes = [AgentThrottle]
 
-    def get_queryset(self):
-        counter_id = self.kwargs['counter_id']
-        return Ticket.objects.filter(counter__id=counter_id, status__in=['WAITING', 'CALLED']).order_by('created_at')
+    MESSAGES = {
+        'call': 'Ticket called',
+        'serve': 'Ticket served',
+        'skip': 'Ticket skipped',
+    }
 
-class TicketActionView(APIView):
     def post(self, request, ticket_id, action, *args, **kwargs):
-        ticket = get_object_or_404(Ticket, pk=ticket_id)
-        counter = ticket.counter
-
-        if action == 'call':
-            if ticket.status == 'WAITING':
-                ticket.status = 'CALLED'
-                ticket.save()
-                if counter:
-                    counter.status = 'OCCUPE'
-                    counter.save()
-                return Response({'status': 'Ticket called', 'ticket_id': ticket.id}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Ticket is not in WAITING status'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        elif action == 'serve':
-            if ticket.status == 'CALLED':
-                ticket.status = 'DONE'
-                ticket.save()
-                if counter:
-                    counter.status = 'LIBRE'
-                    counter.save()
-                return Response({'status': 'Ticket served', 'ticket_id': ticket.id}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Ticket is not in CALLED status'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        elif action == 'skip':
-            if ticket.status == 'CALLED':
-                ticket.status = 'WAITING'
-                ticket.save()
-                if counter:
-                    counter.status = 'LIBRE'
-                    counter.save()
-                return Response({'status': 'Ticket skipped', 'ticket_id': ticket.id}, status=status.HTTP_200_OK)
-            else:
-                return Response({'error': 'Ticket is not in CALLED status'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        else:
+        if action not in self.MESSAGES:
             return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
+        # Pas de lecture préalable : la transition est un UPDATE conditionnel (voir api/transitions.py)
+        try:
+            ticket = apply_transition(ticket_id, action, actor=request_actor(request))
+        except Ticket.DoesNotExist:
+            raise Http404
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': self.MESSAGES[action], 'ticket_id': ticket.id}, status=status.HTTP_200_OK)
+
+@query_budget(queries=5, ms=100)
+class AgentSessionView(APIView):
+    """
+    Connexion (POST, ``agent`` facultatif : utilisateur authentifié par défaut)
+    et déconnexion (DELETE) d'un agent au comptoir.
+    """
+    throttle_classes = [AgentThrottle]
+
+    def post(self, request, counter_id, *args, **kwargs):
+        counter = get_object_or_404(Counter, pk=counter_id)
+        agent = str(request.data.get('agent') or request_actor(request)).strip()[:150]
+        if not agent:
+            return Response({'error': "Le champ 'agent' est requis."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            session = agent_sessions.open_session(counter, agent)
+        except IntegrityError:
+            return Response({'error': 'Connexion concurrente à ce comptoir, réessayer.'}, status=status.HTTP_409_CONFLICT)
+        return Response({'session_id': session.id, 'counter': counter.id, 'agent': session.agent}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, counter_id, *args, **kwargs):
+        counter = get_object_or_404(Counter, pk=counter_id)
+        if not agent_sessions.close_session(counter):
+            return Response({'error': 'Aucune session ouverte sur ce comptoir.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@query_budget(queries=1, ms=50)
+class AgentSessionListView(APIView):
+    """
+    Tableau superviseur : débit des sessions ouvertes (``?active=0`` : toutes
+    les sessions commencées aujourd'hui). Lit les compteurs de chaque session,
+    sans agrégation sur les tickets.
+    """
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, *args, **kwargs):
+        active = request.query_params.get('active', '1') not in ('0', 'false')
+        rows = agent_sessions.sessions_queryset(request_site(request).id, active=active)
+        if not active:
+            rows = rows.filter(started_at__gte=local_midnight(timezone.localdate()))
+        now = timezone.now()
+        return Response([agent_sessions.session_row(row, now) for row in rows])
+
+# Prévision en cache : le budget est celui d'une lecture après la première requête du jour
+@query_budget(queries=1, ms=50)
+class ArrivalForecastView(APIView):
+    """
+    Prévision des arrivées par compagnie et par quart d'heure (api/forecasting.py).
+    ``?date=AAAA-MM-JJ`` (aujourd'hui par défaut) ; ``?hours=N`` restreint aux
+    N prochaines heures (à partir de maintenant pour aujourd'hui).
+    """
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, *args, **kwargs):
+        today = timezone.localdate()
+        try:
+            day = datetime.date.fromisoformat(request.query_params.get('date') or today.isoformat())
+            hours = int(request.query_params['hours']) if 'hours' in request.query_params else None
+        except ValueError:
+            return Response({'error': "Paramètres 'date' ou 'hours' invalides."}, status=status.HTTP_400_BAD_REQUEST)
+        forecast = forecasting.forecast_day(request_site(request).id, day)
+        if hours is not None:
+            since = timezone.now() if day == today else forecast['start']
+            forecast = forecasting.window(forecast, since, max(hours, 0))
+        return Response(forecast)
+
+@query_budget(queries=0, ms=50)
+class DisplayProfileListView(APIView):
+    def get(self, request, *args, **kwargs):
+        return Response([{'profile': name, 'label': spec['label']} for name, spec in display_feed.PROFILES.items()])
+
+@query_budget(queries=0, ms=50)
+class DisplayFeedView(APIView):
+    """
+    Flux d'un écran public : en cours / suivants par comptoir et statut des vols.
+    Le JSON est reconstruit à la première lecture après un changement, puis servi
+    depuis le cache (voir api/display_feed.py).
+    """
+    throttle_classes = [DashboardThrottle]
+
+    def get(self, request, profile, *args, **kwargs):
+        try:
+            payload = display_feed.get_display_feed(site_code(request), profile)
+        except (KeyError, Site.DoesNotExist):
+            return Response({'error': "Profil d'affichage inconnu."}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(payload, content_type='application/json')
+
+@query_budget(queries=3, ms=50)
+class ScheduledJobListView(generics.ListAPIView):
+    """État des tâches périodiques : dernière réussite, durée, erreurs, santé."""
+    # last_error contient des traces d'exception : réservé aux administrateurs
+    permission_classes = [IsAdminUser]
+    queryset = ScheduledJob.objects.all()
+    serializer_class = ScheduledJobSerializer
+
+@query_budget(queries=2, ms=50)
+class ProfileListView(APIView):
+    """Derniers profils de requêtes capturés par ProfilingMiddleware (sans piles ni SQL)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response([
+            {key: value for key, value in profile.items() if key not in ('folded', 'sql')}
+            for profile in profiling.profiles()
+        ])
+
+@query_budget(queries=2, ms=50)
+class ProfileDetailView(APIView):
+    """
+    Un profil : piles agrégées (format folded) et chronologie SQL.
+    ``?output=folded`` renvoie les piles en texte brut pour flamegraph.pl / speedscope.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id, *args, **kwargs):
+        profile = profiling.get_profile(profile_id)
+        if profile is None:
+            raise Http404
+        if request.query_params.get('output') == 'folded':
+            return HttpResponse('\n'.join(profile['folded']) + '\n', content_type='text/plain; charset=utf-8')
+        return Response(profile)
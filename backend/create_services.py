@@ -4,20 +4,27 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 django.setup()
 
-from api.models import Service
+from api.models import Service, default_site_id
 
 SERVICES_DATA = [
     {"name": "Enregistrement", "description": "Service d'enregistrement des passagers"},
     {"name": "Réclamation Bagages", "description": "Service de réclamation des bagages perdus ou endommagés"},
     {"name": "Information", "description": "Service d'information générale"},
-    {"name": "Service VIP", "description": "Service dédié aux passagers VIP"},
+    {"name": "Service VIP", "description": "Service dédié aux passagers VIP", "priority_class": "VIP"},
     {"name": "Objets Trouvés", "description": "Service des objets trouvés"},
-    {"name": "Accessibilité", "description": "Service d'assistance pour l'accessibilité"},
+    {"name": "Accessibilité", "description": "Service d'assistance pour l'accessibilité", "priority_class": "ASSISTANCE"},
 ]
 
 def create_services():
     for service_data in SERVICES_DATA:
-        service, created = Service.objects.get_or_create(name=service_data["name"], defaults={"description": service_data["description"]})
+        service, created = Service.objects.get_or_create(
+            site_id=default_site_id(),
+            name=service_data["name"],
+            defaults={
+                "description": service_data["description"],
+                "priority_class": service_data.get("priority_class", "STANDARD"),
+            }
+        )
         if created:
             print(f"Service '{service.name}' created.")
         else:
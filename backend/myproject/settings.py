@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,11 +48,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Identifiant de requête (X-Request-Id) ajouté à chaque ligne de log
+    'api.structured_logging.RequestIdMiddleware',
+    # gzip / brotli des réponses JSON au-delà de SIOA_COMPRESSION_MIN_BYTES
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Inactif (retiré au démarrage) sauf si SIOA_PROFILING_ENABLED ; après l'authentification,
+    # qui décide de l'en-tête X-Sioa-Profile: 1 (staff uniquement)
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +95,46 @@ DATABASES = {
     }
 }
 
+# Caches partagés par tous les processus (workers WSGI/ASGI, commandes import_flights,
+# run_scheduler...). Redis si SIOA_REDIS_URL est défini (paquet redis), sinon fichiers
+# locaux, partagés par les processus de la machine qui héberge la base SQLite.
+# - default : flux d'affichage, prévisions (reconstruits s'ils sont expulsés) ;
+# - versions : jetons de version des index en mémoire (vols, routes, sites, écrans),
+#   sans expiration ; quelques dizaines de clés, jamais expulsées (avec Redis, ne pas
+#   utiliser une politique maxmemory allkeys-*) ;
+# - throttle : seaux de limitation de débit, un par client, avec leur propre TTL.
+#   Sans Redis, en mémoire de chaque processus : pas d'accès disque à chaque requête.
+SIOA_CACHE_DIR = Path(os.environ.get('SIOA_CACHE_DIR', BASE_DIR / 'cache'))
+if os.environ.get('SIOA_REDIS_URL'):
+    CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['SIOA_REDIS_URL'],
+            'KEY_PREFIX': alias,
+        }
+        for alias in ('default', 'versions', 'throttle')
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': SIOA_CACHE_DIR / 'default',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+        'versions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': SIOA_CACHE_DIR / 'versions',
+            # Jamais atteint : un jeton expulsé ferait servir des index périmés
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sioa-throttle',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+# Les tests remplacent ces caches par des caches en mémoire (voir api/tests.py)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -128,3 +178,76 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+# En-têtes SIOA envoyés par les bornes et écrans (site, identifiant client, idempotence)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'x-sioa-client', 'x-sioa-profile', 'x-sioa-site')
+
+# SIOA : files d'attente
+# Site (terminal) des requêtes sans en-tête X-Sioa-Site ni paramètre ?site=
+SIOA_DEFAULT_SITE = 'MAIN'
+# Un passager dont le vol part dans moins de N minutes passe devant les arrivées plus récentes
+SIOA_LATE_DEPARTURE_WINDOW_MINUTES = 60
+# Clôture de l'enregistrement avant le départ : les tickets WAITING sont alors annulés
+SIOA_CHECKIN_CLOSE_MINUTES = 45
+# Les tickets dont l'enregistrement ferme dans moins de N minutes sont mis en tête de file
+SIOA_CHECKIN_BOOST_MINUTES = 30
+# Un ticket sans vol (Information, vol introuvable) encore en attente après N minutes est annulé
+SIOA_UNLINKED_TICKET_MAX_AGE_MINUTES = 240
+# Durée de conservation des réponses rejouées pour un en-tête Idempotency-Key
+SIOA_IDEMPOTENCY_TTL_SECONDS = 3600
+# Profilage à la demande (voir api/profiling.py) : en-tête X-Sioa-Profile: 1 (staff)
+# ou X-Sioa-Profile: <secret>, ou tirage aléatoire
+SIOA_PROFILING_ENABLED = False
+# Secret partagé qui déclenche le profilage sans session staff ('' : désactivé)
+SIOA_PROFILING_SECRET = os.environ.get('SIOA_PROFILING_SECRET', '')
+SIOA_PROFILING_SAMPLE_RATE = 0.0
+SIOA_PROFILING_INTERVAL_MS = 1
+# Nombre de profils conservés en mémoire par processus
+SIOA_PROFILING_BUFFER = 50
+# Journalisation JSON (voir api/structured_logging.py) : part des événements des chemins
+# chauds journalisés, et seuil (ms) au-delà duquel un événement l'est toujours
+SIOA_LOG_SAMPLE_RATES = {
+    'ticket.issued': 0.1,
+    'statistics.computed': 0.01,
+}
+SIOA_LOG_SLOW_MS = 500
+# Taille (octets) à partir de laquelle les réponses JSON sont compressées (voir api/compression.py)
+SIOA_COMPRESSION_MIN_BYTES = 1024
+
+# Limitation de débit par client (borne, comptoir, utilisateur ou IP) et classe de requêtes (voir api/throttling.py)
+# rate : requêtes/s soutenues, burst : rafale ; global_* : charge totale admise ({} : désactivé)
+SIOA_RATE_LIMITS = {
+    'issuance': {'rate': 2, 'burst': 10, 'global_rate': 30, 'global_burst': 60},
+    'dashboard': {'rate': 10, 'burst': 40, 'global_rate': 200, 'global_burst': 400},
+    'agent': {'rate': 5, 'burst': 30},
+    'import': {'rate': 0.1, 'burst': 5, 'global_rate': 0.2, 'global_burst': 10},
+}
+# Bornes dont l'en-tête X-Sioa-Client est cru ; les autres clients sont identifiés par leur IP
+SIOA_TRUSTED_KIOSKS = []
+
+# Rendu JSON via orjson (si installé) pour les endpoints interrogés en boucle
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Logs JSON : le thread de la requête ne fait que mettre l'enregistrement en file,
+# le formatage et l'écriture se font dans le thread du QueueListener
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'api.structured_logging.RequestIdFilter'},
+    },
+    'handlers': {
+        'json_queue': {
+            'class': 'api.structured_logging.QueueListenerHandler',
+            'filters': ['request_id'],
+        },
+    },
+    'loggers': {
+        'api': {'handlers': ['json_queue'], 'level': 'INFO', 'propagate': False},
+        'django.request': {'handlers': ['json_queue'], 'level': 'WARNING', 'propagate': False},
+    },
+}